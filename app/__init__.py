@@ -1,38 +1,101 @@
 """
 Flask application factory
 """
-# Apply patch for flasgger to work with Python 3.12
-from app.flasgger_patch import *
+import gc
 from flask import Flask
-from flasgger import Swagger
+from app.config import config_by_name
 from app.controllers.pdf_controller import pdf_bp
 from app.controllers.ui_controller import ui_bp
+from app.controllers.job_controller import job_bp
+from app.controllers.upload_controller import upload_bp
+from app.controllers.metrics_controller import metrics_bp
+from app.controllers.admission_controller import admission_bp
+from app.controllers.request_utils import SpooledRequest
+from app.services.admission_service import AdmissionController
+from app.services.cache_service import create_cache, MemoryCache
+from app.services.job_service import JobManager
+from app.services.upload_service import UploadManager
+from app.services.log_service import configure_logging
+from app.services.lazy_import import load
+from app.services import pdf_service
+from app.swagger import build_spec, init_swagger
 
 
-def create_app():
+def _preload(app):
+    """
+    Does the work otherwise left to the first requests, before workers fork
+
+    The workers of a preloading server then inherit pikepdf and the Swagger
+    spec already loaded. Freezing the heap afterwards keeps the garbage
+    collector from writing to those inherited objects, so their pages stay
+    shared between workers instead of being copied into each one.
+    """
+    load(pdf_service.pikepdf)
+    build_spec(app)
+    gc.freeze()
+
+
+def create_app(config_name='default'):
     """Create and configure the Flask application"""
     app = Flask(__name__)
+    app.config.from_object(config_by_name[config_name])
+    
+    # Library modules never configure logging; the application does, once
+    configure_logging(app.config['LOG_LEVEL'], app.config['LOG_FORMAT'])
+    
+    # Spool large multipart uploads to disk rather than holding them in memory
+    app.request_class = SpooledRequest
+    
+    # Swagger UI and spec, by default imported and built on first use
+    init_swagger(app, app.config['SWAGGER_MODE'])
     
-    # Configure Swagger
-    swagger_config = {
-        "headers": [],
-        "specs": [
-            {
-                "endpoint": "apispec",
-                "route": "/apispec.json",
-                "rule_filter": lambda rule: True,
-                "model_filter": lambda tag: True,
-            }
-        ],
-        "static_url_path": "/flasgger_static",
-        "swagger_ui": True,
-        "specs_route": "/apidocs/"
-    }
-    
-    swagger = Swagger(app, config=swagger_config)
+    # Set up the content-addressed result cache for embedded PDFs
+    app.extensions['result_cache'] = create_cache(
+        app.config['RESULT_CACHE_BACKEND'],
+        max_bytes=app.config['RESULT_CACHE_MAX_BYTES'],
+        directory=app.config['RESULT_CACHE_DIR'],
+        max_item_bytes=app.config['RESULT_CACHE_MAX_ITEM_BYTES']
+    )
+    
+    # Bounded cache of parsed attachment indexes, keyed by content digest
+    app.extensions['index_cache'] = MemoryCache(
+        app.config['INDEX_CACHE_MAX_BYTES'],
+        size_of=lambda index: index.nbytes
+    )
+    
+    # Admission control shared by every request thread of this process
+    app.extensions['admission'] = AdmissionController(
+        max_bytes=app.config['ADMISSION_MAX_BYTES'],
+        max_concurrent=app.config['ADMISSION_MAX_CONCURRENT'],
+        queue_size=app.config['ADMISSION_QUEUE_SIZE'],
+        queue_timeout=app.config['ADMISSION_QUEUE_TIMEOUT'],
+        retry_after=app.config['ADMISSION_RETRY_AFTER']
+    )
+    
+    # Background job runner; the process pool starts on the first job
+    app.extensions['job_manager'] = JobManager(
+        app.config['JOB_SPOOL_DIR'],
+        max_workers=app.config['JOB_WORKERS'],
+        ttl_seconds=app.config['JOB_TTL_SECONDS'],
+        max_runtime_seconds=app.config['JOB_MAX_RUNTIME_SECONDS']
+    )
+    
+    # Resumable upload sessions, shared through their spool directory
+    app.extensions['upload_manager'] = UploadManager(
+        app.config['UPLOAD_SESSION_DIR'],
+        ttl_seconds=app.config['UPLOAD_SESSION_TTL_SECONDS'],
+        max_bytes=app.config['UPLOAD_SESSION_MAX_BYTES']
+    )
     
     # Register blueprints
     app.register_blueprint(pdf_bp)
+    app.register_blueprint(job_bp)
+    app.register_blueprint(upload_bp)
     app.register_blueprint(ui_bp)
+    app.register_blueprint(metrics_bp)
+    app.register_blueprint(admission_bp)
+    
+    if app.config['PRELOAD']:
+        _preload(app)
     
-    return app
\ No newline at end of file
+    return app
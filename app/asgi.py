@@ -0,0 +1,316 @@
+"""
+ASGI entry point for the Flask application
+
+Under a sync WSGI server a slow client uploading a large PDF holds a whole
+worker for the duration of the upload. This adapter lets an ASGI server
+(e.g. uvicorn) accept those uploads on its event loop instead:
+
+- The request body is received asynchronously and spooled, in memory up
+  to UPLOAD_SPOOL_THRESHOLD and on disk beyond it, so thousands of slow
+  uploads cost a coroutine and a spool file each rather than a worker.
+- Only once the whole body has arrived is the Flask app run, on a thread
+  pool capped at ASGI_WORKERS (the core count by default). Multipart
+  parsing then reads from the local spool, and the pikepdf work never
+  exceeds the pool size however many requests are in flight.
+- Response bodies are pulled from the app on a second pool of the same
+  size and sent without holding a thread while the client reads them.
+  Requests waiting for admission block threads of the first pool, so
+  streams that were already admitted must not need one of those threads
+  to finish and free their capacity. Files (sent through
+  wsgi.file_wrapper) are read in large blocks off both pools.
+"""
+import asyncio
+import contextvars
+import json
+import logging
+import os
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app import create_app
+
+# Setup logging
+logger = logging.getLogger(__name__)
+
+# Bytes of response body gathered per trip to the worker pool; generators
+# yielding small chunks would otherwise cost one thread hop per chunk
+RESPONSE_BATCH_SIZE = 256 * 1024
+
+# Block size for files sent through wsgi.file_wrapper
+FILE_BLOCK_SIZE = 1024 * 1024
+
+_END = object()
+
+
+class FileWrapper:
+    """wsgi.file_wrapper implementation the adapter can read in large blocks"""
+
+    def __init__(self, filelike, block_size: int = FILE_BLOCK_SIZE):
+        self.filelike = filelike
+        # Werkzeug asks for 8 KB blocks; each block costs a thread hop here
+        self.block_size = max(block_size, FILE_BLOCK_SIZE)
+
+    def __iter__(self):
+        return iter(lambda: self.filelike.read(self.block_size), b'')
+
+    def close(self):
+        if hasattr(self.filelike, 'close'):
+            self.filelike.close()
+
+
+class ClientDisconnected(Exception):
+    """The client went away before the request body was complete"""
+
+
+class BodyTooLarge(Exception):
+    """The request body is larger than the configured maximum"""
+
+
+def _build_environ(scope: Dict[str, Any], body, content_length: int) -> Dict[str, Any]:
+    """Translates an ASGI HTTP scope into a WSGI environ (PEP 3333)"""
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': str(server[0]),
+        'SERVER_PORT': str(server[1]) if server[1] is not None else '80',
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': client[0],
+        'REMOTE_PORT': str(client[1]),
+        'CONTENT_LENGTH': str(content_length),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': body,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+        'wsgi.file_wrapper': FileWrapper,
+    }
+    for raw_name, raw_value in scope.get('headers', []):
+        name = raw_name.decode('latin-1').upper().replace('-', '_')
+        value = raw_value.decode('latin-1')
+        if name == 'CONTENT_TYPE':
+            environ['CONTENT_TYPE'] = value
+            continue
+        if name in ('CONTENT_LENGTH', 'TRANSFER_ENCODING'):
+            # The body has been received whole, so chunked uploads reach the
+            # app as a plain body of the length actually received
+            continue
+        key = f"HTTP_{name}"
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+def _next_batch(iterator, limit: int) -> Tuple[bytes, bool]:
+    """Pulls chunks from a response iterator until limit bytes or the end"""
+    chunks = []
+    size = 0
+    while size < limit:
+        chunk = next(iterator, _END)
+        if chunk is _END:
+            return b''.join(chunks), True
+        if chunk:
+            chunks.append(chunk)
+            size += len(chunk)
+    return b''.join(chunks), False
+
+
+def _read_block(file_wrapper: FileWrapper) -> Tuple[bytes, bool]:
+    """Reads the next block of a wrapped file"""
+    data = file_wrapper.filelike.read(file_wrapper.block_size)
+    return data, not data
+
+
+class AsgiAdapter:
+    """
+    Serves a WSGI application over ASGI with asynchronous request bodies
+    and a bounded pool for the application itself
+
+    Args:
+        wsgi_app: The WSGI application, normally the Flask app
+        max_workers: Threads running the application at once, and threads
+            pulling streamed response bodies
+        spool_threshold: Request bodies larger than this many bytes are
+            spooled to disk
+        spool_dir: Directory for spooled request bodies (None for the
+            system temp directory)
+        max_body_size: Larger request bodies are answered with 413 before
+            (or as soon as) they are received (None for no limit)
+    """
+
+    def __init__(self, wsgi_app: Callable, max_workers: Optional[int] = None,
+                 spool_threshold: int = 1024 * 1024, spool_dir: Optional[str] = None,
+                 max_body_size: Optional[int] = None):
+        self.wsgi_app = wsgi_app
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.spool_threshold = spool_threshold
+        self.spool_dir = spool_dir
+        self.max_body_size = max_body_size
+        self.executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='asgi-worker')
+        self.stream_executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='asgi-stream')
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+        elif scope['type'] == 'http':
+            await self._http(scope, receive, send)
+        else:
+            raise ValueError(f"Unsupported ASGI scope type: {scope['type']}")
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.executor.shutdown(wait=True)
+                self.stream_executor.shutdown(wait=True)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def _receive_body(self, receive) -> Tuple[Any, int]:
+        """
+        Receives the whole request body into a spooled temporary file
+
+        Returns:
+            Tuple containing the file, rewound, and the body length
+
+        Raises:
+            ClientDisconnected: If the client disconnects first
+            BodyTooLarge: If the body grows past max_body_size
+        """
+        loop = asyncio.get_running_loop()
+        body = tempfile.SpooledTemporaryFile(max_size=self.spool_threshold, dir=self.spool_dir)
+        length = 0
+        try:
+            while True:
+                message = await receive()
+                if message['type'] == 'http.disconnect':
+                    raise ClientDisconnected()
+                chunk = message.get('body', b'')
+                if chunk:
+                    length += len(chunk)
+                    if self.max_body_size is not None and length > self.max_body_size:
+                        raise BodyTooLarge()
+                    if length > self.spool_threshold:
+                        # Disk writes go to the default executor, off the event loop
+                        await loop.run_in_executor(None, body.write, chunk)
+                    else:
+                        body.write(chunk)
+                if not message.get('more_body', False):
+                    break
+            body.seek(0)
+            return body, length
+        except BaseException:
+            body.close()
+            raise
+
+    async def _send_too_large(self, send):
+        body = json.dumps({'error': f"Request body exceeds {self.max_body_size} bytes"}).encode('utf-8')
+        await send({'type': 'http.response.start', 'status': 413,
+                    'headers': [(b'content-type', b'application/json'), (b'connection', b'close')]})
+        await send({'type': 'http.response.body', 'body': body})
+
+    async def _http(self, scope, receive, send):
+        # Refuse a declared oversized body before receiving any of it
+        declared = dict(scope.get('headers', [])).get(b'content-length')
+        if self.max_body_size is not None and declared and declared.isdigit() \
+                and int(declared) > self.max_body_size:
+            await self._send_too_large(send)
+            return
+
+        try:
+            body, length = await self._receive_body(receive)
+        except ClientDisconnected:
+            return
+        except BodyTooLarge:
+            await self._send_too_large(send)
+            return
+
+        loop = asyncio.get_running_loop()
+        # One context per request, so Flask's context variables follow the
+        # request from thread to thread across the pool
+        context = contextvars.copy_context()
+        response: Dict[str, Any] = {}
+        written: List[bytes] = []
+
+        def start_response(status: str, headers: List[Tuple[str, str]], exc_info=None):
+            if exc_info and response:
+                raise exc_info[1].with_traceback(exc_info[2])
+            response['status'] = int(status.split(' ', 1)[0])
+            response['headers'] = [
+                (name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers
+            ]
+            return written.append
+
+        environ = _build_environ(scope, body, length)
+        iterable = None
+        started = False
+        try:
+            iterable = await loop.run_in_executor(
+                self.executor, context.run, self.wsgi_app, environ, start_response
+            )
+            if isinstance(iterable, FileWrapper):
+                # File reads are brief I/O, so they stay off the bounded pool
+                file_wrapper = iterable
+                executor = None
+                read = lambda: _read_block(file_wrapper)
+            else:
+                # Never on the application pool, where requests waiting for
+                # admission could keep this admitted stream from finishing
+                iterator = iter(iterable)
+                executor = self.stream_executor
+                read = lambda: context.run(_next_batch, iterator, RESPONSE_BATCH_SIZE)
+
+            # Pull the first batch before sending headers, so an error raised
+            # as a streaming generator starts can still become a 500
+            chunk, done = await loop.run_in_executor(executor, read)
+            chunk = b''.join(written) + chunk
+            await send({'type': 'http.response.start', 'status': response['status'],
+                        'headers': response['headers']})
+            started = True
+            while True:
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': not done})
+                if done:
+                    break
+                chunk, done = await loop.run_in_executor(executor, read)
+        except Exception:
+            logger.exception("Error serving %s %s", scope['method'], scope['path'])
+            if started:
+                raise
+            await send({'type': 'http.response.start', 'status': 500,
+                        'headers': [(b'content-type', b'text/plain; charset=utf-8')]})
+            await send({'type': 'http.response.body', 'body': b'Internal Server Error'})
+        finally:
+            if iterable is not None and hasattr(iterable, 'close'):
+                # Closing releases the stream's admission, so it must not wait
+                # behind queued requests either
+                await loop.run_in_executor(self.stream_executor, context.run, iterable.close)
+            body.close()
+
+
+def create_asgi_app(config_name: str = 'default') -> AsgiAdapter:
+    """
+    Creates the Flask application wrapped for serving over ASGI
+
+    Args:
+        config_name: Configuration to create the Flask app with
+
+    Returns:
+        AsgiAdapter: The ASGI application
+    """
+    flask_app = create_app(config_name)
+    config = flask_app.config
+    return AsgiAdapter(
+        flask_app,
+        max_workers=config['ASGI_WORKERS'],
+        spool_threshold=config['UPLOAD_SPOOL_THRESHOLD'],
+        spool_dir=config['UPLOAD_SPOOL_DIR'],
+        max_body_size=config['MAX_CONTENT_LENGTH']
+    )
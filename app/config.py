@@ -1,6 +1,8 @@
 """
 Configuration settings for the Flask application
 """
+import os
+import tempfile
 
 # Swagger configuration
 SWAGGER_TEMPLATE = {
@@ -20,4 +22,112 @@ SWAGGER_TEMPLATE = {
         "application/json",
         "application/pdf"
     ]
-}
\ No newline at end of file
+}
+
+
+def _physical_memory() -> int:
+    """Returns the machine's physical memory in bytes, or 4 GiB where unknown"""
+    try:
+        return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')
+    except (AttributeError, ValueError, OSError):
+        return 4 * 1024 * 1024 * 1024
+
+
+class Config:
+    """Base configuration, overridable through environment variables"""
+    TESTING = False
+    
+    # Root log level and output format: 'text' or 'json'
+    LOG_LEVEL = os.environ.get('PDF_LOG_LEVEL', 'INFO').upper()
+    LOG_FORMAT = os.environ.get('PDF_LOG_FORMAT', 'text')
+    
+    # Swagger UI and /apispec.json: 'lazy' imports flasgger and builds the
+    # spec on the first docs request, 'eager' at startup, 'off' disables them
+    SWAGGER_MODE = os.environ.get('PDF_SWAGGER', 'lazy')
+    
+    # Do all import-time and first-request work up front (pikepdf, the
+    # Swagger spec) and freeze the heap, for servers that fork workers from
+    # a preloaded app (gunicorn --preload) so the workers share those pages
+    PRELOAD = os.environ.get('PDF_PRELOAD', '').lower() in ('1', 'true', 'yes')
+    
+    # Uploaded files larger than this many bytes are spooled to disk instead
+    # of being held in memory (None for the system temp directory)
+    UPLOAD_SPOOL_THRESHOLD = int(os.environ.get('PDF_UPLOAD_SPOOL_THRESHOLD', 1024 * 1024))
+    UPLOAD_SPOOL_DIR = os.environ.get('PDF_UPLOAD_SPOOL_DIR') or None
+    
+    # Largest request body accepted and most files one request may upload;
+    # both are enforced before the body is buffered
+    MAX_CONTENT_LENGTH = int(os.environ.get('PDF_MAX_CONTENT_LENGTH', 1024 * 1024 * 1024))
+    MAX_ATTACHMENTS = int(os.environ.get('PDF_MAX_ATTACHMENTS', 10000))
+    # Flask 2.3+ separately caps multipart parts (files and fields) at 1000
+    MAX_FORM_PARTS = MAX_ATTACHMENTS + 100
+    
+    # Admission control for the PDF endpoints: requests are charged an
+    # estimated working set (ADMISSION_BASE_BYTES plus ADMISSION_MEMORY_FACTOR
+    # times the body size) against a budget of ADMISSION_MAX_BYTES (half of
+    # physical memory by default), at most ADMISSION_MAX_CONCURRENT run at
+    # once, and up to ADMISSION_QUEUE_SIZE wait ADMISSION_QUEUE_TIMEOUT
+    # seconds for capacity before being turned away
+    ADMISSION_MAX_BYTES = int(os.environ.get('PDF_ADMISSION_MAX_BYTES', _physical_memory() // 2))
+    ADMISSION_MAX_CONCURRENT = int(os.environ.get('PDF_ADMISSION_MAX_CONCURRENT', os.cpu_count() or 1))
+    ADMISSION_QUEUE_SIZE = int(os.environ.get('PDF_ADMISSION_QUEUE_SIZE', 2 * (os.cpu_count() or 1)))
+    ADMISSION_QUEUE_TIMEOUT = float(os.environ.get('PDF_ADMISSION_QUEUE_TIMEOUT', 30))
+    ADMISSION_MEMORY_FACTOR = float(os.environ.get('PDF_ADMISSION_MEMORY_FACTOR', 3))
+    ADMISSION_BASE_BYTES = int(os.environ.get('PDF_ADMISSION_BASE_BYTES', 16 * 1024 * 1024))
+    ADMISSION_RETRY_AFTER = int(os.environ.get('PDF_ADMISSION_RETRY_AFTER', 5))
+    
+    # Result cache for create_embedded_pdf: 'memory', 'disk' or 'none'
+    RESULT_CACHE_BACKEND = os.environ.get('PDF_RESULT_CACHE_BACKEND', 'memory')
+    RESULT_CACHE_MAX_BYTES = int(os.environ.get('PDF_RESULT_CACHE_MAX_BYTES', 256 * 1024 * 1024))
+    # Larger results are not kept by the memory backend, so they are still
+    # streamed from disk rather than held in RAM
+    RESULT_CACHE_MAX_ITEM_BYTES = int(os.environ.get('PDF_RESULT_CACHE_MAX_ITEM_BYTES', 8 * 1024 * 1024))
+    RESULT_CACHE_DIR = os.environ.get(
+        'PDF_RESULT_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'pdf_result_cache')
+    )
+    
+    # Cache of parsed attachment indexes, so repeated list/fetch/extract calls
+    # on the same PDF skip re-parsing it
+    INDEX_CACHE_MAX_BYTES = int(os.environ.get('PDF_INDEX_CACHE_MAX_BYTES', 32 * 1024 * 1024))
+    
+    # Recursive extraction: deepest nesting level a request may ask for, and
+    # the total decoded bytes and PDF objects one request may work through
+    EXTRACT_MAX_DEPTH = int(os.environ.get('PDF_EXTRACT_MAX_DEPTH', 4))
+    EXTRACT_MAX_BYTES = int(os.environ.get('PDF_EXTRACT_MAX_BYTES', 256 * 1024 * 1024))
+    EXTRACT_MAX_OBJECTS = int(os.environ.get('PDF_EXTRACT_MAX_OBJECTS', 1000000))
+    
+    # Threads running the app under the ASGI entry point (defaults to the
+    # CPU count); uploads are received on the event loop, outside this pool
+    ASGI_WORKERS = int(os.environ['PDF_ASGI_WORKERS']) if os.environ.get('PDF_ASGI_WORKERS') else None
+    
+    # Background jobs: spool directory, pool size (defaults to the CPU count),
+    # how long finished jobs are kept, and how long a job may stay queued or
+    # running before it is marked failed
+    JOB_SPOOL_DIR = os.environ.get('PDF_JOB_SPOOL_DIR', os.path.join(tempfile.gettempdir(), 'pdf_jobs'))
+    JOB_WORKERS = int(os.environ['PDF_JOB_WORKERS']) if os.environ.get('PDF_JOB_WORKERS') else None
+    JOB_TTL_SECONDS = int(os.environ.get('PDF_JOB_TTL_SECONDS', 3600))
+    JOB_MAX_RUNTIME_SECONDS = int(os.environ.get('PDF_JOB_MAX_RUNTIME_SECONDS', 6 * 3600))
+    
+    # Resumable upload sessions: spool directory, largest file one session
+    # may hold, and how long a session is kept after it was last used
+    UPLOAD_SESSION_DIR = os.environ.get(
+        'PDF_UPLOAD_SESSION_DIR', os.path.join(tempfile.gettempdir(), 'pdf_uploads')
+    )
+    UPLOAD_SESSION_MAX_BYTES = int(os.environ.get('PDF_UPLOAD_SESSION_MAX_BYTES', 64 * 1024 * 1024 * 1024))
+    UPLOAD_SESSION_TTL_SECONDS = int(os.environ.get('PDF_UPLOAD_SESSION_TTL_SECONDS', 86400))
+
+
+class TestingConfig(Config):
+    """Configuration used by the test suite"""
+    TESTING = True
+    RESULT_CACHE_BACKEND = 'memory'
+    RESULT_CACHE_MAX_BYTES = 16 * 1024 * 1024
+    JOB_SPOOL_DIR = os.path.join(tempfile.gettempdir(), 'pdf_jobs_testing')
+    JOB_WORKERS = 2
+    UPLOAD_SESSION_DIR = os.path.join(tempfile.gettempdir(), 'pdf_uploads_testing')
+
+
+config_by_name = {
+    'default': Config,
+    'testing': TestingConfig,
+}
@@ -0,0 +1,70 @@
+"""
+Controller hooks enforcing request size limits and admission control
+"""
+from flask import Blueprint, current_app, g, jsonify, request
+from werkzeug.exceptions import RequestEntityTooLarge
+from app.services.admission_service import AdmissionRejected, estimate_working_set
+from app.services.metrics_service import ADMISSION_REJECTED, timed
+from app.controllers.request_utils import referenced_upload_bytes
+
+# Create blueprint
+admission_bp = Blueprint('admission', __name__)
+
+# Blueprints whose endpoints do the CPU- and memory-heavy PDF work
+ADMITTED_BLUEPRINTS = ('pdf',)
+
+
+@admission_bp.before_app_request
+def admit_request():
+    """
+    Rejects oversized bodies from their Content-Length, then waits for the
+    request's estimated working set to fit the admission budget
+
+    Upload sessions a request names count towards its size like the body.
+    """
+    config = current_app.config
+    content_length = request.content_length or 0
+    if config['MAX_CONTENT_LENGTH'] is not None and content_length > config['MAX_CONTENT_LENGTH']:
+        raise RequestEntityTooLarge(f"Request body exceeds {config['MAX_CONTENT_LENGTH']} bytes")
+
+    if request.blueprint not in ADMITTED_BLUEPRINTS:
+        return
+    cost = estimate_working_set(content_length + referenced_upload_bytes(),
+                                config['ADMISSION_MEMORY_FACTOR'], config['ADMISSION_BASE_BYTES'])
+    with timed('admission_wait'):
+        g.admission_ticket = current_app.extensions['admission'].acquire(cost)
+
+
+@admission_bp.after_app_request
+def release_when_sent(response):
+    """Holds a streamed response's admission until it has been sent"""
+    if 'admission_ticket' in g and response.is_streamed and not response.direct_passthrough:
+        # Streamed responses keep doing PDF work after the view returns.
+        # Passthrough files (send_file) are done with it, and bypass the
+        # response's close callbacks, so they are released at teardown
+        response.call_on_close(g.pop('admission_ticket').release)
+    return response
+
+
+@admission_bp.teardown_app_request
+def release_on_teardown(exc):
+    """Releases the admission of a request whose work is done"""
+    ticket = g.pop('admission_ticket', None)
+    if ticket is not None:
+        ticket.release()
+
+
+@admission_bp.app_errorhandler(AdmissionRejected)
+def admission_rejected(error):
+    """Turns a rejected admission into a 429/503 with Retry-After"""
+    ADMISSION_REJECTED.labels(str(error.status)).inc()
+    response = jsonify({'error': str(error)})
+    response.status_code = error.status
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response
+
+
+@admission_bp.app_errorhandler(RequestEntityTooLarge)
+def request_too_large(error):
+    """Reports an oversized body or too many uploaded files as JSON"""
+    return jsonify({'error': error.description}), 413
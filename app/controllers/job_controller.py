@@ -0,0 +1,258 @@
+"""
+Controller for background job API endpoints
+"""
+from flask import Blueprint, request, jsonify, send_file, current_app, url_for
+import logging
+import uuid
+from app.services.pdf_service import resolve_filenames
+from app.services.job_service import JOB_OPERATIONS, JOB_DONE, JOB_FAILED, RESULT_FILES
+from app.controllers.request_utils import add_no_cache_headers, embed_options, has_input, input_source, input_attachments
+
+# Setup logging
+logger = logging.getLogger(__name__)
+
+# Create blueprint
+job_bp = Blueprint('jobs', __name__, url_prefix='/api/pdf/jobs')
+
+
+def _job_response(status):
+    """Adds status and result URLs to a job status dictionary"""
+    body = dict(status)
+    body['status_url'] = url_for('jobs.get_job', job_id=status['job_id'])
+    if status['status'] == JOB_DONE:
+        body['result_url'] = url_for('jobs.get_job_result', job_id=status['job_id'])
+    return body
+
+
+@job_bp.route('', methods=['POST'])
+def create_job():
+    """
+    Queues an embed or extract operation to run in the background
+    ---
+    tags:
+      - Jobs
+    consumes:
+      - multipart/form-data
+    parameters:
+      - in: formData
+        name: operation
+        type: string
+        enum: [embed, extract]
+        required: true
+        description: The operation to run
+      - in: formData
+        name: host_pdf
+        type: file
+        required: false
+        description: The host PDF file (embed)
+      - in: formData
+        name: host_pdf_upload
+        type: string
+        required: false
+        description: ID of a finalized upload session holding the host PDF, instead of host_pdf (embed)
+      - in: formData
+        name: attachments[]
+        type: array
+        items:
+          type: file
+        required: false
+        description: One or more PDF files to embed (embed)
+      - in: formData
+        name: attachment_uploads[]
+        type: array
+        items:
+          type: string
+        required: false
+        description: IDs of finalized upload sessions to embed, after any attachments[] files (embed)
+      - in: formData
+        name: mode
+        type: string
+        enum: [memory, tempfile, append]
+        default: memory
+        required: false
+        description: Engine mode (embed)
+      - in: formData
+        name: profile
+        type: string
+        enum: [fast, balanced, small]
+        default: balanced
+        required: false
+        description: Save profile (embed)
+      - in: formData
+        name: linearize
+        type: boolean
+        default: false
+        required: false
+        description: Write a linearized PDF (embed)
+      - in: formData
+        name: pdf
+        type: file
+        required: false
+        description: A PDF file potentially containing embedded files (extract)
+      - in: formData
+        name: pdf_upload
+        type: string
+        required: false
+        description: ID of a finalized upload session holding the PDF, instead of pdf (extract)
+    responses:
+      202:
+        description: Job queued
+        schema:
+          type: object
+          properties:
+            job_id:
+              type: string
+            status:
+              type: string
+            status_url:
+              type: string
+      400:
+        description: Bad request, missing files or invalid operation
+        schema:
+          type: object
+          properties:
+            error:
+              type: string
+    """
+    # Generate a unique response ID to prevent browser caching
+    response_id = str(uuid.uuid4())
+    add_no_cache_headers(response_id)
+
+    operation = request.form.get('operation')
+    if operation not in JOB_OPERATIONS:
+        return jsonify({'error': f"Invalid operation '{operation}', expected one of: {', '.join(JOB_OPERATIONS)}"}), 400
+
+    if operation == 'embed':
+        if not has_input('host_pdf'):
+            return jsonify({'error': 'No host PDF provided'}), 400
+
+        try:
+            host_pdf = input_source('host_pdf')
+            attachment_streams, uploaded_names = input_attachments()
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        if not attachment_streams:
+            return jsonify({'error': 'No valid attachment PDFs provided'}), 400
+
+        try:
+            embed_settings = embed_options(request.form)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        # Spool inputs under neutral names; the real names travel as options
+        files = {'host.pdf': host_pdf}
+        input_names = []
+        for i, attachment_stream in enumerate(attachment_streams):
+            input_names.append(f"attachment_{i}.pdf")
+            files[input_names[-1]] = attachment_stream
+        options = {
+            'attachments': input_names,
+            'filenames': resolve_filenames(attachment_streams, uploaded_names),
+            **embed_settings,
+        }
+    else:
+        if not has_input('pdf'):
+            return jsonify({'error': 'No PDF file provided'}), 400
+        try:
+            files = {'document.pdf': input_source('pdf')}
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        options = {}
+
+    try:
+        status = current_app.extensions['job_manager'].submit(operation, files, options)
+    except Exception as e:
+        logger.error("Queuing job failed: %s", e)
+        return jsonify({'error': str(e)}), 400
+
+    response = jsonify(_job_response(status))
+    response.status_code = 202
+    response.headers['Location'] = url_for('jobs.get_job', job_id=status['job_id'])
+    return response
+
+
+@job_bp.route('/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """
+    Returns the status of a background job
+    ---
+    tags:
+      - Jobs
+    parameters:
+      - in: path
+        name: job_id
+        type: string
+        required: true
+    responses:
+      200:
+        description: Job status (queued, running, done or failed)
+        schema:
+          type: object
+          properties:
+            job_id:
+              type: string
+            operation:
+              type: string
+            status:
+              type: string
+            error:
+              type: string
+            result_url:
+              type: string
+      404:
+        description: Unknown or expired job
+        schema:
+          type: object
+          properties:
+            error:
+              type: string
+    """
+    add_no_cache_headers(str(uuid.uuid4()))
+
+    status = current_app.extensions['job_manager'].status(job_id)
+    if status is None:
+        return jsonify({'error': f"Job not found: {job_id}"}), 404
+    return jsonify(_job_response(status))
+
+
+@job_bp.route('/<job_id>/result', methods=['GET'])
+def get_job_result(job_id):
+    """
+    Downloads the result of a finished background job
+    ---
+    tags:
+      - Jobs
+    parameters:
+      - in: path
+        name: job_id
+        type: string
+        required: true
+    produces:
+      - application/pdf
+      - application/json
+    responses:
+      200:
+        description: The embedded PDF (embed jobs) or the extraction JSON (extract jobs)
+      404:
+        description: Unknown or expired job
+      409:
+        description: The job has not finished, or failed
+    """
+    add_no_cache_headers(str(uuid.uuid4()))
+
+    job_manager = current_app.extensions['job_manager']
+    status = job_manager.status(job_id)
+    if status is None:
+        return jsonify({'error': f"Job not found: {job_id}"}), 404
+    if status['status'] == JOB_FAILED:
+        return jsonify({'error': status.get('error', 'Job failed'), 'status': JOB_FAILED}), 409
+    if status['status'] != JOB_DONE:
+        return jsonify({'error': 'Job has not finished', 'status': status['status']}), 409
+
+    result_name, mimetype = RESULT_FILES[status['operation']]
+    return send_file(
+        job_manager.result_path(job_id),
+        mimetype=mimetype,
+        as_attachment=True,
+        download_name=f"{status['operation']}_{job_id[:8]}_{result_name}"
+    )
@@ -0,0 +1,54 @@
+"""
+Controller for the metrics endpoint and per-request timing headers
+"""
+from flask import Blueprint, Response, current_app, g, request
+import time
+from prometheus_client import CONTENT_TYPE_LATEST
+from app.services.metrics_service import (
+    REQUEST_SECONDS, render_metrics, request_timings, server_timing, start_request_timings
+)
+
+# Create blueprint
+metrics_bp = Blueprint('metrics', __name__)
+
+
+@metrics_bp.before_app_request
+def start_timer():
+    """Starts timing the request and collecting its phase durations"""
+    g.request_start = time.perf_counter()
+    start_request_timings()
+
+
+@metrics_bp.after_app_request
+def record_request(response):
+    """Records request latency and reports the phase durations in Server-Timing"""
+    start = g.pop('request_start', None)
+    if start is None:
+        return response
+    elapsed = time.perf_counter() - start
+    endpoint = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    REQUEST_SECONDS.labels(endpoint, request.method, str(response.status_code)).observe(elapsed)
+    response.headers['Server-Timing'] = server_timing(request_timings(), total=elapsed)
+    return response
+
+
+@metrics_bp.route('/metrics', methods=['GET'])
+def metrics():
+    """
+    Prometheus metrics
+    ---
+    tags:
+      - Monitoring
+    produces:
+      - text/plain
+    responses:
+      200:
+        description: >
+          Phase and request latency histograms, byte and attachment counters,
+          and cache hit/miss counters in the Prometheus text format
+    """
+    caches = {
+        'result': current_app.extensions['result_cache'],
+        'index': current_app.extensions['index_cache'],
+    }
+    return Response(render_metrics(caches), content_type=CONTENT_TYPE_LATEST)
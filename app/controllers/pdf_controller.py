@@ -1,11 +1,33 @@
 """
 Controller for PDF API endpoints
 """
-from flask import Blueprint, request, jsonify, send_file, Response, after_this_request
+from flask import Blueprint, request, jsonify, send_file, Response, current_app
 import io
+import itertools
+import json
 import logging
+import os
+import shutil
+import tempfile
 import uuid
-from app.services.pdf_service import embed_pdfs, extract_pdfs
+from werkzeug.utils import secure_filename
+from app.services.pdf_service import (
+    embed_pdfs_to_path, extract_pdfs, iter_embedded_files, list_attachments, get_attachment,
+    resolve_filenames, AttachmentNotFoundError, EMBED_MODE_APPEND,
+    iter_nested_files, extract_nested_pdfs, ExtractionBudget,
+    iter_raw_files, extract_raw_pdfs, get_raw_attachment
+)
+from app.services.cache_service import embed_cache_key
+from app.controllers.request_utils import (
+    add_no_cache_headers, spooled_attachments, send_spooled_file, embed_options, uploaded_files,
+    has_input, input_source, input_attachments, session_uploads
+)
+from app.services.pdf_source import copy_to_path, read_source
+from app.services.metrics_service import timed
+from app.services.stream_service import stream_zip, stream_multipart
+from app.services.batch_service import (
+    embed_batch, batch_output_names, extract_batch, batch_source_ids, MANIFEST_NAME
+)
 
 # Setup logging
 logger = logging.getLogger(__name__)
@@ -13,6 +35,81 @@ logger = logging.getLogger(__name__)
 # Create blueprint
 pdf_bp = Blueprint('pdf', __name__, url_prefix='/api/pdf')
 
+# Output formats supported by the extraction endpoint
+EXTRACT_FORMATS = ('json', 'zip', 'multipart')
+
+# Output formats supported by the batch extraction endpoint
+BATCH_EXTRACT_FORMATS = ('ndjson', 'zip')
+
+# Entry appended to streamed recursive extractions that stopped at a limit
+TRUNCATED_ENTRY_NAME = 'extraction_truncated.json'
+
+# Query parameter values that switch a flag on
+TRUE_VALUES = ('1', 'true', 'yes')
+
+
+def _prime(iterator):
+    """
+    Advances an iterator once so errors raised while opening the PDF surface
+    before the response starts, then returns an equivalent iterator
+    """
+    try:
+        first = next(iterator)
+    except StopIteration:
+        return iter(())
+    return itertools.chain([first], iterator)
+
+
+def _extraction_budget():
+    """
+    Builds the budget for a recursive extraction from the 'depth' query
+    parameter and the configured limits
+
+    Raises:
+        ValueError: If depth is not a number between 1 and EXTRACT_MAX_DEPTH
+    """
+    config = current_app.config
+    max_depth = config['EXTRACT_MAX_DEPTH']
+    depth = request.args.get('depth', str(max_depth))
+    if not depth.isdigit() or not 1 <= int(depth) <= max_depth:
+        raise ValueError(f"Invalid depth '{depth}', expected a number from 1 to {max_depth}")
+    return ExtractionBudget(int(depth), config['EXTRACT_MAX_BYTES'], config['EXTRACT_MAX_OBJECTS'])
+
+
+def _ndjson_lines(results):
+    """Encodes each batch extraction result as one line of JSON"""
+    for result in results:
+        yield json.dumps(result).encode('utf-8') + b'\n'
+
+
+def _batch_zip_entries(results):
+    """
+    Yields (path, data) for every attachment of a batch extraction, under a
+    folder per document, then a manifest of the documents and their folders
+    """
+    manifest = []
+    folders = {MANIFEST_NAME}
+    for result in results:
+        files = result.pop('files', {})
+        if result['status'] == 'done':
+            folder = secure_filename(result['id']) or f"document_{len(manifest) + 1}"
+            if folder in folders:
+                folder = f"{folder}_{len(manifest) + 1}"
+            folders.add(folder)
+            result['folder'] = folder
+            for filename, data in files.items():
+                yield f"{folder}/{filename}", data
+        manifest.append(result)
+    yield MANIFEST_NAME, json.dumps(manifest, indent=2).encode('utf-8')
+
+
+def _nested_entries(pdf_bytes, budget):
+    """Yields (path, data) for every nested attachment, then a note if any were left out"""
+    for nested in iter_nested_files(pdf_bytes, budget):
+        yield nested.path, nested.data
+    if budget.incomplete:
+        yield TRUNCATED_ENTRY_NAME, json.dumps(budget.stats()).encode('utf-8')
+
 
 @pdf_bp.route('/create_embedded_pdf', methods=['POST'])
 def create_embedded_pdf():
@@ -27,18 +124,58 @@ def create_embedded_pdf():
       - in: formData
         name: host_pdf
         type: file
-        required: true
-        description: The host PDF file
+        required: false
+        description: The host PDF file (or host_pdf_upload)
+      - in: formData
+        name: host_pdf_upload
+        type: string
+        required: false
+        description: ID of a finalized upload session holding the host PDF, instead of host_pdf
       - in: formData
         name: attachments[]
         type: array
         items:
           type: file
-        required: true
-        description: One or more PDF files to embed
+        required: false
+        description: One or more PDF files to embed (and/or attachment_uploads[])
+      - in: formData
+        name: attachment_uploads[]
+        type: array
+        items:
+          type: string
+        required: false
+        description: IDs of finalized upload sessions to embed, after any attachments[] files
+      - in: formData
+        name: mode
+        type: string
+        enum: [memory, tempfile, append]
+        default: memory
+        required: false
+        description: >
+          Engine mode; 'tempfile' spools host and output to disk for very large inputs,
+          'append' adds the attachments as an incremental update without rewriting the host
+      - in: formData
+        name: profile
+        type: string
+        enum: [fast, balanced, small]
+        default: balanced
+        required: false
+        description: >
+          Save profile; 'fast' stores attachments uncompressed, 'balanced' deflates
+          attachments that compress and writes object streams, 'small' deflates everything
+      - in: formData
+        name: linearize
+        type: boolean
+        default: false
+        required: false
+        description: Write a linearized ("fast web view") PDF
     responses:
       200:
         description: PDF with embedded files
+        headers:
+          X-Cache:
+            type: string
+            description: HIT when the result was served from the content-addressed cache, MISS otherwise
         content:
           application/pdf:
             schema:
@@ -56,68 +193,92 @@ def create_embedded_pdf():
     response_id = str(uuid.uuid4())
     
     # Add cache control headers to prevent duplicate requests
-    @after_this_request
-    def add_header(response):
-        response.headers['Cache-Control'] = 'no-store, no-cache, must-revalidate, max-age=0'
-        response.headers['Pragma'] = 'no-cache'
-        response.headers['Expires'] = '0'
-        response.headers['X-Response-ID'] = response_id
-        return response
+    add_no_cache_headers(response_id)
     
     # Check if the request was already processed (debug info)
     request_id = request.headers.get('X-Request-ID')
-    logger.info(f"Processing PDF embed request: {request_id}")
+    logger.debug("Processing PDF embed request: %s", request_id)
     
-    # Check if host_pdf is in the request
-    if 'host_pdf' not in request.files:
+    # Check if host_pdf is in the request, as a file or an upload session
+    if not has_input('host_pdf'):
         return jsonify({'error': 'No host PDF provided'}), 400
     
-    # Get the host PDF file
-    host_pdf = request.files['host_pdf']
-    host_pdf_bytes = host_pdf.read()
-    
     # Check if attachments are in the request
     attachments = request.files.getlist('attachments[]')
-    if not attachments:
+    if not attachments and not request.form.getlist('attachment_uploads[]'):
         return jsonify({'error': 'No attachment PDFs provided'}), 400
     
-    # Log the number of attachments received
-    logger.info(f"Received {len(attachments)} attachments")
-    
-    # Read all attachments
-    attachment_bytes = []
-    for attachment in attachments:
-        attachment_data = attachment.read()
-        if attachment_data:  # Only add non-empty files
-            attachment_bytes.append(attachment_data)
+    # Get the host PDF and collect all attachments; large uploads stay on disk
+    try:
+        host_pdf = input_source('host_pdf')
+        attachment_streams, uploaded_names = input_attachments()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
     # Validate we still have attachments after filtering
-    if not attachment_bytes:
+    if not attachment_streams:
         return jsonify({'error': 'No valid attachment PDFs provided'}), 400
     
-    logger.info(f"Processing {len(attachment_bytes)} valid attachments")
+    logger.debug("Received %d attachments, %d valid", len(attachments), len(attachment_streams))
     
+    # Validate the requested engine mode and save profile
     try:
-        # Call the service to embed PDFs
-        result_bytes = embed_pdfs(host_pdf_bytes, attachment_bytes)
-        
-        # Return the result as a downloadable file
-        response = send_file(
-            io.BytesIO(result_bytes),
-            mimetype='application/pdf',
-            as_attachment=True,
-            download_name=f'embedded_result_{response_id[:8]}.pdf'
-        )
+        options = embed_options(request.form)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    # Attachment names are deterministic, so identical inputs give identical results
+    filenames = resolve_filenames(attachment_streams, uploaded_names)
+    cache = current_app.extensions['result_cache']
+    cache_key = embed_cache_key(
+        host_pdf, attachment_streams, filenames,
+        options=(options['profile'], str(options['linearize']), str(options['mode'] == EMBED_MODE_APPEND))
+    )
+    
+    try:
+        # Serve a previously built result straight from the cache, disk
+        # entries as files
+        cached = cache.get_file(cache_key)
+        if cached is not None:
+            cache_status = 'HIT'
+            size = cached.seek(0, os.SEEK_END)
+            cached.seek(0)
+            response = send_file(
+                cached,
+                mimetype='application/pdf',
+                as_attachment=True,
+                download_name=f'embedded_result_{response_id[:8]}.pdf'
+            )
+            response.content_length = size
+        else:
+            # Call the service to embed PDFs into a spooled output file, then
+            # stream that file back in chunks and delete it afterwards
+            cache_status = 'MISS'
+            fd, output_path = tempfile.mkstemp(suffix='.pdf', dir=current_app.config['UPLOAD_SPOOL_DIR'])
+            os.close(fd)
+            try:
+                embed_pdfs_to_path(host_pdf, attachment_streams, output_path, filenames=filenames, **options)
+                cache.set_file(cache_key, output_path)
+                response = send_spooled_file(
+                    output_path,
+                    mimetype='application/pdf',
+                    as_attachment=True,
+                    download_name=f'embedded_result_{response_id[:8]}.pdf'
+                )
+            except Exception:
+                os.unlink(output_path)
+                raise
         
         # Add headers to prevent caching
         response.headers['Cache-Control'] = 'no-store, no-cache, must-revalidate, max-age=0'
         response.headers['Pragma'] = 'no-cache'
         response.headers['Expires'] = '0'
         response.headers['X-Response-ID'] = response_id
+        response.headers['X-Cache'] = cache_status
         
         return response
     except Exception as e:
-        logger.error(f"Error embedding PDFs: {str(e)}")
+        logger.error("Embedding PDFs failed: %s", e)
         return jsonify({'error': str(e)}), 400
 
 
@@ -134,11 +295,49 @@ def extract_embedded_pdf():
       - in: formData
         name: pdf
         type: file
-        required: true
-        description: A PDF file potentially containing embedded files
+        required: false
+        description: A PDF file potentially containing embedded files (or pdf_upload)
+      - in: formData
+        name: pdf_upload
+        type: string
+        required: false
+        description: ID of a finalized upload session holding the PDF, instead of pdf
+      - in: query
+        name: format
+        type: string
+        enum: [json, zip, multipart]
+        default: json
+        required: false
+        description: Response format; 'zip' and 'multipart' stream each attachment without base64 encoding
+      - in: query
+        name: recursive
+        type: boolean
+        default: false
+        required: false
+        description: >
+          Also extract the attachments of attachments that are PDFs, named by
+          their path ('outer.pdf/inner.pdf')
+      - in: query
+        name: depth
+        type: integer
+        required: false
+        description: Deepest nesting level to extract when recursive (defaults to the server maximum)
+      - in: query
+        name: raw
+        type: boolean
+        default: false
+        required: false
+        description: >
+          Return Flate-compressed attachments as stored instead of decompressing
+          them. Multipart parts carry 'Content-Encoding: deflate' and JSON lists
+          them under 'encodings'. Not available with zip or recursive.
+    produces:
+      - application/json
+      - application/zip
+      - multipart/mixed
     responses:
       200:
-        description: Successfully extracted PDFs
+        description: Successfully extracted PDFs (JSON shown; zip and multipart stream raw bytes)
         schema:
           type: object
           properties:
@@ -151,6 +350,17 @@ def extract_embedded_pdf():
                 type: string
                 format: byte
                 description: Base64-encoded PDF content
+            truncated:
+              type: object
+              description: >
+                Recursive mode only; set when a byte or object limit stopped the walk
+                or attachments were skipped as undecodable in bounded pieces (streamed
+                formats end with an extraction_truncated.json entry instead)
+            encodings:
+              type: object
+              description: Raw mode only; 'deflate' for each file returned as zlib data
+              additionalProperties:
+                type: string
       400:
         description: Bad request, missing file or invalid PDF
         schema:
@@ -163,31 +373,481 @@ def extract_embedded_pdf():
     response_id = str(uuid.uuid4())
     
     # Add cache control headers to prevent duplicate requests
-    @after_this_request
-    def add_header(response):
-        response.headers['Cache-Control'] = 'no-store, no-cache, must-revalidate, max-age=0'
-        response.headers['Pragma'] = 'no-cache'
-        response.headers['Expires'] = '0'
-        response.headers['X-Response-ID'] = response_id
-        return response
+    add_no_cache_headers(response_id)
     
-    # Check if pdf is in the request
-    if 'pdf' not in request.files:
+    # Check if pdf is in the request, as a file or an upload session
+    if not has_input('pdf'):
         return jsonify({'error': 'No PDF file provided'}), 400
     
+    # Validate the requested output format
+    output_format = request.args.get('format', 'json')
+    if output_format not in EXTRACT_FORMATS:
+        return jsonify({'error': f"Invalid format '{output_format}', expected one of: {', '.join(EXTRACT_FORMATS)}"}), 400
+    
+    # Recursive extraction walks nested documents within a bounded budget
+    budget = None
+    if request.args.get('recursive', '').lower() in TRUE_VALUES:
+        try:
+            budget = _extraction_budget()
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+    
+    # Raw mode hands out stored Flate data; nested documents must be decoded,
+    # and ZIP entries need the CRC of the decoded data
+    raw = request.args.get('raw', '').lower() in TRUE_VALUES
+    if raw and (budget is not None or output_format == 'zip'):
+        return jsonify({'error': "raw is only available for non-recursive json and multipart extraction"}), 400
+    
     # Get the PDF file
-    pdf_file = request.files['pdf']
-    pdf_bytes = pdf_file.read()
+    try:
+        with timed('upload_read'):
+            pdf_bytes = read_source(input_source('pdf'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    if output_format != 'json':
+        try:
+            if budget is not None:
+                entries = _prime(_nested_entries(pdf_bytes, budget))
+            elif raw:
+                entries = _prime(iter_raw_files(pdf_bytes, current_app.extensions['index_cache']))
+            else:
+                entries = _prime(iter_embedded_files(pdf_bytes, current_app.extensions['index_cache']))
+        except Exception as e:
+            logger.error("Extracting PDFs failed: %s", e)
+            return jsonify({'error': f"Failed to extract attachments: {str(e)}"}), 400
+        
+        # Stream each attachment to the client as it is read
+        if output_format == 'zip':
+            response = Response(stream_zip(entries), mimetype='application/zip')
+            response.headers['Content-Disposition'] = f'attachment; filename=extracted_{response_id[:8]}.zip'
+        else:
+            boundary = uuid.uuid4().hex
+            response = Response(
+                stream_multipart(entries, boundary),
+                content_type=f'multipart/mixed; boundary={boundary}'
+            )
+        return response
     
     try:
+        if budget is not None:
+            count, extracted_files = extract_nested_pdfs(pdf_bytes, budget)
+            with timed('json'):
+                return jsonify({
+                    'count': count,
+                    'files': extracted_files,
+                    'truncated': budget.stats() if budget.incomplete else None
+                })
+        
+        if raw:
+            count, extracted_files, encodings = extract_raw_pdfs(pdf_bytes, current_app.extensions['index_cache'])
+            with timed('json'):
+                return jsonify({
+                    'count': count,
+                    'files': extracted_files,
+                    'encodings': encodings
+                })
+        
         # Call the service to extract PDFs
-        count, extracted_files = extract_pdfs(pdf_bytes)
+        count, extracted_files = extract_pdfs(pdf_bytes, current_app.extensions['index_cache'])
         
         # Return the result as JSON
+        with timed('json'):
+            return jsonify({
+                'count': count,
+                'files': extracted_files
+            })
+    except Exception as e:
+        logger.error("Extracting PDFs failed: %s", e)
+        return jsonify({'error': str(e)}), 400
+
+
+@pdf_bp.route('/attachments', methods=['POST'])
+def list_embedded_attachments():
+    """
+    Lists the embedded files of a document without decoding any of them
+    ---
+    tags:
+      - PDF Operations
+    consumes:
+      - multipart/form-data
+    parameters:
+      - in: formData
+        name: pdf
+        type: file
+        required: false
+        description: A PDF file potentially containing embedded files (or pdf_upload)
+      - in: formData
+        name: pdf_upload
+        type: string
+        required: false
+        description: ID of a finalized upload session holding the PDF, instead of pdf
+    responses:
+      200:
+        description: Attachment metadata
+        schema:
+          type: object
+          properties:
+            count:
+              type: integer
+            attachments:
+              type: array
+              items:
+                type: object
+                properties:
+                  name:
+                    type: string
+                  size:
+                    type: integer
+                  checksum:
+                    type: string
+                    description: Hex-encoded MD5 from /Params /CheckSum
+                  mime_type:
+                    type: string
+      400:
+        description: Bad request, missing file or invalid PDF
+        schema:
+          type: object
+          properties:
+            error:
+              type: string
+    """
+    # Generate a unique response ID to prevent browser caching
+    response_id = str(uuid.uuid4())
+    add_no_cache_headers(response_id)
+    
+    # Check if pdf is in the request, as a file or an upload session
+    if not has_input('pdf'):
+        return jsonify({'error': 'No PDF file provided'}), 400
+    
+    try:
+        pdf_bytes = read_source(input_source('pdf'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    try:
+        attachments = list_attachments(pdf_bytes, current_app.extensions['index_cache'])
         return jsonify({
-            'count': count,
-            'files': extracted_files
+            'count': len(attachments),
+            'attachments': attachments
         })
     except Exception as e:
-        logger.error(f"Error extracting PDFs: {str(e)}")
-        return jsonify({'error': str(e)}), 400
\ No newline at end of file
+        logger.error("Listing attachments failed: %s", e)
+        return jsonify({'error': str(e)}), 400
+
+
+@pdf_bp.route('/attachments/<path:name>', methods=['POST'])
+def fetch_embedded_attachment(name):
+    """
+    Extracts a single embedded file by name, decoding only that stream
+    ---
+    tags:
+      - PDF Operations
+    consumes:
+      - multipart/form-data
+    parameters:
+      - in: path
+        name: name
+        type: string
+        required: true
+        description: Name of the attachment in the EmbeddedFiles name tree
+      - in: formData
+        name: pdf
+        type: file
+        required: false
+        description: A PDF file containing the embedded file (or pdf_upload)
+      - in: formData
+        name: pdf_upload
+        type: string
+        required: false
+        description: ID of a finalized upload session holding the PDF, instead of pdf
+      - in: query
+        name: raw
+        type: boolean
+        default: false
+        required: false
+        description: >
+          Return a Flate-compressed attachment as stored, with
+          'Content-Encoding: deflate', instead of decompressing it
+    responses:
+      200:
+        description: The decoded attachment
+        content:
+          application/pdf:
+            schema:
+              type: string
+              format: binary
+      400:
+        description: Bad request, missing file or invalid PDF
+        schema:
+          type: object
+          properties:
+            error:
+              type: string
+      404:
+        description: No attachment with that name
+        schema:
+          type: object
+          properties:
+            error:
+              type: string
+    """
+    # Generate a unique response ID to prevent browser caching
+    response_id = str(uuid.uuid4())
+    add_no_cache_headers(response_id)
+    
+    # Check if pdf is in the request, as a file or an upload session
+    if not has_input('pdf'):
+        return jsonify({'error': 'No PDF file provided'}), 400
+    
+    try:
+        pdf_bytes = read_source(input_source('pdf'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    raw = request.args.get('raw', '').lower() in TRUE_VALUES
+    try:
+        if raw:
+            metadata, file_data, encoding = get_raw_attachment(pdf_bytes, name, current_app.extensions['index_cache'])
+        else:
+            metadata, file_data = get_attachment(pdf_bytes, name, current_app.extensions['index_cache'])
+            encoding = None
+    except AttachmentNotFoundError as e:
+        return jsonify({'error': str(e)}), 404
+    except Exception as e:
+        logger.error("Extracting attachment failed: %s", e)
+        return jsonify({'error': str(e)}), 400
+    
+    response = send_file(
+        io.BytesIO(file_data),
+        mimetype=metadata['mime_type'] or 'application/octet-stream',
+        as_attachment=True,
+        download_name=name.rsplit('/', 1)[-1]
+    )
+    if encoding is not None:
+        response.headers['Content-Encoding'] = encoding
+    return response
+
+
+@pdf_bp.route('/batch_embed', methods=['POST'])
+def batch_embed_pdfs():
+    """
+    Embeds one shared set of PDFs into many host PDFs in parallel
+    ---
+    tags:
+      - PDF Operations
+    consumes:
+      - multipart/form-data
+    produces:
+      - application/zip
+    parameters:
+      - in: formData
+        name: host_pdfs[]
+        type: array
+        items:
+          type: file
+        required: true
+        description: The host PDF files
+      - in: formData
+        name: attachments[]
+        type: array
+        items:
+          type: file
+        required: true
+        description: One or more PDF files to embed into every host
+      - in: formData
+        name: mode
+        type: string
+        enum: [memory, tempfile, append]
+        default: memory
+        required: false
+        description: Engine mode used for each host
+      - in: formData
+        name: profile
+        type: string
+        enum: [fast, balanced, small]
+        default: balanced
+        required: false
+        description: >
+          Save profile; 'fast' stores attachments uncompressed, 'balanced' deflates
+          attachments that compress and writes object streams, 'small' deflates everything
+      - in: formData
+        name: linearize
+        type: boolean
+        default: false
+        required: false
+        description: Write a linearized ("fast web view") PDF
+    responses:
+      200:
+        description: >
+          ZIP archive streamed as hosts finish, with one '<host>_embedded.pdf'
+          per host and a manifest.json recording failures
+      400:
+        description: Bad request, missing files
+        schema:
+          type: object
+          properties:
+            error:
+              type: string
+    """
+    # Generate a unique response ID to prevent browser caching
+    response_id = str(uuid.uuid4())
+    add_no_cache_headers(response_id)
+    
+    host_files = [f for f in uploaded_files().getlist('host_pdfs[]') if f.filename or f.content_length]
+    if not host_files:
+        return jsonify({'error': 'No host PDFs provided'}), 400
+    
+    attachment_streams, uploaded_names = spooled_attachments(request.files.getlist('attachments[]'))
+    if not attachment_streams:
+        return jsonify({'error': 'No valid attachment PDFs provided'}), 400
+    
+    try:
+        options = embed_options(request.form)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    # Spool hosts and the shared attachments so workers receive only paths
+    work_dir = tempfile.mkdtemp(prefix='pdf_batch_', dir=current_app.config['UPLOAD_SPOOL_DIR'])
+    try:
+        hosts = []
+        output_names = batch_output_names([secure_filename(f.filename or '') for f in host_files])
+        for i, (host_file, output_name) in enumerate(zip(host_files, output_names)):
+            host_path = os.path.join(work_dir, f"host_{i}.pdf")
+            host_file.save(host_path)
+            hosts.append((output_name, host_path))
+        
+        attachment_paths = []
+        for i, attachment_stream in enumerate(attachment_streams):
+            attachment_paths.append(os.path.join(work_dir, f"attachment_{i}.pdf"))
+            copy_to_path(attachment_stream, attachment_paths[-1])
+        
+        job_manager = current_app.extensions['job_manager']
+        results = embed_batch(
+            job_manager.get_executor(),
+            hosts,
+            attachment_paths,
+            resolve_filenames(attachment_streams, uploaded_names),
+            work_dir,
+            max_pending=2 * (job_manager.max_workers or os.cpu_count() or 1),
+            **options
+        )
+    except Exception:
+        shutil.rmtree(work_dir, ignore_errors=True)
+        raise
+    
+    response = Response(stream_zip(results), mimetype='application/zip')
+    response.headers['Content-Disposition'] = f'attachment; filename=batch_embedded_{response_id[:8]}.zip'
+    # The results remove the work directory once consumed; this also covers
+    # a response closed before its body was ever read
+    response.call_on_close(lambda: shutil.rmtree(work_dir, ignore_errors=True))
+    return response
+
+
+@pdf_bp.route('/batch_extract', methods=['POST'])
+def batch_extract_pdfs():
+    """
+    Extracts the embedded PDFs of many documents in parallel, streaming each
+    document's result as soon as it finishes
+    ---
+    tags:
+      - PDF Operations
+    consumes:
+      - multipart/form-data
+    produces:
+      - application/x-ndjson
+      - application/zip
+    parameters:
+      - in: formData
+        name: pdfs[]
+        type: array
+        items:
+          type: file
+        required: false
+        description: The PDF files (and/or pdf_uploads[])
+      - in: formData
+        name: pdf_uploads[]
+        type: array
+        items:
+          type: string
+        required: false
+        description: IDs of finalized upload sessions to extract from, after any pdfs[] files
+      - in: formData
+        name: ids[]
+        type: array
+        items:
+          type: string
+        required: false
+        description: >
+          Source id of each document, in the order pdfs[] then pdf_uploads[];
+          defaults to the uploaded filenames
+      - in: query
+        name: format
+        type: string
+        enum: [ndjson, zip]
+        default: ndjson
+        required: false
+        description: >
+          'ndjson' writes one JSON line per document (id, status, count and
+          base64-encoded files, or error); 'zip' stores each document's
+          attachments under a folder named after its id, then a manifest.json
+    responses:
+      200:
+        description: Results streamed in completion order, each carrying its source id
+      400:
+        description: Bad request, missing files or invalid ids
+        schema:
+          type: object
+          properties:
+            error:
+              type: string
+    """
+    # Generate a unique response ID to prevent browser caching
+    response_id = str(uuid.uuid4())
+    add_no_cache_headers(response_id)
+    
+    output_format = request.args.get('format', 'ndjson')
+    if output_format not in BATCH_EXTRACT_FORMATS:
+        return jsonify({'error': f"Invalid format '{output_format}', expected one of: {', '.join(BATCH_EXTRACT_FORMATS)}"}), 400
+    
+    pdf_files = [f for f in uploaded_files().getlist('pdfs[]') if f.filename or f.content_length]
+    try:
+        upload_paths, upload_names = session_uploads('pdf_uploads[]')
+        source_ids = batch_source_ids(
+            [secure_filename(f.filename or '') for f in pdf_files] + upload_names,
+            request.form.getlist('ids[]')
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if not source_ids:
+        return jsonify({'error': 'No PDF files provided'}), 400
+    
+    # Spool the uploads so workers receive only paths; sessions are already on disk
+    work_dir = tempfile.mkdtemp(prefix='pdf_batch_', dir=current_app.config['UPLOAD_SPOOL_DIR'])
+    try:
+        paths = []
+        for i, pdf_file in enumerate(pdf_files):
+            paths.append(os.path.join(work_dir, f"document_{i}.pdf"))
+            pdf_file.save(paths[-1])
+        
+        job_manager = current_app.extensions['job_manager']
+        results = extract_batch(
+            job_manager.get_executor(),
+            list(zip(source_ids, paths + upload_paths)),
+            work_dir,
+            encoded=output_format == 'ndjson',
+            max_pending=2 * (job_manager.max_workers or os.cpu_count() or 1)
+        )
+    except Exception:
+        shutil.rmtree(work_dir, ignore_errors=True)
+        raise
+    
+    if output_format == 'zip':
+        response = Response(stream_zip(_batch_zip_entries(results)), mimetype='application/zip')
+        response.headers['Content-Disposition'] = f'attachment; filename=batch_extracted_{response_id[:8]}.zip'
+    else:
+        response = Response(_ndjson_lines(results), mimetype='application/x-ndjson')
+    # The results remove the work directory once consumed; this also covers
+    # a response closed before its body was ever read
+    response.call_on_close(lambda: shutil.rmtree(work_dir, ignore_errors=True))
+    return response
@@ -0,0 +1,252 @@
+"""
+Request and response helpers shared by the API controllers
+"""
+import logging
+import os
+import tempfile
+from typing import Any, BinaryIO, Dict, List, Tuple
+from flask import Request, Response, after_this_request, current_app, request, send_file
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.utils import secure_filename
+from app.services.pdf_source import PdfSource, source_size, CHUNK_SIZE
+from app.services.metrics_service import timed
+from app.services.stream_service import content_disposition
+from app.services.pdf_service import (
+    EMBED_MODES, EMBED_MODE_MEMORY, EMBED_MODE_APPEND, SAVE_PROFILES, SAVE_PROFILE_BALANCED
+)
+from app.services.upload_service import UploadConflictError, UploadNotFoundError
+
+# Form values accepted as true for boolean options
+_TRUE_VALUES = ('1', 'true', 'yes', 'on')
+
+# Form fields naming finalized upload sessions, by the file field they stand in for
+UPLOAD_SESSION_FIELDS = {
+    'host_pdf': 'host_pdf_upload',
+    'attachments[]': 'attachment_uploads[]',
+    'pdf': 'pdf_upload',
+    'pdfs[]': 'pdf_uploads[]',
+}
+
+
+# Setup logging
+logger = logging.getLogger(__name__)
+
+
+class SpooledRequest(Request):
+    """
+    Request that keeps small uploaded files in memory and spools larger
+    ones to disk
+    
+    Each multipart file part is written to a SpooledTemporaryFile that rolls
+    over to a real temporary file once it exceeds UPLOAD_SPOOL_THRESHOLD, so
+    the service layer can work from the spooled file instead of bytes.
+    Once a request has sent MAX_ATTACHMENTS files, the next file part is
+    rejected before any of its bytes are spooled.
+    """
+    
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        config = current_app.config
+        self._file_parts = getattr(self, '_file_parts', 0) + 1
+        if self._file_parts > config['MAX_ATTACHMENTS']:
+            raise RequestEntityTooLarge(f"Too many files, at most {config['MAX_ATTACHMENTS']} per request")
+        return tempfile.SpooledTemporaryFile(
+            max_size=config['UPLOAD_SPOOL_THRESHOLD'],
+            dir=config['UPLOAD_SPOOL_DIR']
+        )
+
+
+def uploaded_files():
+    """
+    Returns the request's uploaded files, timing the multipart parse (which
+    spools the uploads) as the upload_read phase on first access
+    """
+    with timed('upload_read'):
+        return request.files
+
+
+def add_no_cache_headers(response_id):
+    """Registers headers that prevent browsers from caching or replaying the response"""
+    @after_this_request
+    def add_header(response):
+        response.headers['Cache-Control'] = 'no-store, no-cache, must-revalidate, max-age=0'
+        response.headers['Pragma'] = 'no-cache'
+        response.headers['Expires'] = '0'
+        response.headers['X-Response-ID'] = response_id
+        return response
+
+
+def spooled_attachments(attachments) -> Tuple[List[BinaryIO], List[str]]:
+    """
+    Collects uploaded attachments without reading them, skipping empty files
+    
+    Args:
+        attachments: List of uploaded FileStorage objects
+    
+    Returns:
+        Tuple containing the spooled attachment streams and their sanitised
+        filenames
+    """
+    attachment_streams = []
+    uploaded_names = []
+    for attachment in attachments:
+        if source_size(attachment.stream) > 0:  # Only add non-empty files
+            attachment_streams.append(attachment.stream)
+            uploaded_names.append(secure_filename(attachment.filename or ''))
+    return attachment_streams, uploaded_names
+
+
+def session_uploads(field: str) -> Tuple[List[str], List[str]]:
+    """
+    Resolves the upload sessions named by a form field to their files
+    
+    Args:
+        field: Form field holding upload session IDs
+    
+    Returns:
+        Tuple containing the session files' paths and their sanitised
+        filenames (empty where the session was given none)
+    
+    Raises:
+        ValueError: If a session does not exist or has not been finalized
+    """
+    uploads = current_app.extensions['upload_manager']
+    paths = []
+    names = []
+    try:
+        for upload_id in request.form.getlist(field):
+            paths.append(uploads.path(upload_id))
+            names.append(secure_filename(uploads.status(upload_id)['filename'] or ''))
+    except (UploadNotFoundError, UploadConflictError) as e:
+        raise ValueError(str(e))
+    return paths, names
+
+
+def has_input(field: str) -> bool:
+    """Tells whether a file field was uploaded or named an upload session instead"""
+    return field in uploaded_files() or bool(request.form.get(UPLOAD_SESSION_FIELDS[field]))
+
+
+def input_source(field: str) -> PdfSource:
+    """
+    Returns the PDF sent for a file field: the file of the upload session
+    named in its place, or else the spooled upload
+    
+    Raises:
+        ValueError: If the named session does not exist or has not been finalized
+    """
+    paths, _ = session_uploads(UPLOAD_SESSION_FIELDS[field])
+    if paths:
+        return paths[0]
+    return request.files[field].stream
+
+
+def input_attachments(field: str = 'attachments[]') -> Tuple[List[PdfSource], List[str]]:
+    """
+    Collects the attachments uploaded in a field, followed by those named as
+    upload sessions, skipping empty files
+    
+    Returns:
+        Tuple containing the attachment sources and their sanitised filenames
+    
+    Raises:
+        ValueError: If a named session does not exist or has not been finalized
+    """
+    attachment_streams, uploaded_names = spooled_attachments(uploaded_files().getlist(field))
+    paths, names = session_uploads(UPLOAD_SESSION_FIELDS[field])
+    return attachment_streams + paths, uploaded_names + names
+
+
+def referenced_upload_bytes() -> int:
+    """
+    Returns the size of the upload sessions a request names, so admission
+    can charge for inputs that are not part of the body
+    
+    Only small bodies are looked at, since reading the form parses (and
+    spools) the body; requests naming sessions carry little else.
+    """
+    if (request.content_length or 0) > current_app.config['UPLOAD_SPOOL_THRESHOLD']:
+        return 0
+    uploads = current_app.extensions['upload_manager']
+    return sum(
+        uploads.size(upload_id)
+        for field in UPLOAD_SESSION_FIELDS.values()
+        for upload_id in request.form.getlist(field)
+    )
+
+
+def embed_options(form) -> Dict[str, Any]:
+    """
+    Reads and validates the embed options shared by the embed endpoints
+    
+    Args:
+        form: The request form
+    
+    Returns:
+        Dict: 'mode', 'profile' and 'linearize' keyword arguments for embed_pdfs
+    
+    Raises:
+        ValueError: If an option has an unsupported value
+    """
+    mode = form.get('mode', EMBED_MODE_MEMORY)
+    if mode not in EMBED_MODES:
+        raise ValueError(f"Invalid mode '{mode}', expected one of: {', '.join(EMBED_MODES)}")
+    
+    profile = form.get('profile', SAVE_PROFILE_BALANCED)
+    if profile not in SAVE_PROFILES:
+        raise ValueError(f"Invalid profile '{profile}', expected one of: {', '.join(SAVE_PROFILES)}")
+    
+    linearize = form.get('linearize', '').lower() in _TRUE_VALUES
+    if linearize and mode == EMBED_MODE_APPEND:
+        raise ValueError("linearize cannot be combined with append mode")
+    return {'mode': mode, 'profile': profile, 'linearize': linearize}
+
+
+def send_spooled_file(path: str, **kwargs):
+    """
+    Sends a temporary file in chunks and deletes it
+    
+    The file is opened and then unlinked straight away; the open handle keeps
+    the data readable until the response has been sent, after which the OS
+    reclaims it. This also works with wsgi.file_wrapper (sendfile), which
+    bypasses response close callbacks. Where open files cannot be unlinked,
+    the file is streamed by a generator that deletes it when done.
+    
+    Args:
+        path: Path of the file to send
+        kwargs: Passed through to flask.send_file
+    
+    Returns:
+        The streaming response
+    """
+    # The file is temporary, so validators derived from it are meaningless
+    kwargs.setdefault('etag', False)
+    kwargs.setdefault('conditional', False)
+    
+    f = open(path, 'rb')
+    try:
+        os.unlink(path)
+    except OSError:
+        f.close()
+        return _send_and_delete(path, **kwargs)
+    response = send_file(f, **kwargs)
+    response.content_length = os.fstat(f.fileno()).st_size
+    return response
+
+
+def _send_and_delete(path: str, mimetype=None, as_attachment=False, download_name=None, **kwargs):
+    """Streams a file through a generator that deletes it once exhausted or closed"""
+    def generate():
+        try:
+            with open(path, 'rb') as f:
+                yield from iter(lambda: f.read(CHUNK_SIZE), b'')
+        finally:
+            try:
+                os.unlink(path)
+            except OSError as e:
+                logger.warning("Could not delete temporary file %s: %s", path, e)
+    
+    response = Response(generate(), mimetype=mimetype)
+    response.headers['Content-Length'] = str(os.path.getsize(path))
+    if as_attachment:
+        response.headers['Content-Disposition'] = content_disposition(download_name or os.path.basename(path))
+    return response
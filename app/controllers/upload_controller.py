@@ -0,0 +1,260 @@
+"""
+Controller for resumable upload session API endpoints
+"""
+from flask import Blueprint, request, jsonify, current_app, url_for
+import logging
+import uuid
+from werkzeug.utils import secure_filename
+from app.services.upload_service import UploadNotFoundError, UploadConflictError, UploadChecksumError
+from app.controllers.request_utils import add_no_cache_headers
+
+# Setup logging
+logger = logging.getLogger(__name__)
+
+# Create blueprint
+upload_bp = Blueprint('uploads', __name__, url_prefix='/api/pdf/uploads')
+
+
+def _upload_response(status):
+    """Adds the session's URL to its status"""
+    body = dict(status)
+    body['upload_url'] = url_for('uploads.get_upload', upload_id=status['upload_id'])
+    return body
+
+
+def _error_response(error):
+    """Maps an upload error to a JSON error response"""
+    if isinstance(error, UploadNotFoundError):
+        return jsonify({'error': str(error)}), 404
+    if isinstance(error, UploadConflictError):
+        # Tells the client where to resume
+        return jsonify({'error': str(error), **_upload_response(error.status)}), 409
+    return jsonify({'error': str(error)}), 400
+
+
+@upload_bp.route('', methods=['POST'])
+def create_upload():
+    """
+    Opens a resumable upload session for a large PDF
+    ---
+    tags:
+      - Uploads
+    consumes:
+      - multipart/form-data
+      - application/x-www-form-urlencoded
+    parameters:
+      - in: formData
+        name: size
+        type: integer
+        required: false
+        description: Total size of the file in bytes, if known; finalizing then requires all of it
+      - in: formData
+        name: filename
+        type: string
+        required: false
+        description: Name the file is embedded under when used as an attachment
+      - in: formData
+        name: sha256
+        type: string
+        required: false
+        description: Hex SHA-256 of the whole file, verified when the session is finalized
+    responses:
+      201:
+        description: Session opened; PUT chunks to upload_url
+        schema:
+          type: object
+          properties:
+            upload_id:
+              type: string
+            status:
+              type: string
+            received:
+              type: integer
+            upload_url:
+              type: string
+      400:
+        description: Invalid size or checksum
+        schema:
+          type: object
+          properties:
+            error:
+              type: string
+    """
+    add_no_cache_headers(str(uuid.uuid4()))
+
+    size = request.form.get('size')
+    if size is not None and not size.isdigit():
+        return jsonify({'error': f"Invalid size '{size}'"}), 400
+    filename = secure_filename(request.form.get('filename', '')) or None
+
+    try:
+        status = current_app.extensions['upload_manager'].create(
+            int(size) if size is not None else None, filename, request.form.get('sha256')
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    response = jsonify(_upload_response(status))
+    response.status_code = 201
+    response.headers['Location'] = url_for('uploads.get_upload', upload_id=status['upload_id'])
+    return response
+
+
+@upload_bp.route('/<upload_id>', methods=['PUT'])
+def put_upload_chunk(upload_id):
+    """
+    Appends a chunk to an upload session
+    ---
+    tags:
+      - Uploads
+    consumes:
+      - application/octet-stream
+    parameters:
+      - in: path
+        name: upload_id
+        type: string
+        required: true
+      - in: query
+        name: offset
+        type: integer
+        required: true
+        description: Byte offset of the chunk; must equal the session's 'received' count
+      - in: header
+        name: X-Chunk-SHA256
+        type: string
+        required: false
+        description: Hex SHA-256 of the chunk; a mismatching chunk is discarded
+      - in: body
+        name: chunk
+        required: true
+        schema:
+          type: string
+          format: binary
+    responses:
+      200:
+        description: Chunk stored (or already stored, matched by checksum or content); 'received' is the next offset
+      400:
+        description: Empty chunk, chunk past the declared size, or checksum mismatch
+      404:
+        description: Unknown or expired session
+      409:
+        description: Wrong offset, session finalized, or another chunk being written; the body has the session status
+    """
+    add_no_cache_headers(str(uuid.uuid4()))
+
+    offset = request.args.get('offset', '')
+    if not offset.isdigit():
+        return jsonify({'error': f"Invalid offset '{offset}'"}), 400
+
+    try:
+        status = current_app.extensions['upload_manager'].write_chunk(
+            upload_id, int(offset), request.stream, request.headers.get('X-Chunk-SHA256')
+        )
+    except (UploadNotFoundError, UploadConflictError, ValueError) as e:
+        if isinstance(e, UploadChecksumError):
+            logger.warning("Rejected chunk at offset %s of upload %s: %s", offset, upload_id, e)
+        return _error_response(e)
+    return jsonify(_upload_response(status))
+
+
+@upload_bp.route('/<upload_id>', methods=['GET'])
+def get_upload(upload_id):
+    """
+    Returns the status of an upload session, including the offset to resume from
+    ---
+    tags:
+      - Uploads
+    parameters:
+      - in: path
+        name: upload_id
+        type: string
+        required: true
+    responses:
+      200:
+        description: Session status (open or complete)
+        schema:
+          type: object
+          properties:
+            upload_id:
+              type: string
+            status:
+              type: string
+            size:
+              type: integer
+            received:
+              type: integer
+            sha256:
+              type: string
+      404:
+        description: Unknown or expired session
+    """
+    add_no_cache_headers(str(uuid.uuid4()))
+
+    try:
+        status = current_app.extensions['upload_manager'].status(upload_id)
+    except UploadNotFoundError as e:
+        return _error_response(e)
+    return jsonify(_upload_response(status))
+
+
+@upload_bp.route('/<upload_id>/finalize', methods=['POST'])
+def finalize_upload(upload_id):
+    """
+    Completes an upload session so its file can be used by the PDF endpoints
+    ---
+    tags:
+      - Uploads
+    parameters:
+      - in: path
+        name: upload_id
+        type: string
+        required: true
+      - in: formData
+        name: sha256
+        type: string
+        required: false
+        description: Hex SHA-256 of the whole file, overriding the one given at creation
+    responses:
+      200:
+        description: >
+          Session complete; pass upload_id as host_pdf_upload, attachment_uploads[]
+          or pdf_upload in place of the file
+      400:
+        description: File checksum mismatch
+      404:
+        description: Unknown or expired session
+      409:
+        description: Chunks are missing, or a chunk is being written
+    """
+    add_no_cache_headers(str(uuid.uuid4()))
+
+    try:
+        status = current_app.extensions['upload_manager'].finalize(upload_id, request.form.get('sha256'))
+    except (UploadNotFoundError, UploadConflictError, ValueError) as e:
+        return _error_response(e)
+    return jsonify(_upload_response(status))
+
+
+@upload_bp.route('/<upload_id>', methods=['DELETE'])
+def delete_upload(upload_id):
+    """
+    Deletes an upload session and its file
+    ---
+    tags:
+      - Uploads
+    parameters:
+      - in: path
+        name: upload_id
+        type: string
+        required: true
+    responses:
+      204:
+        description: Session deleted
+      404:
+        description: Unknown or expired session
+    """
+    try:
+        current_app.extensions['upload_manager'].delete(upload_id)
+    except UploadNotFoundError as e:
+        return _error_response(e)
+    return '', 204
@@ -0,0 +1,154 @@
+"""
+Service for admission control of CPU- and memory-heavy requests
+
+Each request is charged an estimated working set, derived from its body
+size, and admitted only while the total charged to running requests stays
+under a byte budget and the number running stays under a concurrency cap.
+Requests that do not fit wait in a bounded FIFO queue. When the queue is
+full, or a request waits longer than the queue timeout, it is rejected
+straight away with a status and Retry-After hint, rather than being let
+in to push the host into swap.
+"""
+import threading
+import time
+from collections import deque
+from typing import Dict
+
+
+class AdmissionRejected(Exception):
+    """
+    A request could not be admitted
+
+    Attributes:
+        status: 429 when the wait queue is full, 503 when the wait timed out
+        retry_after: Seconds the client should wait before retrying
+    """
+
+    def __init__(self, message: str, status: int, retry_after: int):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+class AdmissionTicket:
+    """A request's share of the admission budget, released exactly once"""
+
+    def __init__(self, controller: 'AdmissionController', cost: int):
+        self.controller = controller
+        self.cost = cost
+        self._released = False
+        self._lock = threading.Lock()
+
+    def release(self) -> None:
+        with self._lock:
+            if self._released:
+                return
+            self._released = True
+        self.controller._release(self.cost)
+
+
+class AdmissionController:
+    """
+    Byte-budget semaphore with a concurrency cap and a bounded wait queue
+
+    Args:
+        max_bytes: Total estimated working set running requests may hold
+        max_concurrent: Requests that may run at once
+        queue_size: Requests that may wait for admission; more are rejected
+        queue_timeout: Seconds a request may wait before it is rejected
+        retry_after: Retry-After hint given with rejections, in seconds
+    """
+
+    def __init__(self, max_bytes: int, max_concurrent: int, queue_size: int,
+                 queue_timeout: float, retry_after: int):
+        self.max_bytes = max_bytes
+        self.max_concurrent = max_concurrent
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+        self._cond = threading.Condition()
+        self._bytes_in_use = 0
+        self._running = 0
+        self._waiters = deque()
+
+    def _fits(self, cost: int) -> bool:
+        return self._running < self.max_concurrent and self._bytes_in_use + cost <= self.max_bytes
+
+    def _take(self, cost: int) -> None:
+        self._running += 1
+        self._bytes_in_use += cost
+
+    def acquire(self, cost: int) -> AdmissionTicket:
+        """
+        Admits a request, waiting in the queue if the budget is in use
+
+        A request costing more than the whole budget is charged the whole
+        budget, so it runs alone rather than never.
+
+        Args:
+            cost: Estimated working set of the request in bytes
+
+        Returns:
+            AdmissionTicket: To be released when the request has finished
+
+        Raises:
+            AdmissionRejected: If the queue is full or the wait timed out
+        """
+        cost = min(cost, self.max_bytes)
+        with self._cond:
+            # Jumping the queue when it is empty keeps the common case cheap;
+            # otherwise arrivals wait their turn so large requests are not starved
+            if not self._waiters and self._fits(cost):
+                self._take(cost)
+                return AdmissionTicket(self, cost)
+            if len(self._waiters) >= self.queue_size:
+                raise AdmissionRejected("Server is busy, too many requests waiting", 429, self.retry_after)
+
+            token = object()
+            self._waiters.append(token)
+            deadline = time.monotonic() + self.queue_timeout
+            try:
+                while not (self._waiters[0] is token and self._fits(cost)):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise AdmissionRejected("Server is busy, timed out waiting for capacity", 503,
+                                                self.retry_after)
+                    self._cond.wait(remaining)
+                self._take(cost)
+                return AdmissionTicket(self, cost)
+            finally:
+                self._waiters.remove(token)
+                # The next waiter may now be at the head of the queue
+                self._cond.notify_all()
+
+    def _release(self, cost: int) -> None:
+        with self._cond:
+            self._running -= 1
+            self._bytes_in_use -= cost
+            self._cond.notify_all()
+
+    def stats(self) -> Dict[str, int]:
+        """Returns the requests running and waiting and the bytes charged"""
+        with self._cond:
+            return {
+                'running': self._running,
+                'waiting': len(self._waiters),
+                'bytes_in_use': self._bytes_in_use,
+                'max_bytes': self.max_bytes,
+            }
+
+
+def estimate_working_set(content_length: int, factor: float, base: int) -> int:
+    """
+    Estimates the peak memory a request needs from its body size
+
+    Args:
+        content_length: Request body size in bytes (0 when unknown)
+        factor: Multiple of the body size the request is expected to hold,
+            covering parsed documents, output buffers and encodings
+        base: Fixed overhead charged to every request
+
+    Returns:
+        int: Estimated working set in bytes
+    """
+    return base + int(content_length * factor)
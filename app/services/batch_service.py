@@ -0,0 +1,254 @@
+"""
+Service for batch operations run in parallel on the process pool: embedding
+one shared attachment set into many host PDFs, and extracting the
+attachments of many PDFs
+
+Inputs are spooled to a work directory before the batch starts. Tasks sent
+to the process pool carry only file paths, so the shared attachments are
+never pickled per task: each worker process reads the spooled attachment
+files once per batch and reuses the bytes for every host it handles.
+"""
+import itertools
+import json
+import logging
+import os
+import shutil
+from concurrent.futures import FIRST_COMPLETED, Executor, wait
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from app.services.pdf_service import (
+    embed_pdfs_to_path, extract_pdfs, iter_embedded_files, EMBED_MODE_MEMORY, SAVE_PROFILE_BALANCED
+)
+from app.services.log_service import log_summary
+
+# Setup logging
+logger = logging.getLogger(__name__)
+
+# Name of the per-batch summary entry appended to the results
+MANIFEST_NAME = 'manifest.json'
+
+# Attachment set loaded by this worker process, keyed by its spool paths
+_shared_attachments: Dict[Tuple[str, ...], List[bytes]] = {}
+
+
+def _load_shared_attachments(paths: List[str]) -> List[bytes]:
+    """
+    Returns the attachment set for a batch, reading the spool files only on
+    the first task this worker process runs for that batch
+    """
+    key = tuple(paths)
+    attachments = _shared_attachments.get(key)
+    if attachments is None:
+        attachments = []
+        for path in paths:
+            with open(path, 'rb') as f:
+                attachments.append(f.read())
+        # Keep only the current batch's set
+        _shared_attachments.clear()
+        _shared_attachments[key] = attachments
+    return attachments
+
+
+def _embed_spooled(host_path: str, attachment_paths: List[str], filenames: List[str],
+                   mode: str, profile: str, linearize: bool, output_path: str) -> int:
+    """
+    Embeds the shared attachments into one spooled host PDF (runs in a worker)
+
+    Returns:
+        int: Size of the written output in bytes
+    """
+    return embed_pdfs_to_path(
+        host_path, _load_shared_attachments(attachment_paths), output_path,
+        mode=mode, filenames=filenames, profile=profile, linearize=linearize
+    )
+
+
+def embed_batch(executor: Executor, hosts: List[Tuple[str, str]], attachment_paths: List[str],
+                filenames: List[str], work_dir: str, mode: str = EMBED_MODE_MEMORY,
+                profile: str = SAVE_PROFILE_BALANCED, linearize: bool = False,
+                max_pending: int = 8) -> Iterator[Tuple[str, bytes]]:
+    """
+    Embeds a shared attachment set into many host PDFs across a process pool
+
+    Results are yielded as soon as each host finishes, followed by a JSON
+    manifest recording the outcome for every host. At most max_pending hosts
+    are queued or running at a time, as in extract_batch, so finished
+    outputs do not pile up on disk ahead of a slow reader. The work
+    directory is removed once the iterator is exhausted or closed.
+
+    Args:
+        executor: Process pool to run the embeds on
+        hosts: (output name, spooled host path) for each host PDF
+        attachment_paths: Spooled attachment files shared by every host
+        filenames: Name for each attachment (see resolve_filenames)
+        work_dir: Directory holding the spooled inputs, used for outputs too
+        mode: Engine mode passed to embed_pdfs
+        profile: Save profile passed to embed_pdfs
+        linearize: Whether to write linearized PDFs
+        max_pending: Most hosts submitted to the pool at once
+
+    Yields:
+        Tuple containing the output name and the embedded PDF bytes
+    """
+    manifest = []
+    queue = enumerate(hosts)
+    running = {}
+    try:
+        while True:
+            for i, (output_name, host_path) in itertools.islice(queue, max_pending - len(running)):
+                output_path = os.path.join(work_dir, f"output_{i}.pdf")
+                future = executor.submit(
+                    _embed_spooled, host_path, attachment_paths, filenames, mode, profile, linearize, output_path
+                )
+                running[future] = (output_name, output_path)
+            if not running:
+                break
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                output_name, output_path = running.pop(future)
+                try:
+                    size = future.result()
+                except Exception as e:
+                    # The detail can name spool paths, so it stays in the log
+                    logger.error("Embedding into %s failed: %s", output_name, e)
+                    manifest.append({'name': output_name, 'status': 'failed',
+                                     'error': 'Could not embed the attachments into this PDF'})
+                    continue
+
+                with open(output_path, 'rb') as f:
+                    result = f.read()
+                os.unlink(output_path)
+                manifest.append({'name': output_name, 'status': 'done', 'size': size})
+                yield output_name, result
+
+        yield MANIFEST_NAME, json.dumps(manifest, indent=2).encode('utf-8')
+        log_summary(logger, 'batch_embed', hosts=len(hosts), attachments=len(attachment_paths),
+                    failed=sum(1 for item in manifest if item['status'] == 'failed'))
+    finally:
+        for future in running:
+            future.cancel()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def batch_output_names(host_names: List[Optional[str]]) -> List[str]:
+    """
+    Derives a unique output name for each host PDF
+
+    Args:
+        host_names: Uploaded filename of each host (may be empty)
+
+    Returns:
+        List: '<stem>_embedded.pdf' per host, disambiguated where repeated
+    """
+    names = []
+    used = {MANIFEST_NAME}
+    for i, host_name in enumerate(host_names):
+        stem = os.path.splitext(host_name)[0] if host_name else f"host_{i+1}"
+        name = f"{stem}_embedded.pdf"
+        if name in used:
+            name = f"{stem}_{i+1}_embedded.pdf"
+        used.add(name)
+        names.append(name)
+    return names
+
+
+def _extract_spooled(path: str, encoded: bool) -> Tuple[int, Dict[str, Any]]:
+    """
+    Extracts the attachments of one spooled PDF (runs in a worker)
+
+    Returns:
+        Tuple containing the attachment count and a dictionary mapping
+        filenames to base64 strings (encoded) or to bytes
+    """
+    with open(path, 'rb') as f:
+        pdf_data = f.read()
+    if encoded:
+        return extract_pdfs(pdf_data)
+    files = dict(iter_embedded_files(pdf_data))
+    return len(files), files
+
+
+def extract_batch(executor: Executor, sources: List[Tuple[str, str]], work_dir: str,
+                  encoded: bool = True, max_pending: int = 8) -> Iterator[Dict[str, Any]]:
+    """
+    Extracts the attachments of many PDFs across a process pool
+
+    A result is yielded as soon as its document finishes, so one slow
+    document does not hold back the others. At most max_pending documents
+    are queued or running at a time; the rest are submitted as results are
+    consumed, so a slow reader does not let finished results pile up. The
+    work directory is removed once the iterator is exhausted or closed.
+
+    Args:
+        executor: Process pool to run the extractions on
+        sources: (source id, path) for each PDF
+        work_dir: Directory holding the spooled inputs
+        encoded: Return attachments base64-encoded (as extract_pdfs does)
+            rather than as bytes
+        max_pending: Most documents submitted to the pool at once
+
+    Yields:
+        Dict: 'id' and 'status' for each document, in completion order, with
+            'count' and 'files' when it is 'done' or 'error' when 'failed'
+    """
+    queue = iter(sources)
+    running = {}
+    failed = 0
+    try:
+        while True:
+            for source_id, path in itertools.islice(queue, max_pending - len(running)):
+                running[executor.submit(_extract_spooled, path, encoded)] = source_id
+            if not running:
+                break
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                source_id = running.pop(future)
+                try:
+                    count, files = future.result()
+                except Exception as e:
+                    # The detail can name spool paths, so it stays in the log
+                    logger.error("Extracting from %s failed: %s", source_id, e)
+                    failed += 1
+                    yield {'id': source_id, 'status': 'failed', 'error': 'Could not extract attachments from this PDF'}
+                    continue
+                yield {'id': source_id, 'status': 'done', 'count': count, 'files': files}
+
+        log_summary(logger, 'batch_extract', documents=len(sources), failed=failed)
+    finally:
+        for future in running:
+            future.cancel()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def batch_source_ids(source_names: List[Optional[str]], ids: Optional[List[str]] = None) -> List[str]:
+    """
+    Assigns each document of a batch extraction its source id
+
+    Args:
+        source_names: Uploaded filename of each document (may be empty)
+        ids: Ids given by the client, one per document, if any
+
+    Returns:
+        List: The given ids, or else each document's filename (or
+            'document_<n>'), disambiguated where repeated
+
+    Raises:
+        ValueError: If the given ids do not match the documents or repeat
+    """
+    if ids:
+        if len(ids) != len(source_names):
+            raise ValueError(f"Got {len(ids)} ids for {len(source_names)} documents")
+        if len(set(ids)) != len(ids):
+            raise ValueError("Source ids must be unique")
+        return list(ids)
+
+    names = []
+    used = set()
+    for i, source_name in enumerate(source_names):
+        name = source_name or f"document_{i+1}"
+        if name in used:
+            stem, ext = os.path.splitext(name)
+            name = f"{stem}_{i+1}{ext}"
+        used.add(name)
+        names.append(name)
+    return names
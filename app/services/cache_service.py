@@ -0,0 +1,338 @@
+"""
+Service for caching generated PDFs by the content they were built from
+"""
+import hashlib
+import io
+import logging
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Any, BinaryIO, Callable, Dict, List, Optional, Tuple
+
+from app.services.pdf_source import PdfSource, iter_chunks, source_size
+
+# Setup logging
+logger = logging.getLogger(__name__)
+
+# Cache backends supported by create_cache
+CACHE_BACKENDS = ('memory', 'disk', 'none')
+
+
+def content_key(*parts: bytes) -> str:
+    """
+    Hashes a sequence of byte strings into a cache key
+
+    Each part is length-prefixed, so different splits of the same bytes
+    never produce the same key.
+
+    Args:
+        parts: Byte strings (host PDF, attachments, names, options...)
+
+    Returns:
+        str: Hex-encoded SHA-256 digest
+    """
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(len(part).to_bytes(8, 'big'))
+        digest.update(part)
+    return digest.hexdigest()
+
+
+def embed_cache_key(host_pdf: PdfSource, attachments: List[PdfSource], filenames: List[str],
+                    options: Tuple[str, ...] = ()) -> str:
+    """
+    Returns the cache key for an embed_pdfs call
+
+    Inputs spooled to disk are hashed in chunks rather than read whole.
+    Options that change the output (save profile, linearization...) must
+    be passed so results built with different settings never collide.
+    """
+    digest = hashlib.sha256()
+
+    def update(source):
+        digest.update(source_size(source).to_bytes(8, 'big'))
+        for chunk in iter_chunks(source):
+            digest.update(chunk)
+
+    update(b'embed')
+    for option in options:
+        update(option.encode('utf-8'))
+    update(host_pdf)
+    for source, name in zip(attachments, filenames):
+        update(name.encode('utf-8'))
+        update(source)
+    return digest.hexdigest()
+
+
+def _stats(cache, entries: int) -> Dict[str, int]:
+    return {
+        'hits': cache.hits,
+        'misses': cache.misses,
+        'entries': entries,
+        'size_bytes': cache.size,
+        'max_bytes': cache.max_bytes,
+    }
+
+
+class MemoryCache:
+    """
+    In-process LRU cache bounded by the total size of its values
+
+    Values are bytes by default; other objects can be cached by passing a
+    size_of callable that estimates their memory footprint. Values larger
+    than max_item_bytes are not cached, so large results keep being
+    streamed from disk instead of being held in memory.
+    """
+
+    def __init__(self, max_bytes: int, size_of: Callable[[Any], int] = len,
+                 max_item_bytes: Optional[int] = None):
+        self.max_bytes = max_bytes
+        self.max_item_bytes = min(max_item_bytes or max_bytes, max_bytes)
+        self.size_of = size_of
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        """Returns the cached value and marks it most recently used"""
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def get_file(self, key: str) -> Optional[BinaryIO]:
+        """Returns the cached bytes as a file object, or None"""
+        value = self.get(key)
+        return io.BytesIO(value) if value is not None else None
+
+    def set(self, key: str, value: Any) -> None:
+        """Stores a value, evicting least recently used entries to fit"""
+        if self.size_of(value) > self.max_item_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= self.size_of(old)
+            self._entries[key] = value
+            self._size += self.size_of(value)
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= self.size_of(evicted)
+
+    def set_file(self, key: str, path: str) -> None:
+        """Stores the contents of a file, if it is small enough to cache"""
+        if os.path.getsize(path) > self.max_item_bytes:
+            return
+        with open(path, 'rb') as f:
+            self.set(key, f.read())
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    def stats(self) -> Dict[str, int]:
+        """Returns hit/miss counters and current occupancy"""
+        return _stats(self, len(self._entries))
+
+
+class DiskCache:
+    """
+    LRU cache storing each value as a file in a directory
+
+    The directory is the cache's only state: recency is the files'
+    modification times, refreshed on every hit, and the size limit is
+    enforced by scanning the directory after each write. Several worker
+    processes sharing the directory therefore share one limit, and a
+    restarted worker keeps the entries already on disk.
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries = 0
+        self._size = 0
+        self._evict_lock = threading.Lock()
+
+        os.makedirs(directory, exist_ok=True)
+        self._evict()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key)
+
+    def _scan(self) -> List[Tuple[float, str, int]]:
+        """Lists (mtime, path, size) of every cached file, whichever process wrote it"""
+        files = []
+        for name in os.listdir(self.directory):
+            if name.endswith('.tmp'):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                # Evicted by another process meanwhile
+                continue
+            if os.path.isfile(path):
+                files.append((stat.st_mtime, path, stat.st_size))
+        return files
+
+    def _evict(self) -> None:
+        """Deletes the least recently used files until the directory fits max_bytes"""
+        # A thread already evicting will see this write, or the next one will
+        if not self._evict_lock.acquire(blocking=False):
+            return
+        try:
+            files = sorted(self._scan())
+            size = sum(file_size for _, _, file_size in files)
+            entries = len(files)
+            for _, path, file_size in files:
+                if size <= self.max_bytes:
+                    break
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
+                except OSError as e:
+                    logger.warning("Could not delete cache file %s: %s", path, e)
+                    continue
+                size -= file_size
+                entries -= 1
+            self._size = size
+            self._entries = entries
+        finally:
+            self._evict_lock.release()
+
+    def get_file(self, key: str) -> Optional[BinaryIO]:
+        """
+        Opens the cached file and marks it most recently used
+
+        The open handle stays readable even if the file is evicted while
+        it is being sent.
+        """
+        path = self._path(key)
+        try:
+            f = open(path, 'rb')
+            os.utime(path)
+        except OSError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return f
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Returns the cached value and marks it most recently used"""
+        f = self.get_file(key)
+        if f is None:
+            return None
+        with f:
+            return f.read()
+
+    def _store(self, key: str, write: Callable[[str], None]) -> None:
+        """Writes a value to a temporary file, moves it into place and evicts"""
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        os.close(fd)
+        try:
+            write(temp_path)
+            os.replace(temp_path, self._path(key))
+        except OSError as e:
+            logger.warning("Could not write cache file %s: %s", key, e)
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            return
+        self._evict()
+
+    def set(self, key: str, value: bytes) -> None:
+        """Stores a value atomically, evicting least recently used files to fit"""
+        if len(value) > self.max_bytes:
+            return
+
+        def write(path):
+            with open(path, 'wb') as f:
+                f.write(value)
+        self._store(key, write)
+
+    def set_file(self, key: str, path: str) -> None:
+        """
+        Stores a file without reading it into memory, as a hard link where
+        the file is on the same file system and as a copy otherwise
+        """
+        if os.path.getsize(path) > self.max_bytes:
+            return
+
+        def write(temp_path):
+            os.unlink(temp_path)
+            try:
+                os.link(path, temp_path)
+            except OSError:
+                shutil.copyfile(path, temp_path)
+        self._store(key, write)
+
+    @property
+    def size(self) -> int:
+        """Size of the shared directory as of the last write"""
+        return self._size
+
+    def stats(self) -> Dict[str, int]:
+        """Returns hit/miss counters and the occupancy as of the last write"""
+        return _stats(self, self._entries)
+
+
+class NullCache:
+    """Cache backend that stores nothing"""
+
+    max_bytes = 0
+    size = 0
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[bytes]:
+        self.misses += 1
+        return None
+
+    def get_file(self, key: str) -> Optional[BinaryIO]:
+        self.misses += 1
+        return None
+
+    def set(self, key: str, value: bytes) -> None:
+        pass
+
+    def set_file(self, key: str, path: str) -> None:
+        pass
+
+    def stats(self) -> Dict[str, int]:
+        """Returns hit/miss counters and current occupancy"""
+        return _stats(self, 0)
+
+
+def create_cache(backend: str, max_bytes: int, directory: Optional[str] = None,
+                 max_item_bytes: Optional[int] = None):
+    """
+    Creates a result cache
+
+    Args:
+        backend: 'memory', 'disk' or 'none'
+        max_bytes: Upper bound on the total size of cached values
+        directory: Directory for the disk backend
+        max_item_bytes: Largest value the memory backend keeps
+
+    Returns:
+        A MemoryCache, DiskCache or NullCache
+    """
+    if backend not in CACHE_BACKENDS:
+        raise ValueError(f"Unknown cache backend: {backend}")
+    if backend == 'memory':
+        return MemoryCache(max_bytes, max_item_bytes=max_item_bytes)
+    if backend == 'disk':
+        return DiskCache(directory, max_bytes)
+    return NullCache()
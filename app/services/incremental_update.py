@@ -0,0 +1,154 @@
+"""
+Service for appending incremental updates to PDFs (ISO 32000-1, 7.5.6)
+
+An incremental update leaves the original bytes untouched and appends the
+new and changed objects, a cross-reference section listing only those
+objects, and a trailer whose /Prev points at the previous cross-reference
+section. Readers take each object from the newest section that lists it,
+so the cost of an update follows the size of the objects written, not the
+size of the file being updated.
+"""
+from __future__ import annotations
+import re
+from typing import BinaryIO, Iterable, List, NamedTuple
+
+from app.services.lazy_import import lazy_import
+from app.services.pdf_source import PdfSource, read_range, read_tail, source_size
+
+pikepdf = lazy_import('pikepdf')
+
+# How far back from the end of the file to look for startxref
+TAIL_SIZE = 4096
+
+# How much of the section startxref points at to check
+XREF_HEAD_SIZE = 1024
+
+_STARTXREF = re.compile(rb'startxref\s+(\d+)')
+_XREF_TABLE = re.compile(rb'\s*xref\b')
+_XREF_STREAM = re.compile(rb'\s*\d+\s+\d+\s+obj\b.*?/Type\s*/XRef\b', re.DOTALL)
+_RECONSTRUCTED = re.compile(r'reconstruct|file is damaged', re.IGNORECASE)
+
+
+class UpdateBase(NamedTuple):
+    """The end of the file an incremental update is appended to"""
+    size: int
+    startxref: int
+    ends_with_eol: bool
+
+
+def read_base(source: PdfSource) -> UpdateBase:
+    """
+    Locates the last cross-reference section of a PDF
+
+    Args:
+        source: The PDF as bytes, a path or a seekable file object
+
+    Returns:
+        UpdateBase: File size, offset of the last xref section, and whether
+        the file ends with an end-of-line marker
+
+    Raises:
+        ValueError: If the file has no startxref, or it does not point at
+            an xref table or xref stream to chain the update to
+    """
+    tail = read_tail(source, TAIL_SIZE)
+    matches = list(_STARTXREF.finditer(tail))
+    if not matches:
+        raise ValueError("PDF has no startxref and cannot be updated incrementally")
+    startxref = int(matches[-1].group(1))
+    head = read_range(source, startxref, XREF_HEAD_SIZE)
+    if not (_XREF_TABLE.match(head) or _XREF_STREAM.match(head)):
+        raise ValueError("PDF startxref does not point at a cross-reference section and "
+                         "cannot be updated incrementally")
+    return UpdateBase(source_size(source), startxref, tail.endswith((b'\n', b'\r')))
+
+
+def check_updatable(pdf: pikepdf.Pdf) -> None:
+    """
+    Raises ValueError if objects cannot be appended to a PDF as plain text
+
+    Encrypted files would need every appended string and stream encrypted,
+    and files qpdf had to reconstruct have no trustworthy xref to chain to.
+    """
+    if pdf.is_encrypted:
+        raise ValueError("Encrypted PDFs cannot be updated incrementally")
+    if pdf.trailer.get('/Root') is None or '/Size' not in pdf.trailer:
+        raise ValueError("PDF trailer is incomplete and cannot be updated incrementally")
+    if any(_RECONSTRUCTED.search(warning) for warning in pdf.get_warnings()):
+        raise ValueError("PDF is damaged and cannot be updated incrementally; "
+                         "embed it in memory or tempfile mode to rewrite it")
+
+
+def _serialize(obj: pikepdf.Object) -> List[bytes]:
+    """Returns the pieces of an indirect object definition"""
+    num, gen = obj.objgen
+    header = b'%d %d obj\n' % (num, gen)
+    if isinstance(obj, pikepdf.Stream):
+        # Stream data is written as stored, without decoding or re-encoding
+        data = obj.read_raw_bytes()
+        obj.stream_dict.Length = len(data)
+        return [header, obj.stream_dict.unparse(), b'\nstream\n', data, b'\nendstream\nendobj\n']
+    return [header, obj.unparse(resolved=True), b'\nendobj\n']
+
+
+def _subsections(numbers: List[int]) -> List[List[int]]:
+    """Splits sorted object numbers into runs of consecutive numbers"""
+    runs = []
+    for num in numbers:
+        if runs and runs[-1][-1] + 1 == num:
+            runs[-1].append(num)
+        else:
+            runs.append([num])
+    return runs
+
+
+def write_update(output: BinaryIO, base: UpdateBase, pdf: pikepdf.Pdf,
+                 objects: Iterable[pikepdf.Object]) -> int:
+    """
+    Appends objects, a cross-reference section and a trailer to a PDF
+
+    Args:
+        output: Binary stream positioned at the end of the original file
+        base: The original file's end, from read_base
+        pdf: The open PDF the objects belong to
+        objects: Indirect objects to write; repeats are written once
+
+    Returns:
+        int: Number of bytes appended
+    """
+    position = base.size
+    xref = {}
+
+    def write(data: bytes) -> None:
+        nonlocal position
+        output.write(data)
+        position += len(data)
+
+    if not base.ends_with_eol:
+        write(b'\n')
+
+    for obj in objects:
+        num, gen = obj.objgen
+        if num == 0 or num in xref:
+            continue
+        xref[num] = (position, gen)
+        for piece in _serialize(obj):
+            write(piece)
+
+    xref_offset = position
+    write(b'xref\n')
+    for run in _subsections(sorted(xref)):
+        write(b'%d %d\n' % (run[0], len(run)))
+        for num in run:
+            write(b'%010d %05d n\r\n' % xref[num])
+
+    trailer = pikepdf.Dictionary(
+        Size=max([int(pdf.trailer.Size)] + [num + 1 for num in xref]),
+        Root=pdf.Root,
+        Prev=base.startxref
+    )
+    for key in ('/Info', '/ID'):
+        if key in pdf.trailer:
+            trailer[key] = pdf.trailer[key]
+    write(b'trailer\n' + trailer.unparse() + b'\nstartxref\n' + str(xref_offset).encode('ascii') + b'\n%%EOF\n')
+    return position - base.size
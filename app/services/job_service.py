@@ -0,0 +1,267 @@
+"""
+Service for running embed/extract operations as background jobs
+
+Each job lives in its own directory under a spool directory:
+
+    <spool>/<job_id>/status.json     job state, written atomically
+    <spool>/<job_id>/input/...       uploaded files
+    <spool>/<job_id>/result.<ext>    output, once the job is done
+
+Work runs in a local process pool, so request threads only spool the
+uploads and return. Because all state is on disk, any worker process
+sharing the spool directory can report a job's status or serve its result.
+Expired jobs are swept whenever jobs are submitted or looked up, including
+jobs left queued or running by a server process that died.
+"""
+import json
+import logging
+import multiprocessing
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from app.services.pdf_service import embed_pdfs_to_path, extract_pdfs, EMBED_MODE_MEMORY, SAVE_PROFILE_BALANCED
+from app.services.pdf_source import PdfSource, copy_to_path
+from app.services.log_service import configure_worker_logging, logging_settings
+from app.services.spool import write_json
+
+# Setup logging
+logger = logging.getLogger(__name__)
+
+# Job operations and states
+JOB_OPERATIONS = ('embed', 'extract')
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_DONE = 'done'
+JOB_FAILED = 'failed'
+
+# Result file name and MIME type for each operation
+RESULT_FILES = {
+    'embed': ('result.pdf', 'application/pdf'),
+    'extract': ('result.json', 'application/json'),
+}
+
+_JOB_ID = re.compile(r'^[0-9a-f]{32}$')
+
+# Minimum time between two sweeps of expired jobs
+_SWEEP_INTERVAL = 60
+
+
+def _update_status(job_dir: str, **changes) -> Dict[str, Any]:
+    """Merges changes into a job's status file"""
+    path = os.path.join(job_dir, 'status.json')
+    with open(path) as f:
+        status = json.load(f)
+    status.update(changes)
+    write_json(path, status)
+    return status
+
+
+def _run_job(job_dir: str, operation: str, options: Dict[str, Any]) -> None:
+    """
+    Runs one job inside a pool worker process
+
+    Args:
+        job_dir: The job's spool directory
+        operation: 'embed' or 'extract'
+        options: Operation options (input file names, embed mode, save profile...)
+    """
+    _update_status(job_dir, status=JOB_RUNNING, started_at=time.time())
+    input_dir = os.path.join(job_dir, 'input')
+    result_name, _ = RESULT_FILES[operation]
+    result_path = os.path.join(job_dir, result_name)
+
+    try:
+        if operation == 'embed':
+            # Work straight from the spooled files; they are read as needed
+            embed_pdfs_to_path(
+                os.path.join(input_dir, 'host.pdf'),
+                [os.path.join(input_dir, name) for name in options['attachments']],
+                result_path + '.tmp',
+                mode=options.get('mode', EMBED_MODE_MEMORY),
+                filenames=options.get('filenames'),
+                profile=options.get('profile', SAVE_PROFILE_BALANCED),
+                linearize=options.get('linearize', False)
+            )
+        else:
+            with open(os.path.join(input_dir, 'document.pdf'), 'rb') as f:
+                pdf_data = f.read()
+            count, files = extract_pdfs(pdf_data)
+            with open(result_path + '.tmp', 'w') as f:
+                json.dump({'count': count, 'files': files}, f)
+        os.replace(result_path + '.tmp', result_path)
+
+        _update_status(job_dir, status=JOB_DONE, finished_at=time.time(),
+                       result_bytes=os.path.getsize(result_path))
+    except Exception as e:
+        logger.error("Job %s failed: %s", os.path.basename(job_dir), e)
+        _update_status(job_dir, status=JOB_FAILED, finished_at=time.time(), error=str(e))
+    finally:
+        # Inputs are no longer needed once the job has finished
+        shutil.rmtree(input_dir, ignore_errors=True)
+
+
+class JobManager:
+    """Spools job inputs and dispatches the work to a process pool"""
+
+    def __init__(self, spool_dir: str, max_workers: Optional[int] = None, ttl_seconds: int = 3600,
+                 max_runtime_seconds: int = 6 * 3600):
+        self.spool_dir = spool_dir
+        self.max_workers = max_workers
+        self.ttl_seconds = ttl_seconds
+        self.max_runtime_seconds = max_runtime_seconds
+        self._executor = None
+        self._lock = threading.Lock()
+        self._last_sweep = 0.0
+        os.makedirs(spool_dir, exist_ok=True)
+
+    def get_executor(self) -> ProcessPoolExecutor:
+        """
+        Returns the worker pool, creating it on first use so it is never
+        inherited across a fork; batch operations share it with jobs
+        """
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=configure_worker_logging,
+                    initargs=(logging_settings(),)
+                )
+            return self._executor
+
+    def _job_dir(self, job_id: str) -> Optional[str]:
+        if not _JOB_ID.match(job_id):
+            return None
+        job_dir = os.path.join(self.spool_dir, job_id)
+        return job_dir if os.path.isdir(job_dir) else None
+
+    def submit(self, operation: str, files: Dict[str, PdfSource], options: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Spools a job's inputs and queues it
+
+        Args:
+            operation: 'embed' or 'extract'
+            files: Input file name -> bytes, path or file object ('host.pdf'
+                plus attachments for embed, 'document.pdf' for extract)
+            options: Operation options passed to the worker
+
+        Returns:
+            Dict: The initial job status
+        """
+        if operation not in JOB_OPERATIONS:
+            raise ValueError(f"Unknown job operation: {operation}")
+        self.sweep()
+
+        job_id = uuid.uuid4().hex
+        job_dir = os.path.join(self.spool_dir, job_id)
+        input_dir = os.path.join(job_dir, 'input')
+        os.makedirs(input_dir)
+        for name, source in files.items():
+            copy_to_path(source, os.path.join(input_dir, name))
+
+        status = {
+            'job_id': job_id,
+            'operation': operation,
+            'status': JOB_QUEUED,
+            'created_at': time.time(),
+        }
+        write_json(os.path.join(job_dir, 'status.json'), status)
+
+        future = self.get_executor().submit(_run_job, job_dir, operation, options)
+        future.add_done_callback(lambda f: self._on_done(job_dir, f))
+        logger.debug("Queued %s job %s", operation, job_id)
+        return status
+
+    def _on_done(self, job_dir: str, future) -> None:
+        """Marks a job failed if its worker process died before finishing it"""
+        if future.cancelled():
+            return
+        error = future.exception()
+        if error is not None:
+            logger.error("Job %s worker failed: %s", os.path.basename(job_dir), error)
+            try:
+                _update_status(job_dir, status=JOB_FAILED, finished_at=time.time(), error=str(error))
+            except OSError:
+                pass
+
+    def _read_status(self, job_dir: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(os.path.join(job_dir, 'status.json')) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def status(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Returns a job's status, or None if the job does not exist or has expired"""
+        self.sweep()
+        job_dir = self._job_dir(job_id)
+        if job_dir is None:
+            return None
+        return self._read_status(job_dir)
+
+    def result_path(self, job_id: str) -> Optional[str]:
+        """Returns the path of a finished job's result file"""
+        status = self.status(job_id)
+        if status is None or status['status'] != JOB_DONE:
+            return None
+        result_name, _ = RESULT_FILES[status['operation']]
+        return os.path.join(self.spool_dir, job_id, result_name)
+
+    def sweep(self, force: bool = False) -> List[str]:
+        """
+        Deletes jobs that finished more than ttl_seconds ago
+
+        A job still queued or running max_runtime_seconds after it was
+        created is marked failed first, so jobs orphaned by a server process
+        that died are reported and then deleted like any other. Directories
+        without a readable status are deleted once they are that old too.
+        Runs at most once a minute unless forced.
+
+        Returns:
+            List: IDs of the deleted jobs
+        """
+        now = time.time()
+        if not force and now - self._last_sweep < _SWEEP_INTERVAL:
+            return []
+        self._last_sweep = now
+
+        removed = []
+        for job_id in os.listdir(self.spool_dir):
+            job_dir = os.path.join(self.spool_dir, job_id)
+            status = self._read_status(job_dir)
+            if status is None:
+                try:
+                    expired = now - os.path.getmtime(job_dir) > self.max_runtime_seconds + self.ttl_seconds
+                except OSError:
+                    continue
+            elif 'finished_at' not in status:
+                if now - status['created_at'] > self.max_runtime_seconds:
+                    logger.warning("Job %s did not finish within %d seconds", job_id, self.max_runtime_seconds)
+                    try:
+                        _update_status(job_dir, status=JOB_FAILED, finished_at=now,
+                                       error=f"Job did not finish within {self.max_runtime_seconds} seconds")
+                    except OSError:
+                        pass
+                continue
+            else:
+                expired = now - status['finished_at'] > self.ttl_seconds
+            if expired:
+                shutil.rmtree(job_dir, ignore_errors=True)
+                removed.append(job_id)
+        if removed:
+            logger.info("Removed %d expired jobs", len(removed))
+        return removed
+
+    def shutdown(self) -> None:
+        """Stops the worker pool, waiting for running jobs"""
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+                self._executor = None
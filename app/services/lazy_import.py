@@ -0,0 +1,56 @@
+"""
+Deferred imports for heavy optional-at-startup dependencies
+
+Importing pikepdf costs every worker process tens of milliseconds at boot
+even if it never handles a PDF request. Modules bind it through
+lazy_import() instead, and the real import happens on first attribute
+access. After that the placeholder holds the module's attributes directly,
+so hot loops pay nothing extra. Modules using a lazy import must not touch
+it at import time (hence `from __future__ import annotations` in them).
+"""
+import importlib
+import sys
+import threading
+import types
+
+
+class LazyModule(types.ModuleType):
+    """Placeholder module that imports the real one on first attribute access"""
+
+    def __init__(self, name: str):
+        super().__init__(name)
+        self.__dict__['_lazy_lock'] = threading.Lock()
+        self.__dict__['_lazy_loaded'] = False
+
+    def __getattr__(self, attr: str):
+        # Only reached for attributes not yet copied from the real module
+        with self._lazy_lock:
+            if not self._lazy_loaded:
+                module = importlib.import_module(self.__name__)
+                self.__dict__.update(module.__dict__)
+                self.__dict__['_lazy_loaded'] = True
+        try:
+            return self.__dict__[attr]
+        except KeyError:
+            raise AttributeError(f"module '{self.__name__}' has no attribute '{attr}'") from None
+
+
+def lazy_import(name: str) -> types.ModuleType:
+    """
+    Returns a module that is imported on first use
+
+    Args:
+        name: Absolute module name, e.g. 'pikepdf'
+
+    Returns:
+        The module itself if it is already imported, otherwise a LazyModule
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    return LazyModule(name)
+
+
+def load(module: types.ModuleType) -> None:
+    """Forces a lazily imported module to load now (e.g. before forking workers)"""
+    if isinstance(module, LazyModule):
+        module.__getattr__('__name__')
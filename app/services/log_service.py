@@ -0,0 +1,185 @@
+"""
+Service for application logging
+
+Library modules only create named loggers and never configure handlers;
+the application configures logging once through configure_logging().
+Records are put on an in-memory queue by a QueueHandler and written out
+by a QueueListener thread, so a slow log sink (a full pipe, a network
+handler) never blocks request workers.
+
+Each operation logs one INFO summary through log_summary(); per-attachment
+records are DEBUG only. Messages use %-style arguments so nothing is
+formatted unless a handler actually emits the record.
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+from typing import Any, Dict, Optional, Tuple
+
+LOG_FORMAT_TEXT = 'text'
+LOG_FORMAT_JSON = 'json'
+LOG_FORMATS = (LOG_FORMAT_TEXT, LOG_FORMAT_JSON)
+
+_TEXT_FORMAT = '%(asctime)s %(levelname)s %(name)s: %(message)s'
+
+# The listener started by configure_logging and the settings it used
+_listener: Optional[logging.handlers.QueueListener] = None
+_queue_handler: Optional[logging.handlers.QueueHandler] = None
+_stderr_handler: Optional[logging.Handler] = None
+_settings: Optional[Tuple[str, str]] = None
+
+
+class _Fields:
+    """Renders summary fields as key=value pairs, only when formatted"""
+
+    __slots__ = ('fields',)
+
+    def __init__(self, fields: Dict[str, Any]):
+        self.fields = fields
+
+    def __str__(self) -> str:
+        return ' '.join(f"{key}={value}" for key, value in self.fields.items())
+
+
+def log_summary(logger: logging.Logger, operation: str, **fields: Any) -> None:
+    """
+    Logs one INFO record summarizing an operation
+
+    The fields are attached to the record as structured data (used by the
+    JSON format) and rendered as key=value pairs in the text format.
+
+    Args:
+        logger: Logger of the calling module
+        operation: Name of the operation, e.g. 'embed' or 'extract'
+        **fields: Counts, sizes and durations describing the operation
+    """
+    if logger.isEnabledFor(logging.INFO):
+        logger.info('%s %s', operation, _Fields(fields), extra={'operation': operation, 'fields': fields})
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats records as one JSON object per line"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+        }
+        operation = getattr(record, 'operation', None)
+        if operation is not None:
+            entry['operation'] = operation
+            entry.update(record.fields)
+        else:
+            entry['message'] = record.getMessage()
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that leaves formatting to the listener thread
+
+    The stock prepare() merges the arguments into the message on the
+    calling thread; the queue here is in-process, so the record can be
+    passed through untouched and formatted off the request path.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+def _make_formatter(log_format: str) -> logging.Formatter:
+    if log_format == LOG_FORMAT_JSON:
+        return JsonFormatter()
+    return logging.Formatter(_TEXT_FORMAT)
+
+
+def configure_logging(level: str = 'INFO', log_format: str = LOG_FORMAT_TEXT) -> None:
+    """
+    Routes root logger output through a queue and a background listener
+
+    Handlers already on the root logger (set up by a server or an embedding
+    application) are moved behind the listener; without any, records go to
+    stderr. Calling this again only updates the level and format.
+
+    Args:
+        level: Root logger level name, e.g. 'INFO' or 'DEBUG'
+        log_format: 'text' or 'json'
+    """
+    global _listener, _queue_handler, _stderr_handler, _settings
+    if log_format not in LOG_FORMATS:
+        raise ValueError(f"Unknown log format: {log_format}")
+
+    root = logging.getLogger()
+    root.setLevel(level)
+    _settings = (level, log_format)
+
+    if _listener is None:
+        handlers = list(root.handlers)
+        for handler in handlers:
+            root.removeHandler(handler)
+        if not handlers:
+            _stderr_handler = logging.StreamHandler()
+            handlers = [_stderr_handler]
+
+        log_queue = queue.SimpleQueue()
+        _queue_handler = _DeferredQueueHandler(log_queue)
+        _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+        _listener.start()
+        root.addHandler(_queue_handler)
+        atexit.register(stop_logging)
+
+    if _stderr_handler is not None:
+        _stderr_handler.setFormatter(_make_formatter(log_format))
+
+
+def stop_logging() -> None:
+    """Flushes queued records and stops the listener thread"""
+    global _listener, _queue_handler, _stderr_handler
+    if _listener is None:
+        return
+    _listener.stop()
+    root = logging.getLogger()
+    root.removeHandler(_queue_handler)
+    for handler in _listener.handlers:
+        root.addHandler(handler)
+    _listener = None
+    _queue_handler = None
+    _stderr_handler = None
+
+
+def _restart_after_fork() -> None:
+    """
+    Gives a forked child (e.g. a worker of gunicorn --preload) its own
+    queue and listener, since the parent's listener thread is not forked
+    """
+    global _listener, _queue_handler
+    if _listener is None:
+        return
+    root = logging.getLogger()
+    root.removeHandler(_queue_handler)
+    log_queue = queue.SimpleQueue()
+    _queue_handler = _DeferredQueueHandler(log_queue)
+    _listener = logging.handlers.QueueListener(log_queue, *_listener.handlers, respect_handler_level=True)
+    _listener.start()
+    root.addHandler(_queue_handler)
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_restart_after_fork)
+
+
+def logging_settings() -> Optional[Tuple[str, str]]:
+    """Returns the (level, format) last passed to configure_logging, if any"""
+    return _settings
+
+
+def configure_worker_logging(settings: Optional[Tuple[str, str]]) -> None:
+    """Process pool initializer applying the parent's logging settings"""
+    if settings is not None:
+        configure_logging(*settings)
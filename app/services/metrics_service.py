@@ -0,0 +1,133 @@
+"""
+Service for performance metrics and per-request phase timings
+
+Hot phases of the PDF services are wrapped in timed(), which records a
+Prometheus histogram sample and, inside a request, adds the duration to
+that request's Server-Timing header. Metrics live in the default
+prometheus_client registry; under a multi-process server set
+PROMETHEUS_MULTIPROC_DIR so /metrics aggregates every worker.
+"""
+import contextvars
+import os
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from prometheus_client import CollectorRegistry, Counter, Histogram, REGISTRY, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+# Latency buckets from 1 ms to 2 minutes
+_SECONDS_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+PHASE_SECONDS = Histogram(
+    'pdf_phase_seconds', 'Time spent in each phase of PDF processing', ['phase'], buckets=_SECONDS_BUCKETS
+)
+REQUEST_SECONDS = Histogram(
+    'pdf_request_seconds', 'Request latency by endpoint', ['endpoint', 'method', 'status'], buckets=_SECONDS_BUCKETS
+)
+BYTES_IN = Counter('pdf_bytes_in', 'Bytes of PDF input processed', ['operation'])
+BYTES_OUT = Counter('pdf_bytes_out', 'Bytes of output produced', ['operation'])
+ATTACHMENTS = Counter('pdf_attachments', 'Attachments embedded or extracted', ['operation'])
+ADMISSION_REJECTED = Counter('pdf_admission_rejected', 'Requests turned away by admission control', ['status'])
+
+# Phase durations of the current request, or None outside a request
+_timings: contextvars.ContextVar[Optional[List[Tuple[str, float]]]] = contextvars.ContextVar(
+    'pdf_phase_timings', default=None
+)
+
+
+def start_request_timings() -> None:
+    """Starts collecting phase durations for the current request"""
+    _timings.set([])
+
+
+def request_timings() -> List[Tuple[str, float]]:
+    """Returns the phase durations collected so far for the current request"""
+    return _timings.get() or []
+
+
+@contextmanager
+def timed(phase: str) -> Iterator[None]:
+    """Times a block as one occurrence of phase"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        PHASE_SECONDS.labels(phase).observe(elapsed)
+        timings = _timings.get()
+        if timings is not None:
+            timings.append((phase, elapsed))
+
+
+def record_io(operation: str, bytes_in: int = 0, bytes_out: int = 0, attachments: int = 0) -> None:
+    """Adds one operation's input/output volume to the counters"""
+    if bytes_in:
+        BYTES_IN.labels(operation).inc(bytes_in)
+    if bytes_out:
+        BYTES_OUT.labels(operation).inc(bytes_out)
+    if attachments:
+        ATTACHMENTS.labels(operation).inc(attachments)
+
+
+def server_timing(timings: List[Tuple[str, float]], total: Optional[float] = None) -> str:
+    """
+    Formats phase durations as a Server-Timing header value
+
+    Repeated phases (one encode per attachment, say) are summed and report
+    how many times they ran.
+    """
+    totals: Dict[str, List[float]] = {}
+    for phase, elapsed in timings:
+        entry = totals.setdefault(phase, [0.0, 0])
+        entry[0] += elapsed
+        entry[1] += 1
+    metrics = []
+    for phase, (elapsed, count) in totals.items():
+        desc = f';desc="x{count}"' if count > 1 else ''
+        metrics.append(f"{phase};dur={elapsed * 1000:.1f}{desc}")
+    if total is not None:
+        metrics.append(f"total;dur={total * 1000:.1f}")
+    return ', '.join(metrics)
+
+
+class CacheCollector:
+    """Exposes the hit/miss counters and occupancy of the app's caches"""
+
+    def __init__(self, caches: Dict[str, object]):
+        self.caches = caches
+
+    def collect(self):
+        hits = CounterMetricFamily('pdf_cache_hits', 'Cache hits', labels=['cache'])
+        misses = CounterMetricFamily('pdf_cache_misses', 'Cache misses', labels=['cache'])
+        entries = GaugeMetricFamily('pdf_cache_entries', 'Entries held in the cache', labels=['cache'])
+        size = GaugeMetricFamily('pdf_cache_size_bytes', 'Bytes held in the cache', labels=['cache'])
+        for name, cache in self.caches.items():
+            stats = cache.stats()
+            hits.add_metric([name], stats['hits'])
+            misses.add_metric([name], stats['misses'])
+            entries.add_metric([name], stats['entries'])
+            size.add_metric([name], stats['size_bytes'])
+        return [hits, misses, entries, size]
+
+
+def render_metrics(caches: Dict[str, object]) -> bytes:
+    """
+    Renders all metrics in the Prometheus text exposition format
+
+    Args:
+        caches: Caches to report, by name; these are per process
+
+    Returns:
+        bytes: The exposition body
+    """
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+
+    cache_registry = CollectorRegistry()
+    cache_registry.register(CacheCollector(caches))
+    return generate_latest(registry) + generate_latest(cache_registry)
@@ -0,0 +1,403 @@
+"""
+Service for reading and writing PDF name trees (ISO 32000-1, 7.9.6)
+
+The EmbeddedFiles name tree maps attachment names to file specifications.
+Small trees are a single root node holding a sorted /Names array; larger
+trees split the entries across leaf nodes referenced through /Kids, each
+carrying /Limits with the lowest and highest key it covers. Lookups use
+those limits to binary search down to a single leaf, and inserts keep the
+tree sorted and balanced by splitting nodes that grow too large.
+"""
+from __future__ import annotations
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from app.services.lazy_import import lazy_import
+
+pikepdf = lazy_import('pikepdf')
+
+# Target entries per leaf and kids per intermediate node when building a tree
+LEAF_SIZE = 64
+FANOUT = 64
+
+# Guard against malformed or cyclic trees from other producers
+MAX_DEPTH = 32
+
+
+def _key(name) -> bytes:
+    """Returns the byte string a name tree key is sorted by"""
+    if isinstance(name, str):
+        name = pikepdf.String(name)
+    return bytes(name)
+
+
+def _limits(node: pikepdf.Dictionary, depth: int = 0) -> Optional[Tuple[bytes, bytes]]:
+    """
+    Returns the (lowest, highest) key covered by a node
+
+    Uses /Limits when present and otherwise derives them from the node's
+    contents, so trees written without limits can still be searched.
+    """
+    if '/Limits' in node and len(node.Limits) == 2:
+        return _key(node.Limits[0]), _key(node.Limits[1])
+    if depth > MAX_DEPTH:
+        return None
+    if '/Names' in node and len(node.Names) >= 2:
+        keys = [_key(node.Names[i]) for i in range(0, len(node.Names) - 1, 2)]
+        return min(keys), max(keys)
+    if '/Kids' in node and len(node.Kids) > 0:
+        bounds = [b for b in (_limits(kid, depth + 1) for kid in node.Kids) if b is not None]
+        if bounds:
+            return min(b[0] for b in bounds), max(b[1] for b in bounds)
+    return None
+
+
+def iter_entries(root: pikepdf.Dictionary) -> Iterator[Tuple[str, pikepdf.Object]]:
+    """
+    Yields every (name, value) pair of a name tree in tree order
+
+    That is key order for trees written by this module and other
+    well-formed producers, but not for foreign trees with unsorted leaves.
+
+    Args:
+        root: The root node of the name tree
+
+    Yields:
+        Tuple containing the entry name and its value
+    """
+    visited = set()
+    stack = [(root, 0)]
+    while stack:
+        node, depth = stack.pop()
+        if depth > MAX_DEPTH:
+            continue
+        if node.is_indirect:
+            if node.objgen in visited:
+                continue
+            visited.add(node.objgen)
+
+        if '/Names' in node:
+            names = node.Names
+            for i in range(0, len(names) - 1, 2):
+                yield str(names[i]), names[i + 1]
+        if '/Kids' in node:
+            # Push in reverse so kids are visited left to right
+            for kid in reversed(list(node.Kids)):
+                stack.append((kid, depth + 1))
+
+
+def iter_nodes(root: pikepdf.Dictionary) -> Iterator[pikepdf.Dictionary]:
+    """
+    Yields every node of a name tree, starting with the root
+
+    Args:
+        root: The root node of the name tree
+
+    Yields:
+        Each node dictionary, each indirect node once
+    """
+    visited = set()
+    stack = [(root, 0)]
+    while stack:
+        node, depth = stack.pop()
+        if depth > MAX_DEPTH:
+            continue
+        if node.is_indirect:
+            if node.objgen in visited:
+                continue
+            visited.add(node.objgen)
+
+        yield node
+        if '/Kids' in node:
+            for kid in reversed(list(node.Kids)):
+                stack.append((kid, depth + 1))
+
+
+def count_entries(root: pikepdf.Dictionary) -> int:
+    """Returns the number of entries in a name tree"""
+    return sum(1 for _ in iter_entries(root))
+
+
+def _leaf_position(names: pikepdf.Array, key: bytes) -> Tuple[int, bool]:
+    """
+    Binary searches a sorted leaf /Names array
+
+    Returns:
+        Tuple containing the pair index where the key is or would be
+        inserted, and whether it was found there
+    """
+    lo, hi = 0, len(names) // 2
+    while lo < hi:
+        mid = (lo + hi) // 2
+        mid_key = _key(names[2 * mid])
+        if mid_key < key:
+            lo = mid + 1
+        elif mid_key > key:
+            hi = mid
+        else:
+            return mid, True
+    return lo, False
+
+
+def _lookup(node: pikepdf.Dictionary, key: bytes, depth: int) -> Optional[pikepdf.Object]:
+    """Recursive helper for lookup"""
+    if depth > MAX_DEPTH:
+        return None
+
+    if '/Names' in node:
+        names = node.Names
+        pos, found = _leaf_position(names, key)
+        if found:
+            return names[2 * pos + 1]
+        # Leaves written by producers that do not sort their keys (including
+        # older versions of this service) fall back to a scan of this leaf only
+        for i in range(0, len(names) - 1, 2):
+            if _key(names[i]) == key:
+                return names[i + 1]
+
+    if '/Kids' in node:
+        kids = node.Kids
+        lo, hi = 0, len(kids) - 1
+        while lo <= hi:
+            mid = (lo + hi) // 2
+            bounds = _limits(kids[mid], depth + 1)
+            if bounds is None:
+                break
+            if key < bounds[0]:
+                hi = mid - 1
+            elif key > bounds[1]:
+                lo = mid + 1
+            else:
+                return _lookup(kids[mid], key, depth + 1)
+        else:
+            return None
+        # A kid without usable limits: search every kid in turn
+        for kid in kids:
+            value = _lookup(kid, key, depth + 1)
+            if value is not None:
+                return value
+
+    return None
+
+
+def lookup(root: pikepdf.Dictionary, name: str) -> Optional[pikepdf.Object]:
+    """
+    Finds the value stored under a name in O(log n) node visits
+
+    Args:
+        root: The root node of the name tree
+        name: The name to look up
+
+    Returns:
+        The value, or None if the tree has no entry with that name
+    """
+    return _lookup(root, _key(name), 0)
+
+
+def _set_limits(node: pikepdf.Dictionary) -> None:
+    """
+    Recomputes /Limits for a non-root node from its immediate contents
+
+    Kids without /Limits of their own (as foreign trees may have) have
+    theirs derived, and a node with nothing below it keeps its limits.
+    """
+    if '/Names' in node:
+        keys = [_key(node.Names[i]) for i in range(0, len(node.Names) - 1, 2)]
+        bounds = [(key, key) for key in keys]
+    else:
+        bounds = [b for b in (_limits(kid, 1) for kid in node.Kids) if b is not None]
+    if bounds:
+        low, high = min(b[0] for b in bounds), max(b[1] for b in bounds)
+        node.Limits = pikepdf.Array([pikepdf.String(low), pikepdf.String(high)])
+
+
+def _make_node(pdf: pikepdf.Pdf, items: List[pikepdf.Object], leaf: bool) -> pikepdf.Dictionary:
+    """Creates an indirect leaf or intermediate node holding the given items"""
+    if leaf:
+        node = pdf.make_indirect(pikepdf.Dictionary(Names=pikepdf.Array(items)))
+    else:
+        node = pdf.make_indirect(pikepdf.Dictionary(Kids=pikepdf.Array(items)))
+    _set_limits(node)
+    return node
+
+
+def _chunks(items: List, size: int) -> List[List]:
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+def _replace_root_contents(root: pikepdf.Dictionary, nodes: List[pikepdf.Dictionary]) -> None:
+    """Points the root at the given kids, dropping any entries it held directly"""
+    for key in ('/Names', '/Kids', '/Limits'):
+        if key in root:
+            del root[key]
+    root.Kids = pikepdf.Array(nodes)
+
+
+def build(pdf: pikepdf.Pdf, root: pikepdf.Dictionary,
+          entries: Iterable[Tuple[str, pikepdf.Object]]) -> List[pikepdf.Dictionary]:
+    """
+    Replaces the contents of a root node with a sorted, balanced tree
+
+    Args:
+        pdf: The PDF that will own the new nodes
+        root: The root node to fill (kept, so existing references stay valid)
+        entries: (name, value) pairs; later duplicates replace earlier ones
+
+    Returns:
+        List: The root and every node created below it
+    """
+    by_key = {}
+    for name, value in entries:
+        by_key[_key(name)] = value
+    ordered = sorted(by_key.items())
+
+    flat = []
+    for key, value in ordered:
+        flat.append(pikepdf.String(key))
+        flat.append(value)
+
+    if len(ordered) <= LEAF_SIZE:
+        for key in ('/Kids', '/Limits'):
+            if key in root:
+                del root[key]
+        root.Names = pikepdf.Array(flat)
+        return [root]
+
+    nodes = [_make_node(pdf, chunk, leaf=True) for chunk in _chunks(flat, 2 * LEAF_SIZE)]
+    created = list(nodes)
+    while len(nodes) > FANOUT:
+        nodes = [_make_node(pdf, chunk, leaf=False) for chunk in _chunks(nodes, FANOUT)]
+        created.extend(nodes)
+    _replace_root_contents(root, nodes)
+    return [root] + created
+
+
+def _child_index(kids: pikepdf.Array, key: bytes) -> int:
+    """Returns the index of the kid a new key belongs in"""
+    lo, hi = 0, len(kids)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        bounds = _limits(kids[mid])
+        if bounds is not None and bounds[0] <= key:
+            lo = mid + 1
+        else:
+            hi = mid
+    return max(lo - 1, 0)
+
+
+def _split(pdf: pikepdf.Pdf, node: pikepdf.Dictionary) -> Optional[pikepdf.Dictionary]:
+    """
+    Splits an over-full node in half
+
+    Returns:
+        The new right-hand sibling, or None if the node did not need splitting
+    """
+    if '/Names' in node:
+        names = node.Names
+        if len(names) <= 4 * LEAF_SIZE:
+            return None
+        half = (len(names) // 4) * 2
+        sibling = _make_node(pdf, list(names[half:]), leaf=True)
+        del names[half:]
+    else:
+        kids = node.Kids
+        if len(kids) <= 2 * FANOUT:
+            return None
+        half = len(kids) // 2
+        sibling = _make_node(pdf, list(kids[half:]), leaf=False)
+        del kids[half:]
+    _set_limits(node)
+    return sibling
+
+
+def _insert(pdf: pikepdf.Pdf, root: pikepdf.Dictionary, name: str,
+            value: pikepdf.Object) -> Optional[List[pikepdf.Dictionary]]:
+    """
+    Inserts or replaces one entry in a tree whose root has /Kids
+
+    Returns:
+        List: The nodes changed or created: the path from the root to the
+        leaf, and any nodes split off along it; None, with nothing changed,
+        if the leaf is deeper than lookups go
+    """
+    key = _key(name)
+
+    # Descend to the leaf covering the key
+    path = []
+    node = root
+    while '/Kids' in node and len(path) <= MAX_DEPTH:
+        idx = _child_index(node.Kids, key)
+        path.append((node, idx))
+        node = node.Kids[idx]
+    if len(path) > MAX_DEPTH:
+        return None
+
+    if '/Names' not in node:
+        node.Names = pikepdf.Array()
+    names = node.Names
+    pos, found = _leaf_position(names, key)
+    if found:
+        names[2 * pos + 1] = value
+    else:
+        names.insert(2 * pos, pikepdf.String(key))
+        names.insert(2 * pos + 1, value)
+
+    # Walk back up, splitting over-full nodes and widening limits
+    touched = [node]
+    child = node
+    for parent, idx in reversed(path):
+        sibling = _split(pdf, child)
+        if sibling is None:
+            _set_limits(child)
+        else:
+            parent.Kids.insert(idx + 1, sibling)
+            touched.append(sibling)
+        touched.append(parent)
+        child = parent
+
+    # The root is never given /Limits; if it overflowed, push its halves down
+    if len(root.Kids) > 2 * FANOUT:
+        kids = list(root.Kids)
+        halves = [_make_node(pdf, chunk, leaf=False) for chunk in _chunks(kids, (len(kids) + 1) // 2)]
+        _replace_root_contents(root, halves)
+        touched.extend(halves)
+    return touched
+
+
+def add_entries(pdf: pikepdf.Pdf, root: pikepdf.Dictionary,
+                entries: Iterable[Tuple[str, pikepdf.Object]]) -> List[pikepdf.Dictionary]:
+    """
+    Adds entries to a name tree, replacing any that share a name
+
+    A root that still holds its entries directly (including the flat,
+    unsorted arrays written by older versions of this service) is rebuilt
+    into a balanced tree; a root with /Kids has each entry inserted into
+    its leaf, so appending stays logarithmic in the tree size. A foreign
+    tree nested deeper than MAX_DEPTH is rebuilt too, keeping the entries
+    within reach.
+
+    Args:
+        pdf: The PDF that owns the tree
+        root: The root node of the name tree
+        entries: (name, value) pairs to add
+
+    Returns:
+        List: The indirect nodes that were changed or created, each once,
+        so an incremental update can write just those
+    """
+    entries = list(entries)
+    if '/Kids' not in root:
+        touched = build(pdf, root, list(iter_entries(root)) + entries)
+    else:
+        touched = []
+        for i, (name, value) in enumerate(entries):
+            nodes = _insert(pdf, root, name, value)
+            if nodes is None:
+                touched.extend(build(pdf, root, list(iter_entries(root)) + entries[i:]))
+                break
+            touched.extend(nodes)
+
+    nodes = {}
+    for node in touched:
+        if node.is_indirect:
+            nodes.setdefault(node.objgen, node)
+    return list(nodes.values())
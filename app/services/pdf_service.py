@@ -1,206 +1,1187 @@
 """
 Service for PDF manipulation operations
 """
+from __future__ import annotations
 import io
 import base64
-import uuid
+import hashlib
 import logging
 import os
 import tempfile
-from typing import List, Dict, Tuple
-import pikepdf
+import time
+import zlib
+from typing import Any, BinaryIO, List, Dict, Iterator, NamedTuple, Optional, Set, Tuple, Union
+
+from app.services import incremental_update, name_tree
+from app.services.lazy_import import lazy_import
+from app.services.log_service import log_summary
+from app.services.metrics_service import timed, record_io
+from app.services.pdf_source import (
+    PdfSource, open_source, read_source, source_digest, source_size, copy_to_path, iter_chunks
+)
+from client.pdf_extract import decode_pieces, flate_layers, locate_stream_data
 
 # Setup logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def embed_pdfs(host_pdf: bytes, attachments: List[bytes]) -> bytes:
+# Imported on first use, so processes that never touch a PDF skip its import
+pikepdf = lazy_import('pikepdf')
+
+# Engine modes supported by embed_pdfs
+EMBED_MODE_MEMORY = 'memory'
+EMBED_MODE_TEMPFILE = 'tempfile'
+EMBED_MODE_APPEND = 'append'
+EMBED_MODES = (EMBED_MODE_MEMORY, EMBED_MODE_TEMPFILE, EMBED_MODE_APPEND)
+
+# MIME type recorded on every attachment embedded by this service
+ATTACHMENT_MIME_TYPE = 'application/pdf'
+
+# HTTP content coding of attachment data returned as stored (raw mode):
+# plain /FlateDecode stream data is zlib data, which is what HTTP calls deflate
+CONTENT_ENCODING_DEFLATE = 'deflate'
+
+
+class SaveProfile(NamedTuple):
+    """How attachment streams are encoded and the output PDF is written"""
+    # zlib level for attachment streams, or None to store them uncompressed
+    flate_level: Optional[int]
+    # Store attachments that barely compress as-is instead of deflating them
+    skip_incompressible: bool
+    # Whether qpdf compresses streams left unfiltered (including the host's)
+    compress_streams: bool
+    # Name of the pikepdf.ObjectStreamMode to save with
+    object_stream_mode: str
+
+
+# Save profiles supported by embed_pdfs, trading CPU time for output size
+SAVE_PROFILE_FAST = 'fast'
+SAVE_PROFILE_BALANCED = 'balanced'
+SAVE_PROFILE_SMALL = 'small'
+SAVE_PROFILES = {
+    # Copy everything through: no deflate, host streams and xref untouched
+    SAVE_PROFILE_FAST: SaveProfile(None, False, False, 'preserve'),
+    # Deflate compressible attachments and pack objects into object streams
+    SAVE_PROFILE_BALANCED: SaveProfile(6, True, False, 'generate'),
+    # Maximum deflate everywhere, including unfiltered host streams
+    SAVE_PROFILE_SMALL: SaveProfile(9, False, True, 'generate'),
+}
+
+# Attachments whose leading sample shrinks by less than this fraction are
+# treated as already compressed (e.g. PDFs made of Flate/DCT streams)
+_COMPRESSION_SAMPLE_SIZE = 64 * 1024
+_MIN_COMPRESSION_GAIN = 0.05
+
+
+class AttachmentNotFoundError(Exception):
+    """Raised when a named attachment does not exist in a PDF"""
+
+
+def resolve_filenames(attachments: List[PdfSource], filenames: Optional[List[Optional[str]]] = None) -> List[str]:
+    """
+    Picks a deterministic, unique name for each attachment
+    
+    Uploaded filenames are used where given; otherwise the name is derived
+    from the attachment's content hash, so the same inputs always produce
+    the same name tree.
+    
+    Args:
+        attachments: Each attachment PDF as bytes, a path or a file object
+        filenames: Optional uploaded filename for each attachment
+    
+    Returns:
+        List: One name per attachment
+    """
+    resolved = []
+    used = set()
+    for i, attachment in enumerate(attachments):
+        filename = filenames[i] if filenames and i < len(filenames) else None
+        if not filename:
+            filename = f"attachment_{i+1}_{source_digest(attachment)[:8]}.pdf"
+        
+        # Disambiguate repeated names so no attachment silently replaces another
+        if filename in used:
+            stem, ext = os.path.splitext(filename)
+            filename = f"{stem}_{i+1}{ext}"
+        used.add(filename)
+        resolved.append(filename)
+    return resolved
+
+
+def _is_compressible(data: bytes) -> bool:
+    """Estimates from a fast deflate of a leading sample whether data is worth compressing"""
+    sample = data[:_COMPRESSION_SAMPLE_SIZE]
+    if not sample:
+        return False
+    return len(zlib.compress(sample, 1)) < len(sample) * (1 - _MIN_COMPRESSION_GAIN)
+
+
+def _encode_attachment(data: bytes, profile: SaveProfile) -> Tuple[bytes, Dict[str, Any]]:
+    """
+    Encodes attachment data for its embedded file stream
+    
+    Returns:
+        Tuple containing the stream data and any filter keys for the stream
+    """
+    if profile.flate_level is None or (profile.skip_incompressible and not _is_compressible(data)):
+        return data, {}
+    return zlib.compress(data, profile.flate_level), {'Filter': pikepdf.Name.FlateDecode}
+
+
+def _existing_streams(ef_tree: pikepdf.Dictionary) -> Dict[Tuple[int, bytes], List[pikepdf.Stream]]:
+    """
+    Indexes the host's embedded file streams by their recorded size and MD5
+    
+    Only /Params is read, so building the index costs no stream data;
+    streams without a recorded size and checksum are left out.
+    """
+    existing = {}
+    for _, filespec in name_tree.iter_entries(ef_tree):
+        stream = _embedded_stream(filespec) if isinstance(filespec, pikepdf.Dictionary) else None
+        if stream is None or not stream.is_indirect:
+            continue
+        params = stream.get('/Params', pikepdf.Dictionary())
+        if '/Size' not in params or '/CheckSum' not in params:
+            continue
+        key = (int(params.Size), bytes(params.CheckSum))
+        if all(s.objgen != stream.objgen for s in existing.get(key, [])):
+            existing.setdefault(key, []).append(stream)
+    return existing
+
+
+def _find_existing_stream(existing: Dict[Tuple[int, bytes], List[pikepdf.Stream]], data: bytes,
+                          checksum: bytes) -> Optional[pikepdf.Stream]:
+    """Returns a host stream holding exactly data, confirming checksum matches byte for byte"""
+    for stream in existing.get((len(data), checksum), []):
+        try:
+            if stream.read_bytes() == data:
+                return stream
+        except pikepdf.PdfError:
+            continue
+    return None
+
+
+def _attach_files(pdf: pikepdf.Pdf, attachments: List[PdfSource], filenames: Optional[List[str]] = None,
+                  profile: str = SAVE_PROFILE_BALANCED
+                  ) -> Tuple[List[Tuple[str, pikepdf.Dictionary]], List[pikepdf.Dictionary]]:
+    """
+    Adds each attachment to the EmbeddedFiles name tree of an open PDF
+    
+    Attachments given as paths or file objects are read one at a time, so
+    only the attachment being added is held as Python bytes.
+    
+    Identical payloads are stored once: attachments repeated within the call,
+    or already embedded in the host under another name, get their own
+    filespec referencing the existing /EF /F stream. An attachment whose
+    name is already in the host with the same content is skipped, while a
+    name with different content is replaced.
+    
+    Args:
+        pdf: The open host PDF
+        attachments: Each attachment PDF as bytes, a path or a file object
+        filenames: Optional name for each attachment (see resolve_filenames)
+        profile: Save profile deciding how each attachment is compressed
+    
+    Returns:
+        Tuple containing (filename, filespec) for each attachment added or
+        replaced, and the EmbeddedFiles tree nodes that were changed or created
+    """
+    save_profile = SAVE_PROFILES[profile]
+    
+    # Get or create the embedded files name tree
+    names = pdf.Root.get('/Names', pikepdf.Dictionary())
+    if '/Names' not in pdf.Root:
+        pdf.Root.Names = names
+        
+    ef_tree = names.get('/EmbeddedFiles', pikepdf.Dictionary())
+    if '/EmbeddedFiles' not in names:
+        names.EmbeddedFiles = ef_tree
+    
+    # Streams already holding a payload, from the host and from this call
+    with timed('name_tree'):
+        existing = _existing_streams(ef_tree)
+    added = {}
+    shared = skipped = 0
+    
+    # Process each attachment
+    entries = []
+    for i, (attachment, filename) in enumerate(zip(attachments, resolve_filenames(attachments, filenames))):
+        attachment_data = read_source(attachment)
+        checksum = hashlib.md5(attachment_data).digest()
+        content_digest = hashlib.sha256(attachment_data).digest()
+        
+        embedded_file = added.get(content_digest)
+        if embedded_file is None:
+            embedded_file = _find_existing_stream(existing, attachment_data, checksum)
+        
+        if embedded_file is not None:
+            current = name_tree.lookup(ef_tree, filename)
+            current_stream = _embedded_stream(current) if isinstance(current, pikepdf.Dictionary) else None
+            if current_stream is not None and current_stream.objgen == embedded_file.objgen:
+                logger.debug("Skipped attachment %d: %s is already embedded", i + 1, filename)
+                skipped += 1
+                continue
+            shared += 1
+        else:
+            with timed('encode'):
+                stream_data, stream_filter = _encode_attachment(attachment_data, save_profile)
+            
+            # Create the embedded file stream with its size and checksum, so the
+            # attachment can be listed without reading the stream data
+            embedded_file = pdf.make_stream(
+                stream_data,
+                **stream_filter,
+                Type=pikepdf.Name.EmbeddedFile,
+                Subtype=pikepdf.Name(f"/{ATTACHMENT_MIME_TYPE}"),
+                Params=pikepdf.Dictionary(
+                    Size=len(attachment_data),
+                    CheckSum=pikepdf.String(checksum)
+                )
+            )
+        added[content_digest] = embedded_file
+        
+        # Create file specification dictionary
+        filespec = pdf.make_indirect(pikepdf.Dictionary(
+            Type=pikepdf.Name.Filespec,
+            F=filename,
+            UF=filename,
+            EF=pikepdf.Dictionary(
+                F=embedded_file
+            )
+        ))
+        entries.append((filename, filespec))
+        
+        logger.debug("Added attachment %d: %s", i + 1, filename)
+    
+    if shared or skipped:
+        logger.debug("Deduplicated attachments: %d sharing an existing stream, %d already embedded", shared, skipped)
+    
+    # Add to the EmbeddedFiles name tree, keeping it sorted and balanced
+    with timed('name_tree'):
+        nodes = name_tree.add_entries(pdf, ef_tree, entries)
+    return entries, nodes
+
+
+def _save_options(profile: str, linearize: bool) -> Dict[str, Any]:
+    """Returns the pikepdf.Pdf.save keyword arguments for a save profile"""
+    save_profile = SAVE_PROFILES[profile]
+    options = {
+        'compress_streams': save_profile.compress_streams,
+        'object_stream_mode': getattr(pikepdf.ObjectStreamMode, save_profile.object_stream_mode),
+        'linearize': linearize,
+    }
+    if not save_profile.compress_streams:
+        # Copy existing streams through as they are rather than decoding them
+        options['stream_decode_level'] = pikepdf.StreamDecodeLevel.none
+    return options
+
+
+def _updated_objects(pdf: pikepdf.Pdf, entries: List[Tuple[str, pikepdf.Dictionary]],
+                     nodes: List[pikepdf.Dictionary], existing: Set[Tuple[int, int]]) -> Iterator[pikepdf.Object]:
+    """
+    Yields the indirect objects _attach_files created or may have changed:
+    the catalog, the name dictionaries, the EmbeddedFiles tree nodes the
+    inserts touched and the new filespecs with their streams. Streams in
+    existing were already in the host and shared by a new filespec, so
+    they are not written again.
+    """
+    yield pdf.Root
+    names = pdf.Root.Names
+    ef_tree = names.EmbeddedFiles
+    for obj in (names, ef_tree):
+        if obj.is_indirect:
+            yield obj
+    yield from nodes
+    for _, filespec in entries:
+        yield filespec
+        if filespec.EF.F.objgen not in existing:
+            yield filespec.EF.F
+
+
+def _append_into(host_pdf: PdfSource, attachments: List[PdfSource], output: Union[str, BinaryIO],
+                 filenames: Optional[List[str]], profile: str) -> None:
+    """
+    Adds the attachments to the host as an incremental update
+    
+    The host bytes are copied to output unchanged and followed by only the
+    new and changed objects. When output is the host's own path the update
+    is appended in place and the host is not copied at all.
+    
+    Args:
+        host_pdf: The host PDF as bytes, a path or a seekable file object
+        attachments: Each attachment PDF as bytes, a path or a file object
+        output: Path or writable binary stream to write to
+        filenames: Optional name for each attachment (see resolve_filenames)
+        profile: Save profile; only its attachment compression applies
+    """
+    base = incremental_update.read_base(host_pdf)
+    in_place = (isinstance(host_pdf, str) and isinstance(output, str)
+                and os.path.abspath(host_pdf) == os.path.abspath(output))
+    
+    with timed('open'):
+        pdf = open_source(host_pdf)
+    with pdf:
+        incremental_update.check_updatable(pdf)
+        # Taken from the xref rather than /Size, which a damaged host may overstate
+        existing = set(pdf.get_xref_table())
+        entries, nodes = _attach_files(pdf, attachments, filenames, profile)
+        updated = _updated_objects(pdf, entries, nodes, existing)
+        
+        if not isinstance(output, str):
+            with timed('copy'):
+                for chunk in iter_chunks(host_pdf):
+                    output.write(chunk)
+            with timed('save'):
+                incremental_update.write_update(output, base, pdf, updated)
+            return
+        
+        if not in_place:
+            with timed('copy'):
+                copy_to_path(host_pdf, output)
+        with open(output, 'r+b') as f, timed('save'):
+            f.seek(base.size)
+            try:
+                written = incremental_update.write_update(f, base, pdf, updated)
+            except Exception:
+                # Leave an in-place host exactly as it was
+                f.truncate(base.size)
+                raise
+    logger.debug("Appended %d bytes to host PDF of %d bytes", written, base.size)
+
+
+def _embed_into(host_pdf: PdfSource, attachments: List[PdfSource], output: Union[str, BinaryIO],
+                mode: str, filenames: Optional[List[str]], profile: str, linearize: bool) -> None:
+    """
+    Opens the host, adds the attachments and saves the result to output
+    
+    Args:
+        host_pdf: The host PDF as bytes, a path or a seekable file object
+        attachments: Each attachment PDF as bytes, a path or a file object
+        output: Path or writable binary stream to save to
+        mode: Engine mode; in 'tempfile' mode a host that is not already a
+            path is copied to a temporary file before opening, and in
+            'append' mode the host is not rewritten (see _append_into)
+        filenames: Optional name for each attachment (see resolve_filenames)
+        profile: Save profile (see embed_pdfs)
+        linearize: Whether to write a linearized ("fast web view") PDF
+    """
+    if mode == EMBED_MODE_APPEND:
+        if linearize:
+            raise ValueError("Linearized output requires rewriting the host and is not available in append mode")
+        _append_into(host_pdf, attachments, output, filenames, profile)
+        return
+    
+    host_pdf_path = None
+    
+    try:
+        if mode == EMBED_MODE_TEMPFILE and not isinstance(host_pdf, str):
+            # Create the temporary file but close it before writing
+            with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as host_temp:
+                host_pdf_path = host_temp.name
+            with timed('tempfile_write'):
+                copy_to_path(host_pdf, host_pdf_path)
+            logger.debug("Copied host PDF to %s", host_pdf_path)
+        
+        # Open the host PDF straight from the uploaded buffer or spool file
+        with timed('open'):
+            pdf = open_source(host_pdf_path or host_pdf)
+        with pdf:
+            _attach_files(pdf, attachments, filenames, profile)
+            with timed('save'):
+                pdf.save(output, **_save_options(profile, linearize))
+    finally:
+        # Clean up temporary files
+        if host_pdf_path and os.path.exists(host_pdf_path):
+            try:
+                os.unlink(host_pdf_path)
+            except Exception as e:
+                logger.warning("Could not delete temporary file %s: %s", host_pdf_path, e)
+
+
+def _record_embed(host_pdf: PdfSource, attachments: List[PdfSource], output_size: int,
+                  mode: str, profile: str, started: float) -> None:
+    """Counts an embed's input and output bytes in the metrics and logs its summary"""
+    bytes_in = source_size(host_pdf) + sum(source_size(attachment) for attachment in attachments)
+    record_io('embed', bytes_in=bytes_in, bytes_out=output_size, attachments=len(attachments))
+    log_summary(logger, 'embed', mode=mode, profile=profile, attachments=len(attachments),
+                bytes_in=bytes_in, bytes_out=output_size,
+                duration_ms=round((time.perf_counter() - started) * 1000, 1))
+
+
+def embed_pdfs(host_pdf: PdfSource, attachments: List[PdfSource], mode: str = EMBED_MODE_MEMORY,
+               filenames: Optional[List[str]] = None, profile: str = SAVE_PROFILE_BALANCED,
+               linearize: bool = False) -> bytes:
     """
     Embeds multiple PDF files into a host PDF document using pikepdf
     
     Args:
-        host_pdf: Bytes of the host PDF file
-        attachments: List of bytes for each attachment PDF file
+        host_pdf: The host PDF as bytes, a path or a seekable file object
+        attachments: Each attachment PDF as bytes, a path or a file object
+        mode: 'memory' to work entirely on in-memory buffers, 'tempfile'
+            to round-trip the host and output through temporary files
+            (useful for very large inputs), or 'append' to add the
+            attachments as an incremental update without rewriting the host
+        filenames: Optional name for each attachment (see resolve_filenames)
+        profile: 'fast' stores attachments uncompressed and copies the host
+            through; 'balanced' deflates attachments that compress and
+            writes object streams; 'small' deflates everything at level 9
+        linearize: Whether to write a linearized ("fast web view") PDF
     
     Returns:
         bytes: The host PDF with embedded files
     """
-    host_pdf_path = None
-    attachment_paths = []
+    if mode not in EMBED_MODES:
+        raise ValueError(f"Unknown embed mode: {mode}")
+    if profile not in SAVE_PROFILES:
+        raise ValueError(f"Unknown save profile: {profile}")
+    
     output_path = None
+    started = time.perf_counter()
     
     try:
-        # Create temporary files but close them immediately after writing
-        with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as host_temp:
-            host_temp.write(host_pdf)
-            host_pdf_path = host_temp.name
-        
-        for idx, attachment in enumerate(attachments):
-            with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as attachment_temp:
-                attachment_temp.write(attachment)
-                attachment_paths.append(attachment_temp.name)
-        
-        with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as output_temp:
-            output_path = output_temp.name
-        
-        logger.info(f"Embedding {len(attachments)} attachments")
-        
-        # Open the host PDF
-        logger.info(f"Reading host PDF: {host_pdf_path}")
-        with pikepdf.open(host_pdf_path) as pdf:
-            # Get or create the embedded files name tree
-            names = pdf.Root.get('/Names', pikepdf.Dictionary())
-            if '/Names' not in pdf.Root:
-                pdf.Root.Names = names
-                
-            ef_tree = names.get('/EmbeddedFiles', pikepdf.Dictionary())
-            if '/EmbeddedFiles' not in names:
-                names.EmbeddedFiles = ef_tree
-                
-            if '/Names' not in ef_tree:
-                ef_tree.Names = pikepdf.Array()
+        if mode != EMBED_MODE_TEMPFILE:
+            # Write the output into a buffer
+            output = io.BytesIO()
+            _embed_into(host_pdf, attachments, output, mode, filenames, profile, linearize)
+            result = output.getvalue()
+        else:
+            with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as output_temp:
+                output_path = output_temp.name
             
-            # Process each attachment
-            for i, attachment_path in enumerate(attachment_paths):
-                logger.info(f"Attaching: {attachment_path}")
-                
-                # Generate a unique filename
-                filename = f"attachment_{i+1}_{uuid.uuid4().hex[:8]}.pdf"
-                
-                # Read attachment file as binary
-                with open(attachment_path, 'rb') as attachment_file:
-                    attachment_data = attachment_file.read()
-                
-                # Create file specification dictionary
-                filespec = pikepdf.Dictionary(
-                    Type=pikepdf.Name.Filespec,
-                    F=filename,
-                    UF=filename,
-                    EF=pikepdf.Dictionary(
-                        F=pdf.make_stream(attachment_data)
-                    )
-                )
-                
-                # Add to the EmbeddedFiles name tree
-                ef_tree.Names.append(pikepdf.String(filename))
-                ef_tree.Names.append(filespec)
-                
-                logger.info(f"  - Added attachment {i+1}: {filename}")
+            logger.debug("Writing output to %s", output_path)
+            _embed_into(host_pdf, attachments, output_path, mode, filenames, profile, linearize)
             
-            # Write the output file
-            logger.info(f"Writing output to: {output_path}")
-            pdf.save(output_path)
+            # Read the output file
+            with open(output_path, 'rb') as f:
+                result = f.read()
         
-        # Read the output file
-        with open(output_path, 'rb') as f:
-            result = f.read()
-        
-        logger.info("PDF with attachments created successfully!")
+        _record_embed(host_pdf, attachments, len(result), mode, profile, started)
         return result
         
     except Exception as e:
-        logger.error(f"Error: {str(e)}")
+        logger.error("Embed failed: %s", e)
         raise Exception(f"Failed to create embedded PDF: {str(e)}")
     finally:
-        # Clean up temporary files
-        if host_pdf_path and os.path.exists(host_pdf_path):
-            try:
-                os.unlink(host_pdf_path)
-            except Exception as e:
-                logger.warning(f"Could not delete temporary file {host_pdf_path}: {str(e)}")
-                
-        for path in attachment_paths:
-            if os.path.exists(path):
-                try:
-                    os.unlink(path)
-                except Exception as e:
-                    logger.warning(f"Could not delete temporary file {path}: {str(e)}")
-                    
         if output_path and os.path.exists(output_path):
             try:
                 os.unlink(output_path)
             except Exception as e:
-                logger.warning(f"Could not delete temporary file {output_path}: {str(e)}")
+                logger.warning("Could not delete temporary file %s: %s", output_path, e)
+
+
+def embed_pdfs_to_path(host_pdf: PdfSource, attachments: List[PdfSource], output_path: str,
+                       mode: str = EMBED_MODE_MEMORY, filenames: Optional[List[str]] = None,
+                       profile: str = SAVE_PROFILE_BALANCED, linearize: bool = False) -> int:
+    """
+    Embeds multiple PDF files into a host PDF and saves the result to a file
+    
+    The output is never held in memory, so callers can stream it to a client
+    straight from disk. In 'append' mode output_path may be the host's own
+    path, which updates the host in place.
+    
+    Args:
+        host_pdf: The host PDF as bytes, a path or a seekable file object
+        attachments: Each attachment PDF as bytes, a path or a file object
+        output_path: Where to write the resulting PDF
+        mode: Engine mode (see embed_pdfs)
+        filenames: Optional name for each attachment (see resolve_filenames)
+        profile: Save profile (see embed_pdfs)
+        linearize: Whether to write a linearized ("fast web view") PDF
+    
+    Returns:
+        int: Size of the written PDF in bytes
+    """
+    if mode not in EMBED_MODES:
+        raise ValueError(f"Unknown embed mode: {mode}")
+    if profile not in SAVE_PROFILES:
+        raise ValueError(f"Unknown save profile: {profile}")
+    
+    started = time.perf_counter()
+    try:
+        _embed_into(host_pdf, attachments, output_path, mode, filenames, profile, linearize)
+        
+        output_size = os.path.getsize(output_path)
+        _record_embed(host_pdf, attachments, output_size, mode, profile, started)
+        return output_size
+        
+    except Exception as e:
+        logger.error("Embed failed: %s", e)
+        raise Exception(f"Failed to create embedded PDF: {str(e)}")
+
+
+def _embedded_files_root(pdf: pikepdf.Pdf) -> Optional[pikepdf.Dictionary]:
+    """Returns the root of the EmbeddedFiles name tree, if the PDF has one"""
+    if '/Names' not in pdf.Root or '/EmbeddedFiles' not in pdf.Root.Names:
+        return None
+    return pdf.Root.Names.EmbeddedFiles
+
+
+def _walk_embedded_files(pdf: pikepdf.Pdf) -> Iterator[Tuple[str, pikepdf.Dictionary]]:
+    """
+    Yields (filename, filespec) pairs from the EmbeddedFiles name tree
+    
+    Args:
+        pdf: The open PDF
+    
+    Yields:
+        Tuple containing the filename and its file specification dictionary
+    """
+    root = _embedded_files_root(pdf)
+    if root is not None:
+        yield from name_tree.iter_entries(root)
+
+
+def _embedded_stream(filespec: pikepdf.Dictionary) -> Optional[pikepdf.Stream]:
+    """Returns the /EF /F stream of a file specification, if it has one"""
+    if filespec.get('/EF') and filespec.EF.get('/F'):
+        return filespec.EF.F
+    return None
+
+
+def _describe_attachment(filename: str, stream: pikepdf.Stream) -> Dict[str, Any]:
+    """
+    Builds attachment metadata from the stream dictionary alone
+    
+    Args:
+        filename: Name of the attachment in the name tree
+        stream: The embedded file stream
+    
+    Returns:
+        Dict: name, size, checksum and MIME type (None where not recorded)
+    """
+    params = stream.get('/Params', pikepdf.Dictionary())
+    size = params.get('/Size')
+    checksum = params.get('/CheckSum')
+    subtype = stream.get('/Subtype')
+    
+    return {
+        'name': filename,
+        'size': int(size) if size is not None else None,
+        'checksum': bytes(checksum).hex() if checksum is not None else None,
+        'mime_type': str(subtype)[1:] if subtype is not None else None,
+    }
+
+
+class IndexEntry(NamedTuple):
+    """Metadata and raw-data location of one embedded file stream"""
+    name: str
+    metadata: Dict[str, Any]
+    # Byte offset and length of the encoded stream data, None if not located
+    offset: Optional[int]
+    length: Optional[int]
+    # True for plain /FlateDecode data, False for unfiltered data
+    flate: bool
+
+
+class AttachmentIndex:
+    """
+    Attachment index of one PDF, keyed by the SHA-256 of its bytes
+    
+    Once built, attachments can be listed and read by slicing the original
+    bytes at the recorded offsets, without re-parsing the document.
+    """
+    
+    def __init__(self, digest: str, entries: List[IndexEntry]):
+        self.digest = digest
+        self.entries = entries
+        self._by_name = {entry.name: entry for entry in entries}
+        # Rough in-memory footprint, used by the cache for eviction
+        self.nbytes = 256 + sum(512 + 2 * len(entry.name) for entry in entries)
+    
+    def get(self, name: str) -> Optional[IndexEntry]:
+        return self._by_name.get(name)
+
+
+def _stream_encoding(stream: pikepdf.Stream) -> Optional[bool]:
+    """
+    Classifies a stream's filters for direct decoding
+    
+    Returns:
+        True for plain /FlateDecode, False for no filter, None for anything
+        that needs pikepdf (other filters, predictors, filter chains)
+    """
+    if '/DecodeParms' in stream:
+        return None
+    filters = stream.get('/Filter')
+    if filters is None:
+        return False
+    if isinstance(filters, pikepdf.Array):
+        if len(filters) == 0:
+            return False
+        if len(filters) != 1:
+            return None
+        filters = filters[0]
+    return True if filters == pikepdf.Name.FlateDecode else None
+
+
+def _build_index(pdf: pikepdf.Pdf, pdf_data: bytes, digest: Optional[str]) -> AttachmentIndex:
+    """
+    Records name, metadata and raw-data location of every attachment
+    
+    Args:
+        pdf: The open PDF, parsed from pdf_data
+        pdf_data: Bytes of the PDF file (or a memory map of it)
+        digest: SHA-256 of pdf_data, None for an index that is not cached
+    
+    Returns:
+        AttachmentIndex: The attachment index
+    """
+    # Encrypted documents must always be decoded through pikepdf
+    xref = {} if pdf.is_encrypted else pdf.get_xref_table()
+    
+    entries = []
+    for filename, filespec in _walk_embedded_files(pdf):
+        stream = _embedded_stream(filespec)
+        if stream is None:
+            continue
+        
+        offset = length = None
+        flate = _stream_encoding(stream)
+        xref_entry = xref.get(stream.objgen) if stream.is_indirect else None
+        if flate is not None and xref_entry is not None and xref_entry.type == 1:
+            length = int(stream.stream_dict.get('/Length', -1))
+            if length >= 0:
+                offset = locate_stream_data(pdf_data, xref_entry.offset, length)
+        
+        entries.append(IndexEntry(
+            name=filename,
+            metadata=_describe_attachment(filename, stream),
+            offset=offset,
+            length=length if offset is not None else None,
+            flate=bool(flate)
+        ))
+    
+    return AttachmentIndex(digest, entries)
+
+
+def get_attachment_index(pdf_data: bytes, index_cache=None) -> AttachmentIndex:
+    """
+    Returns the attachment index of a PDF, parsing it only on a cache miss
+    
+    Args:
+        pdf_data: Bytes of the PDF file
+        index_cache: Optional cache of AttachmentIndex objects keyed by digest
+    
+    Returns:
+        AttachmentIndex: The attachment index
+    """
+    digest = hashlib.sha256(pdf_data).hexdigest()
+    if index_cache is not None:
+        index = index_cache.get(digest)
+        if index is not None:
+            return index
+    
+    with timed('open'):
+        pdf = pikepdf.open(io.BytesIO(pdf_data))
+    with pdf, timed('name_tree'):
+        index = _build_index(pdf, pdf_data, digest)
+    
+    if index_cache is not None:
+        index_cache.set(digest, index)
+    return index
+
+
+def _read_indexed(pdf_data: bytes, entry: IndexEntry, raw: bool = False) -> Optional[Tuple[bytes, Optional[str]]]:
+    """
+    Reads an attachment straight from the PDF bytes using its index entry
+    
+    Args:
+        pdf_data: Bytes of the PDF file
+        entry: The attachment's index entry
+        raw: Return Flate data as stored instead of decompressing it
+    
+    Returns:
+        Tuple containing the data and its content encoding (None when
+        decoded), or None if the entry must be read via pikepdf
+    """
+    if entry.offset is None:
+        return None
+    data = memoryview(pdf_data)[entry.offset:entry.offset + entry.length]
+    if not entry.flate:
+        return bytes(data), None
+    if raw:
+        return bytes(data), CONTENT_ENCODING_DEFLATE
+    try:
+        return zlib.decompress(data), None
+    except zlib.error:
+        return None
+
+
+def _read_stream(stream: pikepdf.Stream, raw: bool = False) -> Tuple[bytes, Optional[str]]:
+    """
+    Reads an embedded file stream through pikepdf
+    
+    In raw mode plain /FlateDecode data is returned as stored; anything
+    else (other filters, predictors) is still decoded.
+    """
+    if raw and _stream_encoding(stream):
+        return bytes(stream.read_raw_bytes()), CONTENT_ENCODING_DEFLATE
+    return bytes(stream.read_bytes()), None
+
+
+def _read_named(pdf: pikepdf.Pdf, name: str,
+                raw: bool = False) -> Optional[Tuple[Dict[str, Any], bytes, Optional[str]]]:
+    """Reads one named attachment from an open PDF via the name tree"""
+    with timed('name_tree'):
+        root = _embedded_files_root(pdf)
+        filespec = name_tree.lookup(root, name) if root is not None else None
+    stream = _embedded_stream(filespec) if filespec is not None else None
+    if stream is None:
+        return None
+    with timed('decode'):
+        return (_describe_attachment(name, stream),) + _read_stream(stream, raw)
+
+
+def _iter_indexed_files(pdf_data: bytes, index: AttachmentIndex,
+                        raw: bool = False) -> Iterator[Tuple[str, bytes, Optional[str]]]:
+    """
+    Yields each attachment using the index, opening the PDF with pikepdf
+    only if some entry cannot be read directly
+    """
+    pdf = None
+    try:
+        for entry in index.entries:
+            logger.debug("Extracting %s", entry.name)
+            with timed('decode'):
+                result = _read_indexed(pdf_data, entry, raw)
+            if result is None:
+                if pdf is None:
+                    with timed('open'):
+                        pdf = pikepdf.open(io.BytesIO(pdf_data))
+                named = _read_named(pdf, entry.name, raw)
+                if named is None:
+                    # The name tree lookup disagrees with the walk that built
+                    # the index (duplicate keys, a malformed tree)
+                    logger.warning("Skipping attachment %s: not found by name", entry.name)
+                    continue
+                result = named[1:]
+            yield (entry.name,) + result
+    finally:
+        if pdf is not None:
+            pdf.close()
+
+
+def _iter_files(pdf_data: bytes, index_cache=None,
+                raw: bool = False) -> Iterator[Tuple[str, bytes, Optional[str]]]:
+    """Yields each embedded file, via the index when a cache is given"""
+    if index_cache is not None:
+        yield from _iter_indexed_files(pdf_data, get_attachment_index(pdf_data, index_cache), raw)
+        return
+    
+    with timed('open'):
+        pdf = pikepdf.open(io.BytesIO(pdf_data))
+    with pdf:
+        for filename, filespec in _walk_embedded_files(pdf):
+            # Extract the embedded file stream if it exists
+            stream = _embedded_stream(filespec)
+            if stream is not None:
+                logger.debug("Extracting %s", filename)
+                with timed('decode'):
+                    file_data, encoding = _read_stream(stream, raw)
+                yield filename, file_data, encoding
+
+
+def _iter_extracted(pdf_data: bytes, index_cache=None,
+                    raw: bool = False) -> Iterator[Tuple[str, bytes, Optional[str]]]:
+    """Yields (filename, data, encoding) for each embedded file and logs a summary"""
+    count = bytes_out = 0
+    started = time.perf_counter()
+    try:
+        for filename, file_data, encoding in _iter_files(pdf_data, index_cache, raw):
+            count += 1
+            bytes_out += len(file_data)
+            yield filename, file_data, encoding
+    finally:
+        record_io('extract', bytes_in=len(pdf_data), bytes_out=bytes_out, attachments=count)
+        log_summary(logger, 'extract', attachments=count, bytes_in=len(pdf_data), bytes_out=bytes_out,
+                    indexed=index_cache is not None, raw=raw,
+                    duration_ms=round((time.perf_counter() - started) * 1000, 1))
+
+
+def iter_embedded_files(pdf_data: bytes, index_cache=None) -> Iterator[Tuple[str, bytes]]:
+    """
+    Lazily yields each embedded file of a PDF document, one at a time
+    
+    Only one decoded attachment is held in memory at any moment, so callers
+    can stream attachments to a client without collecting them all first.
+    
+    Args:
+        pdf_data: Bytes of the PDF file
+        index_cache: Optional attachment index cache; on a hit the document
+            is not re-parsed
+    
+    Yields:
+        Tuple containing the filename and the decoded file bytes
+    """
+    for filename, file_data, _ in _iter_extracted(pdf_data, index_cache):
+        yield filename, file_data
+
+
+def iter_raw_files(pdf_data: bytes, index_cache=None) -> Iterator[Tuple[str, bytes, Optional[str]]]:
+    """
+    Lazily yields each embedded file as stored, without decompressing it
+    
+    Attachments stored with a plain /FlateDecode filter are returned as
+    their zlib data, tagged 'deflate', for clients that inflate it
+    themselves (or let their HTTP stack do it). With an index cache hit
+    that is a slice of pdf_data. Unfiltered attachments, and any using
+    other filters or predictors, are returned decoded and tagged None.
+    
+    Args:
+        pdf_data: Bytes of the PDF file
+        index_cache: Optional attachment index cache (see iter_embedded_files)
+    
+    Yields:
+        Tuple containing the filename, the file bytes and their content
+        encoding ('deflate' or None)
+    """
+    yield from _iter_extracted(pdf_data, index_cache, raw=True)
+
+
+def list_attachments(pdf_data: bytes, index_cache=None) -> List[Dict[str, Any]]:
+    """
+    Lists the attachments of a PDF without reading any stream data
+    
+    Args:
+        pdf_data: Bytes of the PDF file
+        index_cache: Optional attachment index cache; on a hit the document
+            is not re-parsed
+    
+    Returns:
+        List: One metadata dictionary per attachment (see _describe_attachment)
+    """
+    try:
+        attachments = [entry.metadata for entry in get_attachment_index(pdf_data, index_cache).entries]
+        log_summary(logger, 'list', attachments=len(attachments), bytes_in=len(pdf_data))
+        return attachments
+    
+    except Exception as e:
+        logger.error("Listing attachments failed: %s", e)
+        raise Exception(f"Failed to list attachments: {str(e)}")
+
+
+def _fetch(pdf_data: bytes, name: str, index_cache=None,
+           raw: bool = False) -> Tuple[Dict[str, Any], bytes, Optional[str]]:
+    """Reads a single named attachment (see get_attachment and get_raw_attachment)"""
+    try:
+        if index_cache is not None:
+            entry = get_attachment_index(pdf_data, index_cache).get(name)
+            if entry is None:
+                raise AttachmentNotFoundError(f"Attachment not found: {name}")
+            result = _read_indexed(pdf_data, entry, raw)
+            if result is not None:
+                log_summary(logger, 'fetch', bytes_in=len(pdf_data), bytes_out=len(result[0]), indexed=True,
+                            raw=raw)
+                return (entry.metadata,) + result
+        
+        with timed('open'):
+            pdf = pikepdf.open(io.BytesIO(pdf_data))
+        with pdf:
+            result = _read_named(pdf, name, raw)
+        if result is not None:
+            log_summary(logger, 'fetch', bytes_in=len(pdf_data), bytes_out=len(result[1]), indexed=False,
+                        raw=raw)
+            return result
+    
+    except AttachmentNotFoundError:
+        raise
+    except Exception as e:
+        logger.error("Extracting attachment %s failed: %s", name, e)
+        raise Exception(f"Failed to extract attachment: {str(e)}")
+    
+    raise AttachmentNotFoundError(f"Attachment not found: {name}")
+
+
+def get_attachment(pdf_data: bytes, name: str, index_cache=None) -> Tuple[Dict[str, Any], bytes]:
+    """
+    Decodes a single named attachment, leaving all other streams untouched
+    
+    Args:
+        pdf_data: Bytes of the PDF file
+        name: Name of the attachment in the EmbeddedFiles name tree
+        index_cache: Optional attachment index cache; on a hit the attachment
+            is sliced out of pdf_data without re-parsing the document
+    
+    Returns:
+        Tuple containing the attachment metadata and its decoded bytes
+    
+    Raises:
+        AttachmentNotFoundError: If the PDF has no attachment with that name
+    """
+    metadata, file_data, _ = _fetch(pdf_data, name, index_cache)
+    return metadata, file_data
+
+
+def get_raw_attachment(pdf_data: bytes, name: str,
+                       index_cache=None) -> Tuple[Dict[str, Any], bytes, Optional[str]]:
+    """
+    Reads a single named attachment as stored (see iter_raw_files)
+    
+    Args:
+        pdf_data: Bytes of the PDF file
+        name: Name of the attachment in the EmbeddedFiles name tree
+        index_cache: Optional attachment index cache
+    
+    Returns:
+        Tuple containing the attachment metadata, its bytes and their
+        content encoding ('deflate' or None)
+    
+    Raises:
+        AttachmentNotFoundError: If the PDF has no attachment with that name
+    """
+    return _fetch(pdf_data, name, index_cache, raw=True)
+
 
-def extract_pdfs(pdf_data: bytes) -> Tuple[int, Dict[str, str]]:
+def extract_pdfs(pdf_data: bytes, index_cache=None) -> Tuple[int, Dict[str, str]]:
     """
     Extracts all embedded PDFs from a PDF document using pikepdf
     
     Args:
         pdf_data: Bytes of the PDF file
+        index_cache: Optional attachment index cache (see iter_embedded_files)
     
     Returns:
         Tuple containing:
           - int: Count of extracted files
           - Dict: Dictionary mapping filenames to base64-encoded PDF content
     """
-    input_pdf_path = None
-    temp_dir = None
-    
     try:
-        # Create a temporary file for the input PDF
-        with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as input_temp:
-            input_temp.write(pdf_data)
-            input_pdf_path = input_temp.name
-        
-        logger.info("Starting PDF extraction")
-        
-        # Create temporary directory for extracted files
-        temp_dir = tempfile.mkdtemp()
-        
-        # Read the PDF file
-        logger.info(f"Reading PDF: {input_pdf_path}")
         extracted_files = {}
-        
-        with pikepdf.open(input_pdf_path) as pdf:
-            # Check if PDF has attachments in the Names tree
-            if '/Names' in pdf.Root and '/EmbeddedFiles' in pdf.Root.Names:
-                names_array = pdf.Root.Names.EmbeddedFiles.Names
-                
-                # Process the names array (alternating name, filespec)
-                for i in range(0, len(names_array), 2):
-                    if i+1 >= len(names_array):
-                        break
-                        
-                    filename = str(names_array[i])
-                    filespec = names_array[i+1]
-                    
-                    # Extract the embedded file stream if it exists
-                    if filespec.get('/EF') and filespec.EF.get('/F'):
-                        logger.info(f"Extracting: {filename}")
-                        
-                        # Get the file data
-                        file_data = bytes(filespec.EF.F.read_bytes())
-                        
-                        # Encode as base64
-                        file_b64 = base64.b64encode(file_data).decode('utf-8')
-                        
-                        # Store in the result dictionary
-                        extracted_files[filename] = file_b64
-                        logger.info(f"Extracted: {filename}")
-        
-        if not extracted_files:
-            logger.info("No attachments found in the PDF.")
-        else:
-            logger.info(f"Successfully extracted {len(extracted_files)} attachments")
+        for filename, file_data in iter_embedded_files(pdf_data, index_cache):
+            # Encode as base64 and store in the result dictionary
+            with timed('base64'):
+                extracted_files[filename] = base64.b64encode(file_data).decode('utf-8')
         
         return len(extracted_files), extracted_files
     
     except Exception as e:
-        logger.error(f"Error extracting attachments: {str(e)}")
+        logger.error("Extracting attachments failed: %s", e)
         raise Exception(f"Failed to extract attachments: {str(e)}")
-    finally:
-        # Clean up temporary files
-        if input_pdf_path and os.path.exists(input_pdf_path):
-            try:
-                os.unlink(input_pdf_path)
-            except Exception as e:
-                logger.warning(f"Could not delete temporary file {input_pdf_path}: {str(e)}")
-                
-        if temp_dir and os.path.exists(temp_dir):
+
+
+def extract_raw_pdfs(pdf_data: bytes, index_cache=None) -> Tuple[int, Dict[str, str], Dict[str, str]]:
+    """
+    Extracts all embedded files as stored (see iter_raw_files)
+    
+    Args:
+        pdf_data: Bytes of the PDF file
+        index_cache: Optional attachment index cache (see iter_embedded_files)
+    
+    Returns:
+        Tuple containing:
+          - int: Count of extracted files
+          - Dict: Dictionary mapping filenames to base64-encoded file bytes
+          - Dict: Content encoding ('deflate') of each file returned encoded
+    """
+    try:
+        extracted_files = {}
+        encodings = {}
+        for filename, file_data, encoding in iter_raw_files(pdf_data, index_cache):
+            with timed('base64'):
+                extracted_files[filename] = base64.b64encode(file_data).decode('utf-8')
+            if encoding is not None:
+                encodings[filename] = encoding
+        
+        return len(extracted_files), extracted_files, encodings
+    
+    except Exception as e:
+        logger.error("Extracting attachments failed: %s", e)
+        raise Exception(f"Failed to extract attachments: {str(e)}")
+
+
+class NestedFile(NamedTuple):
+    """An attachment found by a recursive extraction"""
+    # Names from the outermost attachment down, joined with '/'
+    path: str
+    # 1 for attachments of the document itself, 2 for theirs, and so on
+    depth: int
+    data: bytes
+
+
+class ExtractionBudget:
+    """
+    Limits on the work one recursive extraction may do
+    
+    The counters are shared by every level of the walk. When a limit would
+    be exceeded the walk stops early and exhausted names the limit hit, so
+    a hostile or huge nested document costs a bounded amount of work.
+    Attachments that cannot be decoded within the limits are skipped and
+    listed in skipped with the reason.
+    """
+    
+    def __init__(self, max_depth: int = 4, max_bytes: int = 256 * 1024 * 1024, max_objects: int = 1000000):
+        self.max_depth = max_depth
+        self.max_bytes = max_bytes
+        self.max_objects = max_objects
+        self.bytes_used = 0
+        self.objects_used = 0
+        self.exhausted = None
+        self.skipped = []
+    
+    @property
+    def remaining_bytes(self) -> int:
+        return self.max_bytes - self.bytes_used
+    
+    @property
+    def incomplete(self) -> bool:
+        """True if the walk stopped early or skipped any attachment"""
+        return bool(self.exhausted or self.skipped)
+    
+    def charge_objects(self, count: int) -> bool:
+        """Accounts for objects about to be visited, if the budget allows"""
+        if self.objects_used + count > self.max_objects:
+            self.exhausted = 'max_objects'
+            return False
+        self.objects_used += count
+        return True
+    
+    def charge_bytes(self, count: int) -> None:
+        self.bytes_used += count
+    
+    def skip(self, path: str, reason: str) -> None:
+        self.skipped.append({'path': path, 'reason': reason})
+    
+    def stats(self) -> Dict[str, Any]:
+        """Returns the work done so far, the limit hit, if any, and the skipped attachments"""
+        return {
+            'bytes': self.bytes_used,
+            'objects': self.objects_used,
+            'exhausted': self.exhausted,
+            'skipped': self.skipped,
+        }
+
+
+def _read_bounded(stream: pikepdf.Stream, limit: int) -> Optional[bytes]:
+    """
+    Decodes a stream unless its decoded size would exceed limit bytes
+    
+    Flate data, including chains of Flate filters, is inflated in bounded
+    pieces, so a small stream that expands enormously is abandoned without
+    being fully decompressed. Streams that can only be decoded in one piece
+    (other filters, predictors) cannot be capped, so they are refused
+    rather than decoded; /Params /Size is set by the document, so it cannot
+    vouch for them.
+    
+    Returns:
+        bytes: The decoded data, or None if it exceeds the limit
+    
+    Raises:
+        ValueError: If the stream cannot be decoded in bounded pieces, or
+            its Flate data is damaged
+    """
+    params = stream.get('/Params', pikepdf.Dictionary())
+    if '/Size' in params and int(params.Size) > limit:
+        return None
+    
+    layers = flate_layers(stream)
+    if layers is None:
+        raise ValueError("stream filters cannot be decoded in bounded pieces")
+    pieces = []
+    size = 0
+    try:
+        for piece in decode_pieces([bytes(stream.read_raw_bytes())], layers):
+            size += len(piece)
+            if size > limit:
+                return None
+            pieces.append(piece)
+    except zlib.error as e:
+        raise ValueError(f"damaged Flate data: {e}")
+    return b''.join(pieces)
+
+
+def _is_pdf(data: bytes) -> bool:
+    """Returns True if data starts like a PDF (the header may follow up to 1 KB of junk)"""
+    return b'%PDF-' in data[:1024]
+
+
+def _walk_nested(pdf_data: bytes, prefix: str, depth: int, budget: ExtractionBudget) -> Iterator[NestedFile]:
+    """Yields the attachments of one document, descending into each that is a PDF"""
+    with timed('open'):
+        pdf = pikepdf.open(io.BytesIO(pdf_data))
+    with pdf:
+        # Objects are counted as they are reached: the catalog, then each
+        # filespec and its stream, whatever the trailer claims
+        if not budget.charge_objects(1):
+            return
+        for filename, filespec in _walk_embedded_files(pdf):
+            stream = _embedded_stream(filespec)
+            if not budget.charge_objects(1 if stream is None else 2):
+                return
+            if stream is None:
+                continue
+            
+            path = prefix + filename
             try:
-                os.rmdir(temp_dir)
-            except Exception as e:
-                logger.warning(f"Could not delete temporary directory {temp_dir}: {str(e)}")
+                with timed('decode'):
+                    file_data = _read_bounded(stream, budget.remaining_bytes)
+            except ValueError as e:
+                logger.warning("Skipping nested attachment %s: %s", path, e)
+                budget.skip(path, 'unsupported_stream')
+                continue
+            if file_data is None:
+                budget.exhausted = 'max_bytes'
+                return
+            budget.charge_bytes(len(file_data))
+            
+            logger.debug("Extracting %s", path)
+            yield NestedFile(path, depth, file_data)
+            
+            if depth < budget.max_depth and _is_pdf(file_data):
+                try:
+                    yield from _walk_nested(file_data, path + '/', depth + 1, budget)
+                except pikepdf.PdfError as e:
+                    # An attachment that merely looks like a PDF is kept as a leaf
+                    logger.warning("Could not open nested PDF %s: %s", path, e)
+            if budget.exhausted:
+                return
+
+
+def iter_nested_files(pdf_data: bytes, budget: Optional[ExtractionBudget] = None) -> Iterator[NestedFile]:
+    """
+    Lazily yields every embedded file of a PDF, recursing into attachments
+    that are themselves PDFs with attachments
+    
+    Each file is yielded before its own attachments, and only the chain of
+    documents from the root to the current attachment is held open.
+    
+    Args:
+        pdf_data: Bytes of the PDF file
+        budget: Depth, byte and object limits; when one is hit the walk stops
+            and budget.exhausted records which, and attachments that cannot
+            be decoded in bounded pieces are listed in budget.skipped
+    
+    Yields:
+        NestedFile: Path-qualified name, nesting depth and decoded bytes
+    """
+    budget = budget or ExtractionBudget()
+    started = time.perf_counter()
+    try:
+        yield from _walk_nested(pdf_data, '', 1, budget)
+    finally:
+        log_summary(logger, 'extract_nested', bytes_in=len(pdf_data), **budget.stats(),
+                    duration_ms=round((time.perf_counter() - started) * 1000, 1))
+
+
+def extract_nested_pdfs(pdf_data: bytes, budget: Optional[ExtractionBudget] = None) -> Tuple[int, Dict[str, str]]:
+    """
+    Extracts embedded PDFs at every nesting level
+    
+    Args:
+        pdf_data: Bytes of the PDF file
+        budget: Limits on the walk (see iter_nested_files)
     
-    
\ No newline at end of file
+    Returns:
+        Tuple containing:
+          - int: Count of extracted files
+          - Dict: Dictionary mapping path-qualified names ('outer.pdf/inner.pdf')
+            to base64-encoded content
+    """
+    try:
+        extracted_files = {}
+        for nested in iter_nested_files(pdf_data, budget):
+            with timed('base64'):
+                extracted_files[nested.path] = base64.b64encode(nested.data).decode('utf-8')
+        return len(extracted_files), extracted_files
+    
+    except Exception as e:
+        logger.error("Extracting nested attachments failed: %s", e)
+        raise Exception(f"Failed to extract attachments: {str(e)}")
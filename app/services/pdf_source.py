@@ -0,0 +1,107 @@
+"""
+Helpers for PDF inputs that may be bytes, file paths or spooled file objects
+
+Large uploads are spooled to disk rather than read into memory, so the
+service layer accepts any of these and only materialises bytes where
+pikepdf requires them, one input at a time.
+"""
+from __future__ import annotations
+import hashlib
+import io
+import os
+from typing import BinaryIO, Iterator, Union
+
+from app.services.lazy_import import lazy_import
+
+pikepdf = lazy_import('pikepdf')
+
+# A PDF input: raw bytes, a filesystem path, or a seekable binary file object
+PdfSource = Union[bytes, str, BinaryIO]
+
+# Read size used when hashing or copying file inputs
+CHUNK_SIZE = 1024 * 1024
+
+
+def open_source(source: PdfSource) -> pikepdf.Pdf:
+    """
+    Opens a PDF input with pikepdf without copying it into memory
+
+    Paths are opened directly; file objects are rewound and read by pikepdf
+    as needed; bytes are wrapped in a BytesIO.
+    """
+    if isinstance(source, (bytes, bytearray)):
+        return pikepdf.open(io.BytesIO(source))
+    if isinstance(source, str):
+        return pikepdf.open(source)
+    source.seek(0)
+    return pikepdf.open(source)
+
+
+def iter_chunks(source: PdfSource) -> Iterator[bytes]:
+    """Yields the contents of an input in chunks of at most CHUNK_SIZE bytes"""
+    if isinstance(source, (bytes, bytearray)):
+        view = memoryview(source)
+        for offset in range(0, len(view), CHUNK_SIZE):
+            yield view[offset:offset + CHUNK_SIZE]
+        return
+    if isinstance(source, str):
+        with open(source, 'rb') as f:
+            yield from iter(lambda: f.read(CHUNK_SIZE), b'')
+        return
+    source.seek(0)
+    yield from iter(lambda: source.read(CHUNK_SIZE), b'')
+
+
+def read_source(source: PdfSource) -> bytes:
+    """Returns the full contents of an input as bytes"""
+    if isinstance(source, bytes):
+        return source
+    if isinstance(source, bytearray):
+        return bytes(source)
+    if isinstance(source, str):
+        with open(source, 'rb') as f:
+            return f.read()
+    source.seek(0)
+    return source.read()
+
+
+def source_size(source: PdfSource) -> int:
+    """Returns the size of an input in bytes without reading it"""
+    if isinstance(source, (bytes, bytearray)):
+        return len(source)
+    if isinstance(source, str):
+        return os.path.getsize(source)
+    return source.seek(0, io.SEEK_END)
+
+
+def source_digest(source: PdfSource, algorithm: str = 'sha256') -> str:
+    """Returns the hex digest of an input, hashing file inputs in chunks"""
+    digest = hashlib.new(algorithm)
+    for chunk in iter_chunks(source):
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def copy_to_path(source: PdfSource, path: str) -> None:
+    """Writes an input to a file, copying file inputs in chunks"""
+    with open(path, 'wb') as f:
+        for chunk in iter_chunks(source):
+            f.write(chunk)
+
+
+def read_range(source: PdfSource, offset: int, length: int) -> bytes:
+    """Returns up to length bytes of an input starting at offset without reading the rest"""
+    if isinstance(source, (bytes, bytearray)):
+        return bytes(source[offset:offset + length])
+    if isinstance(source, str):
+        with open(source, 'rb') as f:
+            f.seek(offset)
+            return f.read(length)
+    source.seek(offset)
+    return source.read(length)
+
+
+def read_tail(source: PdfSource, length: int) -> bytes:
+    """Returns up to the last length bytes of an input without reading the rest"""
+    offset = max(0, source_size(source) - length)
+    return read_range(source, offset, length)
@@ -0,0 +1,51 @@
+"""
+Helpers for state kept in spool directories shared between worker processes
+
+Background jobs and upload sessions keep everything on disk so any worker
+process can serve them. Their status files are replaced atomically, and
+writers that must not overlap take an OS file lock, which the OS releases
+if the holder dies.
+"""
+import json
+import os
+import tempfile
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+def write_json(path: str, data: Dict[str, Any]) -> None:
+    """Writes a JSON file atomically"""
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(data, f)
+    os.replace(temp_path, path)
+
+
+@contextmanager
+def exclusive_lock(path: str) -> Iterator[None]:
+    """
+    Holds an exclusive lock on a lock file, without waiting
+
+    Raises:
+        BlockingIOError: If another thread or process holds the lock
+    """
+    with open(path, 'wb') as f:
+        try:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError as e:
+            raise BlockingIOError(f"{path} is locked") from e
+        try:
+            yield
+        finally:
+            if fcntl is None:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
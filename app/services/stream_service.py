@@ -0,0 +1,111 @@
+"""
+Service for streaming extracted attachments to clients as ZIP or multipart bodies
+"""
+import re
+import zipfile
+from typing import Iterable, Iterator, Tuple
+from urllib.parse import quote
+
+# Size of the slices written into each archive entry
+CHUNK_SIZE = 64 * 1024
+
+# Characters that must not reach a header value: controls (CR/LF would
+# start a new header) and those that would end or escape a quoted string
+_UNSAFE_HEADER_CHARS = re.compile(r'[\x00-\x1f\x7f"\\]')
+
+
+def content_disposition(filename: str, disposition: str = 'attachment') -> str:
+    """
+    Builds a Content-Disposition value for an untrusted filename
+
+    Control characters, quotes and backslashes are dropped. A name that is
+    not plain ASCII is also given as an RFC 6266 / RFC 5987 filename*
+    parameter, with an ASCII approximation in filename for older clients.
+    """
+    name = _UNSAFE_HEADER_CHARS.sub('', filename) or 'attachment'
+    try:
+        name.encode('ascii')
+    except UnicodeEncodeError:
+        fallback = name.encode('ascii', 'replace').decode('ascii').replace('?', '_')
+        return f"{disposition}; filename=\"{fallback}\"; filename*=UTF-8''{quote(name, safe='')}"
+    return f'{disposition}; filename="{name}"'
+
+
+class _ChunkSink:
+    """Write-only, non-seekable file object that buffers bytes until drained"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def stream_zip(entries: Iterable[Tuple[str, bytes]]) -> Iterator[bytes]:
+    """
+    Encodes (filename, data) pairs as a ZIP archive, yielding it in chunks
+
+    The archive is written with data descriptors, so no entry needs to be
+    known up front and only the current entry is held in memory.
+
+    Args:
+        entries: Iterable of (filename, bytes) pairs
+
+    Yields:
+        bytes: Successive chunks of the ZIP archive
+    """
+    sink = _ChunkSink()
+    with zipfile.ZipFile(sink, mode='w', compression=zipfile.ZIP_STORED) as archive:
+        for filename, data in entries:
+            view = memoryview(data)
+            with archive.open(filename, mode='w', force_zip64=True) as entry:
+                for offset in range(0, len(view), CHUNK_SIZE):
+                    entry.write(view[offset:offset + CHUNK_SIZE])
+                    chunk = sink.drain()
+                    if chunk:
+                        yield chunk
+            chunk = sink.drain()
+            if chunk:
+                yield chunk
+    chunk = sink.drain()
+    if chunk:
+        yield chunk
+
+
+def stream_multipart(entries: Iterable[Tuple], boundary: str,
+                     content_type: str = 'application/pdf') -> Iterator[bytes]:
+    """
+    Encodes (filename, data) pairs as a multipart/mixed body
+
+    Args:
+        entries: Iterable of (filename, bytes) pairs, or of (filename, bytes,
+            encoding) triples whose parts carry a Content-Encoding header
+            when encoding is set (e.g. 'deflate' for raw Flate data)
+        boundary: Multipart boundary string (must not occur in the data)
+        content_type: Content type announced for every part
+
+    Yields:
+        bytes: Part headers and bodies, one attachment at a time
+    """
+    delimiter = f"--{boundary}\r\n".encode('ascii')
+    for filename, data, *encoding in entries:
+        encoding_header = f"Content-Encoding: {encoding[0]}\r\n" if encoding and encoding[0] else ''
+        yield delimiter
+        yield (
+            f"Content-Type: {content_type}\r\n"
+            f"{encoding_header}"
+            f"Content-Disposition: {content_disposition(filename)}\r\n"
+            f"Content-Length: {len(data)}\r\n\r\n"
+        ).encode('utf-8')
+        yield data
+        yield b"\r\n"
+    yield f"--{boundary}--\r\n".encode('ascii')
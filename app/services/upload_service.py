@@ -0,0 +1,357 @@
+"""
+Service for resumable, chunked uploads of large PDFs
+
+Each upload session lives in its own directory under a spool directory:
+
+    <spool>/<upload_id>/status.json   session state, written atomically
+    <spool>/<upload_id>/data          the file, written chunk by chunk
+    <spool>/<upload_id>/chunks        offset, length and SHA-256 of each chunk
+    <spool>/<upload_id>/lock          serialises writes to the session
+
+Chunks are appended in order: each one must start at the number of bytes
+received so far, and is streamed straight into the data file while it is
+hashed. A chunk whose checksum does not match is cut off again, so a
+client whose connection drops only resends from the last accepted offset.
+The chunk log is append-only with fixed-size records in offset order, so
+accepting a chunk costs the same however many came before it, and a
+resent chunk is found by binary search.
+Once finalized, the file can be used by any number of operations, from any
+worker process sharing the spool directory, until it expires or is deleted.
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional
+
+from app.services.pdf_source import CHUNK_SIZE
+from app.services.spool import exclusive_lock, write_json
+
+# Setup logging
+logger = logging.getLogger(__name__)
+
+# Upload session states
+UPLOAD_OPEN = 'open'
+UPLOAD_COMPLETE = 'complete'
+
+_UPLOAD_ID = re.compile(r'^[0-9a-f]{32}$')
+_SHA256 = re.compile(r'^[0-9a-f]{64}$')
+
+# Minimum time between two sweeps of expired sessions
+_SWEEP_INTERVAL = 60
+
+# One chunk log record: offset, length and hex SHA-256
+_CHUNK_RECORD = '%020d %020d %s\n'
+_CHUNK_RECORD_SIZE = len(_CHUNK_RECORD % (0, 0, '0' * 64))
+
+
+class UploadNotFoundError(Exception):
+    """Raised when an upload session does not exist or has expired"""
+
+
+class UploadConflictError(Exception):
+    """Raised when a request does not fit the session's current state"""
+
+    def __init__(self, message: str, status: Dict[str, Any]):
+        super().__init__(message)
+        self.status = status
+
+
+class UploadChecksumError(ValueError):
+    """Raised when a chunk or a finalized file does not match its checksum"""
+
+
+def _check_sha256(value: Optional[str]) -> Optional[str]:
+    if value is None:
+        return None
+    value = value.strip().lower()
+    if not _SHA256.match(value):
+        raise ValueError("Checksums must be hex-encoded SHA-256 digests")
+    return value
+
+
+def _append_chunk(log_path: str, count: int, offset: int, length: int, sha256: str) -> None:
+    """Appends a chunk's record after the first count, dropping any left by an interrupted write"""
+    with open(log_path, 'r+b') as f:
+        f.truncate(count * _CHUNK_RECORD_SIZE)
+        f.seek(0, os.SEEK_END)
+        f.write((_CHUNK_RECORD % (offset, length, sha256)).encode('ascii'))
+
+
+def _find_chunk(log_path: str, count: int, offset: int) -> Optional[Dict[str, Any]]:
+    """Returns the record of the accepted chunk starting at offset, if any"""
+    with open(log_path, 'rb') as f:
+        low, high = 0, count
+        while low < high:
+            middle = (low + high) // 2
+            f.seek(middle * _CHUNK_RECORD_SIZE)
+            chunk_offset, length, sha256 = f.read(_CHUNK_RECORD_SIZE).decode('ascii').split()
+            if int(chunk_offset) == offset:
+                return {'offset': offset, 'length': int(length), 'sha256': sha256}
+            if int(chunk_offset) < offset:
+                low = middle + 1
+            else:
+                high = middle
+    return None
+
+
+def _digest(stream: BinaryIO) -> str:
+    digest = hashlib.sha256()
+    for chunk in iter(lambda: stream.read(CHUNK_SIZE), b''):
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+class UploadManager:
+    """Stores upload sessions on disk and hands out the finished files"""
+
+    def __init__(self, spool_dir: str, ttl_seconds: int = 86400, max_bytes: Optional[int] = None):
+        self.spool_dir = spool_dir
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self._last_sweep = 0.0
+        os.makedirs(spool_dir, exist_ok=True)
+
+    def _upload_dir(self, upload_id: str) -> str:
+        if _UPLOAD_ID.match(upload_id or ''):
+            upload_dir = os.path.join(self.spool_dir, upload_id)
+            if os.path.isdir(upload_dir):
+                return upload_dir
+        raise UploadNotFoundError(f"Upload session '{upload_id}' not found")
+
+    def _read_status(self, upload_dir: str) -> Dict[str, Any]:
+        try:
+            with open(os.path.join(upload_dir, 'status.json')) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            raise UploadNotFoundError(f"Upload session '{os.path.basename(upload_dir)}' not found")
+
+    @contextmanager
+    def _locked(self, upload_id: str) -> Iterator[str]:
+        """Holds a session's lock, failing instead of waiting if another request has it"""
+        upload_dir = self._upload_dir(upload_id)
+        try:
+            with exclusive_lock(os.path.join(upload_dir, 'lock')):
+                yield upload_dir
+        except BlockingIOError:
+            raise UploadConflictError("Another request is writing to this upload session",
+                                      self._read_status(upload_dir))
+
+    def create(self, size: Optional[int] = None, filename: Optional[str] = None,
+               sha256: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Opens a new upload session
+
+        Args:
+            size: Total size of the file, if known up front
+            filename: Name the file is embedded under when used as an attachment
+            sha256: Expected SHA-256 of the whole file, checked when finalized
+
+        Returns:
+            Dict: The initial session status
+
+        Raises:
+            ValueError: If the size is invalid or larger than allowed
+        """
+        if size is not None and (size <= 0 or (self.max_bytes is not None and size > self.max_bytes)):
+            raise ValueError(f"Invalid upload size {size}, expected 1 to {self.max_bytes} bytes")
+        sha256 = _check_sha256(sha256)
+        self.sweep()
+
+        upload_id = uuid.uuid4().hex
+        upload_dir = os.path.join(self.spool_dir, upload_id)
+        os.makedirs(upload_dir)
+        open(os.path.join(upload_dir, 'data'), 'wb').close()
+        open(os.path.join(upload_dir, 'chunks'), 'wb').close()
+
+        now = time.time()
+        status = {
+            'upload_id': upload_id,
+            'status': UPLOAD_OPEN,
+            'filename': filename,
+            'size': size,
+            'sha256': sha256,
+            'received': 0,
+            'chunk_count': 0,
+            'created_at': now,
+            'updated_at': now,
+        }
+        write_json(os.path.join(upload_dir, 'status.json'), status)
+        logger.debug("Opened upload session %s", upload_id)
+        return status
+
+    def status(self, upload_id: str) -> Dict[str, Any]:
+        """Returns a session's status, including the offset the next chunk must start at"""
+        return self._read_status(self._upload_dir(upload_id))
+
+    def write_chunk(self, upload_id: str, offset: int, stream: BinaryIO,
+                    sha256: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Appends a chunk to a session's file, streaming it from the request body
+
+        Resending a chunk that was already accepted succeeds without writing
+        anything, so clients can retry blindly: the resent chunk is matched
+        by its checksum, or, if none is given, by hashing its body.
+
+        Args:
+            upload_id: The session
+            offset: Byte offset of the chunk; must equal the bytes received so far
+            stream: Readable chunk body
+            sha256: Expected SHA-256 of the chunk
+
+        Returns:
+            Dict: The updated session status
+
+        Raises:
+            UploadNotFoundError: If the session does not exist
+            UploadConflictError: If the session is finalized, busy, or expects another offset
+            UploadChecksumError: If the chunk does not match its checksum
+            ValueError: If the chunk is empty or runs past the file's size
+        """
+        sha256 = _check_sha256(sha256)
+        with self._locked(upload_id) as upload_dir:
+            status = self._read_status(upload_dir)
+            if status['status'] != UPLOAD_OPEN:
+                raise UploadConflictError("Upload session is already finalized", status)
+            log_path = os.path.join(upload_dir, 'chunks')
+            if offset != status['received']:
+                accepted = _find_chunk(log_path, status['chunk_count'], offset)
+                if accepted is not None and (sha256 or _digest(stream)) == accepted['sha256']:
+                    return status
+                raise UploadConflictError(
+                    f"Chunk starts at offset {offset}, expected {status['received']}", status
+                )
+
+            limit = status['size'] if status['size'] is not None else self.max_bytes
+            digest = hashlib.sha256()
+            length = 0
+            with open(os.path.join(upload_dir, 'data'), 'r+b') as f:
+                f.seek(offset)
+                try:
+                    for chunk in iter(lambda: stream.read(CHUNK_SIZE), b''):
+                        length += len(chunk)
+                        if limit is not None and offset + length > limit:
+                            raise ValueError(f"Chunk runs past the end of the {limit} byte upload")
+                        digest.update(chunk)
+                        f.write(chunk)
+                    if length == 0:
+                        raise ValueError("Empty chunk")
+                    if sha256 is not None and digest.hexdigest() != sha256:
+                        raise UploadChecksumError(
+                            f"Chunk checksum mismatch: expected {sha256}, received {digest.hexdigest()}"
+                        )
+                except BaseException:
+                    # Drop whatever part of the chunk was written
+                    f.truncate(offset)
+                    raise
+
+            _append_chunk(log_path, status['chunk_count'], offset, length, digest.hexdigest())
+            status['received'] = offset + length
+            status['chunk_count'] += 1
+            status['updated_at'] = time.time()
+            write_json(os.path.join(upload_dir, 'status.json'), status)
+            return status
+
+    def finalize(self, upload_id: str, sha256: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Completes a session, after which its file can be used but not changed
+
+        Args:
+            upload_id: The session
+            sha256: Expected SHA-256 of the whole file, overriding the one
+                given when the session was created
+
+        Returns:
+            Dict: The final session status, with the file's size and SHA-256
+
+        Raises:
+            UploadNotFoundError: If the session does not exist
+            UploadConflictError: If chunks are missing or another request is writing
+            UploadChecksumError: If the file does not match its checksum
+        """
+        sha256 = _check_sha256(sha256)
+        with self._locked(upload_id) as upload_dir:
+            status = self._read_status(upload_dir)
+            if status['status'] == UPLOAD_COMPLETE:
+                return status
+            if status['received'] == 0 or (status['size'] is not None and status['received'] != status['size']):
+                raise UploadConflictError(
+                    f"Upload is incomplete: received {status['received']} of {status['size'] or 'unknown'} bytes",
+                    status
+                )
+
+            digest = hashlib.sha256()
+            with open(os.path.join(upload_dir, 'data'), 'rb') as f:
+                for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+                    digest.update(chunk)
+            expected = sha256 or status['sha256']
+            if expected is not None and digest.hexdigest() != expected:
+                raise UploadChecksumError(
+                    f"File checksum mismatch: expected {expected}, received {digest.hexdigest()}"
+                )
+
+            status.update(status=UPLOAD_COMPLETE, size=status['received'], sha256=digest.hexdigest(),
+                          finalized_at=time.time(), updated_at=time.time())
+            write_json(os.path.join(upload_dir, 'status.json'), status)
+            logger.info("Upload session %s finalized: %d bytes in %d chunks",
+                        upload_id, status['size'], status['chunk_count'])
+            return status
+
+    def path(self, upload_id: str) -> str:
+        """
+        Returns the file of a finalized session, renewing its expiry
+
+        Raises:
+            UploadNotFoundError: If the session does not exist
+            UploadConflictError: If the session has not been finalized
+        """
+        upload_dir = self._upload_dir(upload_id)
+        status = self._read_status(upload_dir)
+        if status['status'] != UPLOAD_COMPLETE:
+            raise UploadConflictError(f"Upload session '{upload_id}' has not been finalized", status)
+        os.utime(os.path.join(upload_dir, 'status.json'))
+        return os.path.join(upload_dir, 'data')
+
+    def size(self, upload_id: str) -> int:
+        """Returns the bytes received by a session so far, or 0 if it does not exist"""
+        try:
+            return self.status(upload_id)['received']
+        except UploadNotFoundError:
+            return 0
+
+    def delete(self, upload_id: str) -> None:
+        """Deletes a session and its file; operations already using the file keep reading it"""
+        shutil.rmtree(self._upload_dir(upload_id), ignore_errors=True)
+
+    def sweep(self, force: bool = False) -> List[str]:
+        """
+        Deletes sessions unused for more than ttl_seconds
+
+        A session counts as used when a chunk is written or its file is
+        handed to an operation. Runs at most once a minute unless forced.
+
+        Returns:
+            List: IDs of the deleted sessions
+        """
+        now = time.time()
+        if not force and now - self._last_sweep < _SWEEP_INTERVAL:
+            return []
+        self._last_sweep = now
+
+        removed = []
+        for upload_id in os.listdir(self.spool_dir):
+            try:
+                last_used = os.path.getmtime(os.path.join(self.spool_dir, upload_id, 'status.json'))
+            except OSError:
+                continue
+            if now - last_used > self.ttl_seconds:
+                shutil.rmtree(os.path.join(self.spool_dir, upload_id), ignore_errors=True)
+                removed.append(upload_id)
+        if removed:
+            logger.info("Removed %d expired upload sessions", len(removed))
+        return removed
@@ -0,0 +1,129 @@
+"""
+Swagger UI and OpenAPI spec for the Flask application
+
+Importing flasgger (and its jsonschema, yaml and mistune dependencies)
+and building the spec from every route's docstring is the largest part of
+the app's startup time, and most processes never serve the docs. In
+'lazy' mode the routes flasgger would register are registered here
+instead, and flasgger is imported and its Swagger object built on the
+first request to one of them. 'eager' keeps the original behaviour and
+'off' serves no docs at all.
+"""
+import importlib.util
+import os
+import threading
+
+from flask import Blueprint, current_app, jsonify, redirect, url_for
+
+SWAGGER_MODE_LAZY = 'lazy'
+SWAGGER_MODE_EAGER = 'eager'
+SWAGGER_MODE_OFF = 'off'
+SWAGGER_MODES = (SWAGGER_MODE_LAZY, SWAGGER_MODE_EAGER, SWAGGER_MODE_OFF)
+
+SWAGGER_CONFIG = {
+    "headers": [],
+    "specs": [
+        {
+            "endpoint": "apispec",
+            "route": "/apispec.json",
+            "rule_filter": lambda rule: True,
+            "model_filter": lambda tag: True,
+        }
+    ],
+    "static_url_path": "/flasgger_static",
+    "swagger_ui": True,
+    "specs_route": "/apidocs/"
+}
+
+_swagger_lock = threading.Lock()
+
+
+def _new_swagger(app=None):
+    # Apply patch for flasgger to work with Python 3.12
+    from app import flasgger_patch  # noqa: F401
+    from flasgger import Swagger
+    return Swagger(app, config=dict(SWAGGER_CONFIG))
+
+
+def get_swagger(app):
+    """
+    Returns the app's Swagger object, building it on first use
+
+    Args:
+        app: The Flask application
+
+    Returns:
+        flasgger.Swagger: Swagger object serving the app's spec
+    """
+    swagger = app.extensions.get('swagger')
+    if swagger is None:
+        with _swagger_lock:
+            swagger = app.extensions.get('swagger')
+            if swagger is None:
+                # Not attached through init_app: the routes are already ours
+                swagger = _new_swagger()
+                swagger.app = app
+                swagger.load_config(app)
+                app.extensions['swagger'] = swagger
+    return swagger
+
+
+def _flasgger_ui_folder(name: str) -> str:
+    # Located without importing flasgger
+    spec = importlib.util.find_spec('flasgger')
+    return os.path.join(list(spec.submodule_search_locations)[0], 'ui3', name)
+
+
+def _lazy_blueprint() -> Blueprint:
+    """Blueprint with flasgger's routes and endpoint names, built on first hit"""
+    spec = SWAGGER_CONFIG['specs'][0]
+    blueprint = Blueprint(
+        'flasgger',
+        __name__,
+        template_folder=_flasgger_ui_folder('templates'),
+        static_folder=_flasgger_ui_folder('static'),
+        static_url_path=SWAGGER_CONFIG['static_url_path']
+    )
+
+    def apidocs():
+        from flasgger.base import APIDocsView
+        swagger = get_swagger(current_app)
+        return APIDocsView(view_args={'config': swagger.config}).get()
+
+    def apispec():
+        return jsonify(get_swagger(current_app).get_apispecs(spec['endpoint']))
+
+    def oauth_redirect():
+        from flasgger.base import OAuthRedirect
+        return OAuthRedirect().get()
+
+    blueprint.add_url_rule(SWAGGER_CONFIG['specs_route'], 'apidocs', view_func=apidocs)
+    blueprint.add_url_rule('/oauth2-redirect.html', 'oauth_redirect', view_func=oauth_redirect)
+    # Backwards compatibility with flasgger's old url style
+    blueprint.add_url_rule('/apidocs/index.html', view_func=lambda: redirect(url_for('flasgger.apidocs')))
+    blueprint.add_url_rule(spec['route'], spec['endpoint'], view_func=apispec)
+    return blueprint
+
+
+def init_swagger(app, mode: str = SWAGGER_MODE_LAZY) -> None:
+    """
+    Sets up the Swagger UI and spec routes
+
+    Args:
+        app: The Flask application
+        mode: 'lazy', 'eager' or 'off'
+    """
+    if mode not in SWAGGER_MODES:
+        raise ValueError(f"Unknown Swagger mode: {mode}")
+    if mode == SWAGGER_MODE_EAGER:
+        app.extensions['swagger'] = _new_swagger(app)
+    elif mode == SWAGGER_MODE_LAZY:
+        app.register_blueprint(_lazy_blueprint())
+
+
+def build_spec(app) -> None:
+    """Builds and caches the spec now rather than on the first docs request"""
+    if 'swagger' not in app.extensions and 'flasgger' not in app.blueprints:
+        return
+    with app.test_request_context():
+        get_swagger(app).get_apispecs(SWAGGER_CONFIG['specs'][0]['endpoint'])
@@ -0,0 +1,6 @@
+"""
+ASGI entry point for the Flask application, e.g. `uvicorn asgi:app`
+"""
+from app.asgi import create_asgi_app
+
+app = create_asgi_app()
@@ -0,0 +1,60 @@
+"""
+Benchmark comparing the in-memory and temp-file engine modes of embed_pdfs
+
+Usage:
+    python -m benchmarks.bench_embed_modes [--attachments N] [--pages N] [--repeat N]
+"""
+import argparse
+import io
+import os
+import sys
+import time
+
+import pikepdf
+
+# Allow running the script directly from the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.pdf_service import embed_pdfs, EMBED_MODES
+
+
+def make_pdf(pages: int) -> bytes:
+    """
+    Builds a synthetic PDF with the given number of blank pages
+
+    Args:
+        pages: Number of pages to add
+
+    Returns:
+        bytes: The generated PDF
+    """
+    pdf = pikepdf.new()
+    for _ in range(pages):
+        pdf.add_blank_page()
+    output = io.BytesIO()
+    pdf.save(output)
+    return output.getvalue()
+
+
+def run(attachments: int, pages: int, repeat: int) -> None:
+    """Times each engine mode and prints the best and mean wall time"""
+    host_pdf = make_pdf(pages)
+    attachment_bytes = [make_pdf(pages) for _ in range(attachments)]
+
+    print(f"host={len(host_pdf)} bytes, attachments={attachments} x {len(attachment_bytes[0])} bytes")
+    for mode in EMBED_MODES:
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            embed_pdfs(host_pdf, attachment_bytes, mode=mode)
+            timings.append(time.perf_counter() - start)
+        print(f"{mode:>10}: best {min(timings) * 1000:8.2f} ms, mean {sum(timings) / len(timings) * 1000:8.2f} ms")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Compare embed_pdfs engine modes")
+    parser.add_argument("--attachments", type=int, default=20, help="Number of attachments to embed")
+    parser.add_argument("--pages", type=int, default=50, help="Pages per synthetic PDF")
+    parser.add_argument("--repeat", type=int, default=5, help="Repetitions per mode")
+    args = parser.parse_args()
+    run(args.attachments, args.pages, args.repeat)
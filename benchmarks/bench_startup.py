@@ -0,0 +1,150 @@
+"""
+Benchmark of application startup and first-request latency
+
+Each run starts a fresh interpreter, as a newly booted worker would, and
+times importing the app package, create_app(), the first PDF request (a
+list of a small PDF's attachments) and the first /apispec.json request.
+It also records the resident set size after create_app() and whether
+pikepdf and flasgger were imported by then. Configurations:
+
+    eager    Swagger set up at startup (the original behaviour)
+    lazy     flasgger imported and the spec built on the first docs request
+    off      no Swagger UI or spec
+    preload  lazy, plus the warm-up done before workers fork under
+             gunicorn --preload (its cost moves into create_app)
+
+Usage:
+    python -m benchmarks.bench_startup [--configs eager,lazy,off,preload] [--repeat N]
+"""
+import argparse
+import io
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+# Allow running the script directly from the repository root
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+CONFIGURATIONS = {
+    'eager': {'PDF_SWAGGER': 'eager'},
+    'lazy': {'PDF_SWAGGER': 'lazy'},
+    'off': {'PDF_SWAGGER': 'off'},
+    'preload': {'PDF_SWAGGER': 'lazy', 'PDF_PRELOAD': '1'},
+}
+
+TIMINGS = ('import_ms', 'create_app_ms', 'first_pdf_ms', 'first_spec_ms', 'process_ms')
+
+
+def make_pdf() -> bytes:
+    """Builds a one-page PDF with one embedded file"""
+    import pikepdf
+    pdf = pikepdf.new()
+    pdf.add_blank_page()
+    pdf.attachments['bench.txt'] = pikepdf.AttachedFileSpec(pdf, b'startup benchmark')
+    output = io.BytesIO()
+    pdf.save(output)
+    return output.getvalue()
+
+
+def _rss() -> int:
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+
+
+def measure(pdf_path: str) -> None:
+    """Runs in the child interpreter and prints its timings as JSON"""
+    started = time.perf_counter()
+    from app import create_app
+    imported = time.perf_counter()
+    app = create_app()
+    created = time.perf_counter()
+    loaded = {name: name in sys.modules for name in ('pikepdf', 'flasgger')}
+    rss = _rss() if os.path.exists('/proc/self/statm') else None
+
+    client = app.test_client()
+    with open(pdf_path, 'rb') as f:
+        pdf_bytes = f.read()
+    start = time.perf_counter()
+    response = client.post('/api/pdf/attachments', data={'pdf': (io.BytesIO(pdf_bytes), 'bench.pdf')},
+                           content_type='multipart/form-data')
+    response.close()
+    first_pdf = time.perf_counter() - start
+    if response.status_code != 200:
+        raise RuntimeError(f"PDF request failed with {response.status_code}")
+
+    start = time.perf_counter()
+    response = client.get('/apispec.json')
+    response.close()
+    first_spec = time.perf_counter() - start if response.status_code == 200 else None
+
+    print(json.dumps({
+        'import_ms': (imported - started) * 1000,
+        'create_app_ms': (created - imported) * 1000,
+        'first_pdf_ms': first_pdf * 1000,
+        'first_spec_ms': first_spec * 1000 if first_spec is not None else None,
+        'rss_after_create_app': rss,
+        'loaded_after_create_app': loaded,
+    }))
+
+
+def _run_once(config: str, pdf_path: str) -> dict:
+    env = dict(os.environ, PDF_LOG_LEVEL='WARNING')
+    env.pop('PDF_PRELOAD', None)
+    env.update(CONFIGURATIONS[config])
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, '-m', 'benchmarks.bench_startup', '--measure', pdf_path],
+        cwd=REPO_ROOT, env=env, capture_output=True, text=True, check=True
+    )
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    # Interpreter start to exit, including Python's own startup
+    result['process_ms'] = (time.perf_counter() - start) * 1000
+    return result
+
+
+def _median(values):
+    values = [value for value in values if value is not None]
+    return statistics.median(values) if values else None
+
+
+def run(configs, repeat: int) -> None:
+    """Runs each configuration repeat times and prints the medians"""
+    with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as f:
+        f.write(make_pdf())
+        pdf_path = f.name
+    try:
+        print(f"{'config':>8} " + ' '.join(f"{name:>14}" for name in TIMINGS) + f" {'rss_mb':>8}  loaded")
+        for config in configs:
+            results = [_run_once(config, pdf_path) for _ in range(repeat)]
+            cells = []
+            for name in TIMINGS:
+                value = _median(result[name] for result in results)
+                cells.append(f"{value:14.1f}" if value is not None else f"{'-':>14}")
+            rss = _median(result['rss_after_create_app'] for result in results)
+            loaded = ','.join(name for name, flag in results[0]['loaded_after_create_app'].items() if flag)
+            rss_cell = f"{rss / 1024 / 1024:8.1f}" if rss is not None else f"{'-':>8}"
+            print(f"{config:>8} " + ' '.join(cells) + f" {rss_cell}  {loaded or '-'}")
+    finally:
+        os.unlink(pdf_path)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Measure startup and first-request latency")
+    parser.add_argument("--configs", default=','.join(CONFIGURATIONS),
+                        help="Comma-separated configurations: eager,lazy,off,preload")
+    parser.add_argument("--repeat", type=int, default=5, help="Fresh interpreters per configuration")
+    parser.add_argument("--measure", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.measure:
+        measure(args.measure)
+    else:
+        configs = args.configs.split(',')
+        unknown = set(configs) - set(CONFIGURATIONS)
+        if unknown:
+            parser.error(f"Unknown configurations: {', '.join(sorted(unknown))}")
+        run(configs, args.repeat)
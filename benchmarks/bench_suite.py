@@ -0,0 +1,522 @@
+"""
+Benchmark suite for embed/extract throughput, memory and temp-disk usage
+
+Synthetic host and attachment PDFs are generated across a matrix of
+attachment sizes, attachment counts and name-tree shapes (flat /Names array
+as older producers write it, or a balanced /Kids tree as this service
+writes it). Each case runs in a fresh subprocess so its peak RSS and temp
+disk usage are its own, against either the service functions or the Flask
+endpoints (through the test client, with the caches disabled).
+
+Usage:
+    python -m benchmarks.bench_suite run [--preset quick|full] [--sizes 10KB,1MB]
+        [--counts 1,100] [--trees flat,nested] [--operations embed,extract,list,fetch]
+        [--targets service,endpoint] [--repeat N] [--output results.json]
+    python -m benchmarks.bench_suite compare OLD.json NEW.json [--threshold 1.10]
+        [--fail-on-regression]
+
+The run command writes one JSON document with the environment (commit,
+Python and pikepdf versions) and a record per case, so results from two
+commits can be compared with the compare command.
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import pikepdf
+
+# Allow running the script directly from the repository root
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+OPERATIONS = ('embed', 'extract', 'list', 'fetch')
+TARGETS = ('service', 'endpoint')
+TREES = ('flat', 'nested')
+
+PRESETS = {
+    'quick': {
+        'sizes': '10KB,1MB',
+        'counts': '1,100',
+        'max_total': '256MB',
+    },
+    'full': {
+        'sizes': '10KB,1MB,50MB,500MB',
+        'counts': '1,10,100,1000,10000',
+        'max_total': '2GB',
+    },
+}
+
+_UNITS = {'B': 1, 'KB': 1024, 'MB': 1024 ** 2, 'GB': 1024 ** 3}
+
+# How often the temp directory is measured while a case runs
+_DISK_SAMPLE_INTERVAL = 0.005
+
+
+def parse_size(text: str) -> int:
+    """Parses a size such as '10KB' or '500MB' into bytes"""
+    text = text.strip().upper()
+    for unit in ('GB', 'MB', 'KB', 'B'):
+        if text.endswith(unit):
+            return int(float(text[:-len(unit)]) * _UNITS[unit])
+    return int(text)
+
+
+def format_size(size: int) -> str:
+    for unit in ('GB', 'MB', 'KB'):
+        if size >= _UNITS[unit] and size % _UNITS[unit] == 0:
+            return f"{size // _UNITS[unit]}{unit}"
+    return f"{size}B"
+
+
+# --- Synthetic inputs ---------------------------------------------------
+
+def make_pdf(size: int, seed: int) -> bytes:
+    """
+    Builds a one-page PDF padded to roughly size bytes
+
+    The padding is a stream of seeded random bytes, so the PDF does not
+    compress and every seed gives a distinct payload.
+    """
+    pdf = pikepdf.new()
+    pdf.add_blank_page()
+    overhead = 600
+    if size > overhead:
+        pdf.Root.Padding = pdf.make_stream(random.Random(seed).randbytes(size - overhead))
+    output = io.BytesIO()
+    pdf.save(output, compress_streams=False)
+    return output.getvalue()
+
+
+def make_container(size: int, count: int, tree: str, seed: int) -> bytes:
+    """
+    Builds a PDF holding count attachments of about size bytes each
+
+    Args:
+        size: Size of each attachment
+        count: Number of attachments
+        tree: 'flat' for a single /Names array, 'nested' for a balanced tree
+        seed: Seed for the attachment payloads
+
+    Returns:
+        bytes: The container PDF
+    """
+    from app.services import name_tree
+
+    pdf = pikepdf.new()
+    pdf.add_blank_page()
+    entries = []
+    for i in range(count):
+        data = make_pdf(size, seed + i)
+        stream = pdf.make_stream(
+            data,
+            Type=pikepdf.Name.EmbeddedFile,
+            Subtype=pikepdf.Name('/application/pdf'),
+            Params=pikepdf.Dictionary(Size=len(data))
+        )
+        name = f"attachment_{i:05d}.pdf"
+        filespec = pdf.make_indirect(pikepdf.Dictionary(
+            Type=pikepdf.Name.Filespec, F=name, UF=name, EF=pikepdf.Dictionary(F=stream)
+        ))
+        entries.append((name, filespec))
+
+    ef_tree = pikepdf.Dictionary()
+    if tree == 'flat':
+        flat = pikepdf.Array()
+        for name, filespec in entries:
+            flat.append(pikepdf.String(name))
+            flat.append(filespec)
+        ef_tree.Names = flat
+    else:
+        name_tree.build(pdf, ef_tree, entries)
+    pdf.Root.Names = pikepdf.Dictionary(EmbeddedFiles=ef_tree)
+
+    output = io.BytesIO()
+    pdf.save(output, compress_streams=False)
+    return output.getvalue()
+
+
+def prepare_inputs(case: Dict[str, Any], input_dir: str) -> Dict[str, Any]:
+    """
+    Writes the input files for a case, reusing ones already generated
+
+    Returns:
+        Dict: Paths of the inputs ('host' and 'attachments' for embed,
+        'container' otherwise)
+    """
+    size, count = case['size'], case['count']
+
+    def cached(name: str, build) -> str:
+        path = os.path.join(input_dir, name)
+        if not os.path.exists(path):
+            with open(path + '.tmp', 'wb') as f:
+                f.write(build())
+            os.replace(path + '.tmp', path)
+        return path
+
+    if case['operation'] == 'embed':
+        host = cached(f"host_{size}.pdf", lambda: make_pdf(size, seed=0))
+        attachments = [
+            cached(f"attachment_{size}_{i}.pdf", lambda i=i: make_pdf(size, seed=i + 1))
+            for i in range(count)
+        ]
+        return {'host': host, 'attachments': attachments}
+    container = cached(
+        f"container_{size}_{count}_{case['tree']}.pdf",
+        lambda: make_container(size, count, case['tree'], seed=1)
+    )
+    return {'container': container}
+
+
+def build_matrix(args) -> List[Dict[str, Any]]:
+    """Expands the command line options into the list of cases to run"""
+    preset = PRESETS[args.preset]
+    sizes = [parse_size(s) for s in (args.sizes or preset['sizes']).split(',')]
+    counts = [int(c) for c in (args.counts or preset['counts']).split(',')]
+    max_total = parse_size(args.max_total or preset['max_total'])
+
+    cases = []
+    for operation in args.operations.split(','):
+        # The host of an embed has no attachments yet, so tree shape is moot
+        trees = ['nested'] if operation == 'embed' else args.trees.split(',')
+        for target in args.targets.split(','):
+            for size in sizes:
+                for count in counts:
+                    if size * count > max_total:
+                        continue
+                    for tree in trees:
+                        cases.append({
+                            'operation': operation,
+                            'target': target,
+                            'size': size,
+                            'count': count,
+                            'tree': tree,
+                            'repeat': args.repeat,
+                        })
+    return cases
+
+
+def case_id(case: Dict[str, Any]) -> str:
+    return (f"{case['operation']}/{case['target']}/{format_size(case['size'])}"
+            f"/x{case['count']}/{case['tree']}")
+
+
+# --- Measurement (runs in the case subprocess) ---------------------------
+
+def _current_rss() -> Optional[int]:
+    """Returns the current resident set size in bytes, where the OS reports it"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _peak_rss() -> int:
+    """Returns the peak resident set size of this process in bytes"""
+    # ru_maxrss survives fork and exec on Linux, so it would report the
+    # driver's peak; VmHWM belongs to this process image alone
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def _dir_size(path: str) -> int:
+    total = 0
+    stack = [path]
+    while stack:
+        try:
+            with os.scandir(stack.pop()) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                        else:
+                            total += entry.stat(follow_symlinks=False).st_size
+                    except OSError:
+                        continue
+        except OSError:
+            continue
+    return total
+
+
+class DiskSampler:
+    """Tracks the peak size of a directory tree from a background thread"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, _dir_size(self.path))
+            self._stop.wait(_DISK_SAMPLE_INTERVAL)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, _dir_size(self.path))
+
+
+def _service_runner(case: Dict[str, Any], inputs: Dict[str, Any], work_dir: str):
+    """Returns a callable running one iteration of the case against the service layer"""
+    from app.services import pdf_service
+
+    if case['operation'] == 'embed':
+        output_path = os.path.join(work_dir, 'output.pdf')
+
+        def run():
+            size = pdf_service.embed_pdfs_to_path(inputs['host'], inputs['attachments'], output_path)
+            os.unlink(output_path)
+            return size
+        return run
+
+    with open(inputs['container'], 'rb') as f:
+        container = f.read()
+    last_name = f"attachment_{case['count'] - 1:05d}.pdf"
+    if case['operation'] == 'extract':
+        return lambda: sum(len(data) for _, data in pdf_service.iter_embedded_files(container))
+    if case['operation'] == 'list':
+        return lambda: len(json.dumps(pdf_service.list_attachments(container)))
+    return lambda: len(pdf_service.get_attachment(container, last_name)[1])
+
+
+def _endpoint_runner(case: Dict[str, Any], inputs: Dict[str, Any], work_dir: str):
+    """Returns a callable running one iteration of the case through the Flask app"""
+    from app import create_app
+    from app.services.cache_service import NullCache
+
+    app = create_app('testing')
+    # Every iteration should do the full work rather than hit a cache, as the
+    # service target does
+    app.extensions['result_cache'] = NullCache()
+    app.extensions['index_cache'] = NullCache()
+    client = app.test_client()
+
+    def check(response):
+        try:
+            if response.status_code != 200:
+                raise RuntimeError(f"HTTP {response.status_code}: {response.get_data(as_text=True)[:200]}")
+            return sum(len(chunk) for chunk in response.response)
+        finally:
+            # Closing releases the request's admission, as a server would
+            response.close()
+
+    if case['operation'] == 'embed':
+        def run():
+            files = [open(path, 'rb') for path in [inputs['host']] + inputs['attachments']]
+            try:
+                return check(client.post('/api/pdf/create_embedded_pdf', buffered=False, data={
+                    'host_pdf': (files[0], 'host.pdf'),
+                    'attachments[]': [(f, os.path.basename(f.name)) for f in files[1:]],
+                }))
+            finally:
+                for f in files:
+                    f.close()
+        return run
+
+    url = {
+        'extract': '/api/pdf/extract_embedded_pdf?format=zip',
+        'list': '/api/pdf/attachments',
+        'fetch': f"/api/pdf/attachments/attachment_{case['count'] - 1:05d}.pdf",
+    }[case['operation']]
+
+    def run():
+        with open(inputs['container'], 'rb') as f:
+            return check(client.post(url, buffered=False, data={'pdf': (f, 'container.pdf')}))
+    return run
+
+
+def run_case(case: Dict[str, Any], inputs: Dict[str, Any], work_dir: str) -> Dict[str, Any]:
+    """Runs a case's iterations in this process and measures them"""
+    runner = _service_runner if case['target'] == 'service' else _endpoint_runner
+    run = runner(case, inputs, work_dir)
+
+    rss_before = _current_rss()
+    wall = []
+    output_bytes = 0
+    with DiskSampler(work_dir) as disk:
+        for _ in range(case['repeat']):
+            start = time.perf_counter()
+            output_bytes = run()
+            wall.append(time.perf_counter() - start)
+
+    input_paths = inputs.get('attachments', []) + [inputs.get('host') or inputs.get('container')]
+    return {
+        'wall_seconds': wall,
+        'wall_min': min(wall),
+        'wall_mean': sum(wall) / len(wall),
+        'rss_before_bytes': rss_before,
+        'peak_rss_bytes': _peak_rss(),
+        'temp_disk_peak_bytes': disk.peak,
+        'input_bytes': sum(os.path.getsize(path) for path in input_paths),
+        'output_bytes': output_bytes,
+    }
+
+
+# --- Driver ---------------------------------------------------------------
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], cwd=REPO_ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _spawn_case(case: Dict[str, Any], inputs: Dict[str, Any], timeout: int) -> Dict[str, Any]:
+    """Runs one case in a fresh interpreter with its own temp directory"""
+    work_dir = tempfile.mkdtemp(prefix='pdf_bench_case_')
+    env = dict(os.environ, TMPDIR=work_dir, PDF_UPLOAD_SPOOL_DIR=work_dir)
+    try:
+        proc = subprocess.run(
+            [sys.executable, '-m', 'benchmarks.bench_suite', '_case', json.dumps([case, inputs, work_dir])],
+            cwd=REPO_ROOT, env=env, capture_output=True, text=True, timeout=timeout
+        )
+        if proc.returncode != 0:
+            return {'status': 'failed', 'error': proc.stderr.strip().splitlines()[-1:] or ['exit code']}
+        return dict(json.loads(proc.stdout.strip().splitlines()[-1]), status='ok')
+    except subprocess.TimeoutExpired:
+        return {'status': 'failed', 'error': f"timed out after {timeout}s"}
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def run_suite(args) -> None:
+    cases = build_matrix(args)
+    input_dir = args.input_dir or tempfile.mkdtemp(prefix='pdf_bench_inputs_')
+    os.makedirs(input_dir, exist_ok=True)
+    print(f"Running {len(cases)} cases (inputs in {input_dir})", file=sys.stderr)
+
+    results = []
+    try:
+        for i, case in enumerate(cases, 1):
+            inputs = prepare_inputs(case, input_dir)
+            result = dict(case, id=case_id(case), **_spawn_case(case, inputs, args.timeout))
+            results.append(result)
+            if result['status'] == 'ok':
+                print(f"[{i}/{len(cases)}] {result['id']}: {result['wall_min'] * 1000:.1f} ms, "
+                      f"peak RSS {result['peak_rss_bytes'] / 1024 ** 2:.1f} MB, "
+                      f"temp disk {result['temp_disk_peak_bytes'] / 1024 ** 2:.1f} MB", file=sys.stderr)
+            else:
+                print(f"[{i}/{len(cases)}] {result['id']}: FAILED {result['error']}", file=sys.stderr)
+    finally:
+        if not args.input_dir:
+            shutil.rmtree(input_dir, ignore_errors=True)
+
+    document = {
+        'meta': {
+            'commit': _git_commit(),
+            'created_at': time.time(),
+            'python': platform.python_version(),
+            'pikepdf': pikepdf.__version__,
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+        },
+        'results': results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(document, f, indent=2)
+    print(f"Wrote {args.output}", file=sys.stderr)
+
+
+def compare(args) -> int:
+    """
+    Prints per-case ratios of NEW to OLD and flags regressions
+
+    Returns:
+        int: 1 if any metric regressed by more than the threshold, else 0
+    """
+    with open(args.old) as f:
+        old = {r['id']: r for r in json.load(f)['results'] if r.get('status') == 'ok'}
+    with open(args.new) as f:
+        new = {r['id']: r for r in json.load(f)['results'] if r.get('status') == 'ok'}
+
+    metrics = (('wall_min', 'time'), ('peak_rss_bytes', 'rss'), ('temp_disk_peak_bytes', 'disk'))
+    regressed = False
+    print(f"{'case':<40} {'time':>8} {'rss':>8} {'disk':>8}")
+    for key in sorted(set(old) & set(new)):
+        cells = []
+        for metric, _ in metrics:
+            before, after = old[key][metric], new[key][metric]
+            if not before:
+                cells.append('     n/a' if not after else '     new')
+                continue
+            ratio = after / before
+            # Sub-millisecond cases jitter by large ratios; ignore small absolute changes
+            worse = ratio > args.threshold and (metric != 'wall_min' or after - before > args.min_delta)
+            flag = '!' if worse else ' '
+            regressed = regressed or worse
+            cells.append(f"{ratio:7.2f}{flag}")
+        print(f"{key:<40} {' '.join(cells)}")
+    for key in sorted(set(old) ^ set(new)):
+        print(f"{key:<40} only in {'old' if key in old else 'new'}")
+    return 1 if regressed and args.fail_on_regression else 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark embed/extract throughput and memory")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help="Run the benchmark matrix")
+    run_parser.add_argument('--preset', choices=sorted(PRESETS), default='quick', help="Default sizes and counts")
+    run_parser.add_argument('--sizes', help="Comma-separated attachment sizes, e.g. 10KB,1MB,500MB")
+    run_parser.add_argument('--counts', help="Comma-separated attachment counts, e.g. 1,100,10000")
+    run_parser.add_argument('--trees', default=','.join(TREES), help="Name-tree shapes: flat,nested")
+    run_parser.add_argument('--operations', default=','.join(OPERATIONS), help="embed,extract,list,fetch")
+    run_parser.add_argument('--targets', default=','.join(TARGETS), help="service,endpoint")
+    run_parser.add_argument('--max-total', help="Skip cases whose attachments total more than this")
+    run_parser.add_argument('--repeat', type=int, default=3, help="Iterations per case")
+    run_parser.add_argument('--timeout', type=int, default=1800, help="Seconds allowed per case")
+    run_parser.add_argument('--input-dir', help="Keep generated inputs here and reuse them across runs")
+    run_parser.add_argument('--output', default='benchmark_results.json', help="Where to write the results")
+
+    compare_parser = commands.add_parser('compare', help="Compare two result files")
+    compare_parser.add_argument('old')
+    compare_parser.add_argument('new')
+    compare_parser.add_argument('--threshold', type=float, default=1.10, help="Ratio flagged as a regression")
+    compare_parser.add_argument('--min-delta', type=float, default=0.005,
+                                help="Seconds a time must grow by to count as a regression")
+    compare_parser.add_argument('--fail-on-regression', action='store_true', help="Exit 1 on any regression")
+
+    case_parser = commands.add_parser('_case', help=argparse.SUPPRESS)
+    case_parser.add_argument('spec')
+
+    args = parser.parse_args(argv)
+    if args.command == 'run':
+        run_suite(args)
+        return 0
+    if args.command == 'compare':
+        return compare(args)
+
+    case, inputs, work_dir = json.loads(args.spec)
+    print(json.dumps(run_case(case, inputs, work_dir)))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,3 @@
+"""
+Client tools.
+"""
\ No newline at end of file
@@ -1,8 +1,12 @@
 import json
 import base64
-import pikepdf
 import os
-from io import BytesIO
+
+if __package__:
+    from .pdf_extract import extract_to_directory
+else:
+    # Run as a script, with the client directory on sys.path
+    from pdf_extract import extract_to_directory
 
 def extract_attachments_from_json(json_file_path, output_dir=None):
     """
@@ -52,6 +56,9 @@ def extract_attachments_from_pdf(pdf_path, output_dir=None):
     """
     Extract embedded files directly from a PDF using pikepdf.
     
+    The PDF is memory-mapped and each attachment is written in chunks, so
+    neither needs to fit in memory.
+    
     Args:
         pdf_path (str): Path to the PDF file
         output_dir (str, optional): Directory to save extracted files. Defaults to current directory.
@@ -59,38 +66,18 @@ def extract_attachments_from_pdf(pdf_path, output_dir=None):
     Returns:
         list: Paths to the extracted files
     """
-    if output_dir and not os.path.exists(output_dir):
-        os.makedirs(output_dir)
-    
     extracted_files = []
     
     try:
-        # Open the PDF
-        with pikepdf.Pdf.open(pdf_path) as pdf:
-            # Check if the PDF has embedded files
-            if '/Names' in pdf.Root and '/EmbeddedFiles' in pdf.Root.Names:
-                name_dict = pdf.Root.Names.EmbeddedFiles.Names
-                
-                # Process name dictionary for embedded files (pairs of name and reference)
-                for i in range(0, len(name_dict), 2):
-                    filename = str(name_dict[i])
-                    filespec = name_dict[i+1]
-                    
-                    # Get the embedded file stream
-                    embedded_file = filespec.EF.F
-                    
-                    # Save the extracted file
-                    output_path = os.path.join(output_dir, filename) if output_dir else filename
-                    
-                    with open(output_path, 'wb') as f:
-                        f.write(embedded_file.read_bytes())
-                    
-                    print(f"Extracted: {output_path}")
-                    extracted_files.append(output_path)
-                
-                print(f"Found and extracted {len(extracted_files)} embedded files")
-            else:
-                print("No embedded files found in the PDF")
+        attachments = extract_to_directory(pdf_path, output_dir or os.curdir)
+        for attachment in attachments:
+            print(f"Extracted: {attachment['path']}")
+            extracted_files.append(attachment['path'])
+        
+        if extracted_files:
+            print(f"Found and extracted {len(extracted_files)} embedded files")
+        else:
+            print("No embedded files found in the PDF")
     
     except Exception as e:
         print(f"Error extracting files: {str(e)}")
@@ -1,11 +1,26 @@
+import argparse
+import glob
+import itertools
+import json
 import os
+import shutil
 import sys
-import pikepdf
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+if __package__:
+    from .pdf_extract import extract_to_directory
+else:
+    # Run as a script, with the client directory on sys.path
+    from pdf_extract import extract_to_directory
 
 def extract_attachments_from_pdf(input_pdf_path, output_directory):
     """
     Extract all PDF attachments from a PDF file using pikepdf.
     
+    The PDF is memory-mapped and each attachment is written in chunks, so
+    neither needs to fit in memory.
+    
     Args:
         input_pdf_path (str): Path to the PDF file containing attachments
         output_directory (str): Directory where the extracted files will be saved
@@ -19,39 +34,14 @@ def extract_attachments_from_pdf(input_pdf_path, output_directory):
             os.makedirs(output_directory)
             print(f"Created output directory: {output_directory}")
         
-        # Read the PDF file
         print(f"Reading PDF: {input_pdf_path}")
-        pdf = pikepdf.open(input_pdf_path)
+        attachments = extract_to_directory(input_pdf_path, output_directory)
         
         extracted_files = []
-        
-        # Check if PDF has attachments in the Names tree
-        if '/Names' in pdf.Root and '/EmbeddedFiles' in pdf.Root.Names:
-            names_array = pdf.Root.Names.EmbeddedFiles.Names
-            
-            # Process the names array (alternating name, filespec)
-            for i in range(0, len(names_array), 2):
-                if i+1 >= len(names_array):
-                    break
-                    
-                filename = str(names_array[i])
-                filespec = names_array[i+1]
-                
-                # Extract the embedded file stream if it exists
-                if filespec.get('/EF') and filespec.EF.get('/F'):
-                    print(f"Extracting: {filename}")
-                    
-                    output_path = os.path.join(output_directory, filename)
-                    
-                    # Get the file data
-                    file_data = bytes(filespec.EF.F.read_bytes())
-                    
-                    # Write the attachment to a file
-                    with open(output_path, 'wb') as output_file:
-                        output_file.write(file_data)
-                    
-                    extracted_files.append(output_path)
-                    print(f"Saved to: {output_path}")
+        for attachment in attachments:
+            print(f"Extracted: {attachment['name']}")
+            print(f"Saved to: {attachment['path']}")
+            extracted_files.append(attachment['path'])
         
         if not extracted_files:
             print("No attachments found in the PDF.")
@@ -64,14 +54,213 @@ def extract_attachments_from_pdf(input_pdf_path, output_directory):
         print(f"Error extracting attachments: {e}")
         return []
 
+def _inside(path, directory):
+    """Whether path is directory itself or somewhere below it"""
+    path, directory = os.path.abspath(path), os.path.abspath(directory)
+    return path == directory or path.startswith(directory.rstrip(os.sep) + os.sep)
+
+
+def find_pdfs(source, output_root=None):
+    """
+    Find the PDF files to process in bulk mode.
+    
+    Args:
+        source (str): A directory (searched recursively for *.pdf) or a glob
+            pattern ('**' matches any number of directories)
+        output_root (str): Output tree to leave out when it lies inside the
+            input, so extracted attachments are not picked up again
+    
+    Returns:
+        tuple: The root the output tree mirrors, and the sorted list of PDF paths
+    """
+    if os.path.isdir(source):
+        paths = []
+        for directory, dirnames, filenames in os.walk(source):
+            if output_root is not None:
+                dirnames[:] = [name for name in dirnames
+                               if not _inside(os.path.join(directory, name), output_root)]
+            paths.extend(os.path.join(directory, name) for name in filenames if name.lower().endswith('.pdf'))
+        return source, sorted(paths)
+    
+    # The part of the pattern before the first wildcard is the root
+    parts = source.split(os.sep)
+    fixed = list(itertools.takewhile(lambda part: not glob.has_magic(part), parts))
+    root = os.sep.join(fixed[:-1] if len(fixed) == len(parts) else fixed) or os.curdir
+    paths = [path for path in glob.glob(source, recursive=True)
+             if os.path.isfile(path) and (output_root is None or not _inside(path, output_root))]
+    return root, sorted(paths)
+
+
+def load_manifest(manifest_path):
+    """
+    Read the sources already extracted from a JSON Lines manifest.
+    
+    A source counts as done only if its size and modification time still
+    match, so files that changed since are extracted again. A truncated
+    last line (from an interrupted run) is ignored.
+    
+    Returns:
+        dict: Source path to its manifest record, for successful records
+    """
+    done = {}
+    if not os.path.exists(manifest_path):
+        return done
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if record.get('status') == 'done':
+                done[record['source']] = record
+            else:
+                done.pop(record.get('source'), None)
+    return done
+
+
+def _is_unchanged(path, record):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return False
+    return record.get('size') == stat.st_size and record.get('mtime') == stat.st_mtime
+
+
+def _output_directory(source, root, output_root):
+    relative = os.path.relpath(source, root)
+    if relative.startswith(os.pardir):
+        relative = os.path.basename(source)
+    return os.path.join(output_root, os.path.splitext(relative)[0])
+
+
+def extract_one(source, output_directory):
+    """
+    Extract one PDF for bulk mode, in a worker process.
+    
+    Attachments are written to a '.partial' directory that is renamed into
+    place when complete, so an interrupted run never leaves a directory
+    that looks finished.
+    
+    Returns:
+        dict: The manifest record for this source
+    """
+    started = time.perf_counter()
+    stat = os.stat(source)
+    record = {
+        'source': source,
+        'output': output_directory,
+        'size': stat.st_size,
+        'mtime': stat.st_mtime,
+    }
+    partial = output_directory + '.partial'
+    try:
+        shutil.rmtree(partial, ignore_errors=True)
+        attachments = extract_to_directory(source, partial)
+        shutil.rmtree(output_directory, ignore_errors=True)
+        os.replace(partial, output_directory)
+        record.update(status='done', attachments=len(attachments),
+                      bytes_out=sum(attachment['bytes_written'] for attachment in attachments))
+    except Exception as e:
+        shutil.rmtree(partial, ignore_errors=True)
+        record.update(status='failed', error=str(e))
+    record['seconds'] = round(time.perf_counter() - started, 3)
+    return record
+
+
+def _report(label, files, bytes_in, elapsed):
+    elapsed = max(elapsed, 1e-9)
+    print(f"{label}: {files} files, {bytes_in / 1024 / 1024:.1f} MB in {elapsed:.1f}s "
+          f"({bytes_in / 1024 / 1024 / elapsed:.1f} MB/s, {files / elapsed:.1f} files/s)")
+
+
+def bulk_extract(source, output_root, workers=None, manifest_path=None, progress_interval=10.0):
+    """
+    Extract the attachments of every PDF under a directory or glob.
+    
+    PDFs are processed on a process pool, each into its own directory of
+    the output tree, which mirrors the input tree. Every finished PDF is
+    appended to a JSON Lines manifest; running again with the same
+    manifest skips the PDFs already done, so an interrupted run resumes
+    where it stopped. Progress and the final summary report throughput
+    in MB/s (of input PDFs) and files/s.
+    
+    Args:
+        source (str): Directory or glob pattern of input PDFs
+        output_root (str): Root of the output tree
+        workers (int, optional): Worker processes. Defaults to the CPU count.
+        manifest_path (str, optional): Manifest file. Defaults to
+            manifest.jsonl in output_root.
+        progress_interval (float): Seconds between progress lines
+    
+    Returns:
+        dict: Counts of PDFs done, failed and skipped, and the bytes and
+            attachments extracted
+    """
+    root, sources = find_pdfs(source, output_root)
+    os.makedirs(output_root, exist_ok=True)
+    manifest_path = manifest_path or os.path.join(output_root, 'manifest.jsonl')
+    done = load_manifest(manifest_path)
+    pending = [path for path in sources if not (path in done and _is_unchanged(path, done[path]))]
+    totals = {'done': 0, 'failed': 0, 'skipped': len(sources) - len(pending),
+              'attachments': 0, 'bytes_in': 0, 'bytes_out': 0}
+    print(f"Found {len(sources)} PDFs, {totals['skipped']} already extracted, {len(pending)} to go")
+    
+    workers = workers or os.cpu_count() or 1
+    started = last_report = time.perf_counter()
+    with open(manifest_path, 'a', encoding='utf-8') as manifest, ProcessPoolExecutor(max_workers=workers) as pool:
+        queue = iter(pending)
+        running = set()
+        while True:
+            # Keep a bounded number of PDFs in flight rather than submitting them all
+            for path in itertools.islice(queue, 4 * workers - len(running)):
+                running.add(pool.submit(extract_one, path, _output_directory(path, root, output_root)))
+            if not running:
+                break
+            finished, running = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                record = future.result()
+                manifest.write(json.dumps(record) + '\n')
+                if record['status'] == 'done':
+                    totals['done'] += 1
+                    totals['attachments'] += record['attachments']
+                    totals['bytes_in'] += record['size']
+                    totals['bytes_out'] += record['bytes_out']
+                else:
+                    totals['failed'] += 1
+                    print(f"Failed: {record['source']}: {record['error']}")
+            manifest.flush()
+            now = time.perf_counter()
+            if now - last_report >= progress_interval:
+                last_report = now
+                _report(f"Progress {totals['done'] + totals['failed']}/{len(pending)}",
+                        totals['done'] + totals['failed'], totals['bytes_in'], now - started)
+    
+    _report("Done", totals['done'], totals['bytes_in'], time.perf_counter() - started)
+    print(f"Wrote {totals['attachments']} attachments ({totals['bytes_out'] / 1024 / 1024:.1f} MB), "
+          f"{totals['failed']} PDFs failed, {totals['skipped']} skipped; manifest: {manifest_path}")
+    return totals
+
+
 def main():
     """Command line interface for the PDF attachment extraction tool."""
-    if len(sys.argv) != 3:
-        print("Usage: python pikepdf_extract.py input.pdf output_directory")
-        sys.exit(1)
+    parser = argparse.ArgumentParser(
+        description="Extract the attachments of a PDF, or in bulk from every PDF under a directory or glob"
+    )
+    parser.add_argument("input", help="Input PDF, or a directory / glob pattern ('archive/**/*.pdf') for bulk mode")
+    parser.add_argument("output_directory", help="Directory (or, in bulk mode, root of the tree) to write to")
+    parser.add_argument("--workers", type=int, help="Bulk mode: worker processes (defaults to the CPU count)")
+    parser.add_argument("--manifest", help="Bulk mode: JSON Lines manifest (defaults to OUTPUT/manifest.jsonl)")
+    parser.add_argument("--progress-interval", type=float, default=10.0,
+                        help="Bulk mode: seconds between progress reports")
+    args = parser.parse_args()
+    
+    input_pdf_path = args.input
+    output_directory = args.output_directory
     
-    input_pdf_path = sys.argv[1]
-    output_directory = sys.argv[2]
+    # A directory or a pattern means bulk mode
+    if os.path.isdir(input_pdf_path) or glob.has_magic(input_pdf_path):
+        totals = bulk_extract(input_pdf_path, output_directory, args.workers, args.manifest, args.progress_interval)
+        sys.exit(1 if totals['failed'] else 0)
     
     # Check if input file exists
     if not os.path.exists(input_pdf_path):
@@ -93,4 +282,4 @@ def main():
     print("  pip install pikepdf")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
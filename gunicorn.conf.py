@@ -0,0 +1,9 @@
+"""
+gunicorn settings, picked up automatically when gunicorn starts from this directory
+"""
+import os
+
+# PDF_PRELOAD=1 creates and warms up the app once in the master process,
+# so workers fork with pikepdf and the Swagger spec already loaded and
+# share those pages copy-on-write (see _preload in app/__init__.py)
+preload_app = os.environ.get('PDF_PRELOAD', '').lower() in ('1', 'true', 'yes')
@@ -9,11 +9,30 @@ from app import create_app
 def app():
     """Create the Flask app for testing"""
     app = create_app('testing')
-    return app
+    yield app
+    # Stop the process pool, if a test started it
+    app.extensions['job_manager'].shutdown()
 
 
 @pytest.fixture
 def client(app):
     """Create a test client"""
     with app.test_client() as client:
-        yield client
\ No newline at end of file
+        yield client
+
+@pytest.fixture
+def make_pdf():
+    """Returns a function building a one-page PDF, with attachments given as {name: bytes}"""
+    import io
+    import pikepdf
+
+    def make(attachments=None):
+        pdf = pikepdf.new()
+        pdf.add_blank_page()
+        for name, data in (attachments or {}).items():
+            pdf.attachments[name] = pikepdf.AttachedFileSpec(pdf, data, filename=name)
+        output = io.BytesIO()
+        pdf.save(output)
+        return output.getvalue()
+
+    return make
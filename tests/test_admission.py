@@ -0,0 +1,108 @@
+"""
+Tests for admission control and request size limits
+"""
+import io
+import threading
+
+import pytest
+
+from app.services.admission_service import AdmissionController, AdmissionRejected, estimate_working_set
+
+
+def _controller(**limits):
+    options = dict(max_bytes=100, max_concurrent=2, queue_size=1, queue_timeout=0.05, retry_after=7)
+    options.update(limits)
+    return AdmissionController(**options)
+
+
+def test_budget_is_charged_and_released():
+    admission = _controller()
+    # More than the whole budget is charged the whole budget, and runs alone
+    large = admission.acquire(1000)
+    assert large.cost == 100
+    large.release()
+
+    first = admission.acquire(60)
+    second = admission.acquire(40)
+    first.release()
+    # Releasing twice gives back the budget once
+    first.release()
+
+    assert admission.stats() == {'running': 1, 'waiting': 0, 'bytes_in_use': 40, 'max_bytes': 100}
+    second.release()
+
+
+def test_full_queue_is_rejected_with_429():
+    admission = _controller(max_concurrent=1, queue_size=0)
+    ticket = admission.acquire(10)
+
+    with pytest.raises(AdmissionRejected) as rejected:
+        admission.acquire(10)
+    assert (rejected.value.status, rejected.value.retry_after) == (429, 7)
+    ticket.release()
+    admission.acquire(10).release()
+
+
+def test_wait_times_out_with_503():
+    admission = _controller()
+    ticket = admission.acquire(80)
+
+    with pytest.raises(AdmissionRejected) as rejected:
+        admission.acquire(30)
+    assert rejected.value.status == 503
+    assert admission.stats() == {'running': 1, 'waiting': 0, 'bytes_in_use': 80, 'max_bytes': 100}
+    ticket.release()
+
+
+def test_waiter_is_admitted_when_capacity_frees():
+    admission = _controller(queue_timeout=5)
+    ticket = admission.acquire(80)
+    admitted = []
+    waiter = threading.Thread(target=lambda: admitted.append(admission.acquire(30)))
+    waiter.start()
+
+    ticket.release()
+    waiter.join(5)
+
+    assert len(admitted) == 1
+    assert admission.stats()['bytes_in_use'] == 30
+
+
+def test_estimate_working_set():
+    assert estimate_working_set(1000, 2.5, 100) == 2600
+    assert estimate_working_set(0, 2.5, 100) == 100
+
+
+def test_busy_server_rejects_pdf_requests(app, client, make_pdf):
+    app.extensions['admission'] = admission = _controller(max_concurrent=1, queue_size=0)
+    ticket = admission.acquire(1)
+
+    response = client.post('/api/pdf/extract_embedded_pdf', data={'pdf': (io.BytesIO(make_pdf()), 'a.pdf')})
+
+    assert response.status_code == 429
+    assert response.headers['Retry-After'] == '7'
+    ticket.release()
+
+
+def test_admission_is_released_after_the_request(app, client, make_pdf):
+    app.extensions['admission'] = admission = _controller(max_bytes=1 << 30)
+    data = make_pdf({'a.txt': b'a'})
+
+    response = client.post('/api/pdf/extract_embedded_pdf', data={'pdf': (io.BytesIO(data), 'a.pdf')})
+    assert response.status_code == 200
+
+    # A streamed response holds its admission until it is closed
+    response = client.post('/api/pdf/extract_embedded_pdf?format=zip',
+                           data={'pdf': (io.BytesIO(data), 'a.pdf')}, buffered=False)
+    assert admission.stats()['running'] == 1
+    response.close()
+    assert admission.stats()['running'] == 0
+
+
+def test_oversized_body_is_rejected_with_413(app, client):
+    app.config['MAX_CONTENT_LENGTH'] = 100
+
+    response = client.post('/api/pdf/extract_embedded_pdf', data={'pdf': (io.BytesIO(b'x' * 1000), 'a.pdf')})
+
+    assert response.status_code == 413
+    assert 'error' in response.json
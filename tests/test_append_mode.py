@@ -0,0 +1,106 @@
+"""
+Tests for embedding in append mode (incremental updates)
+"""
+import io
+import re
+
+import pikepdf
+import pytest
+
+from app.services import name_tree
+from app.services.pdf_service import embed_pdfs, iter_embedded_files, EMBED_MODE_APPEND
+
+
+def _pdf_bytes(pdf=None, **save_options):
+    pdf = pdf or pikepdf.new()
+    if len(pdf.pages) == 0:
+        pdf.add_blank_page()
+    output = io.BytesIO()
+    pdf.save(output, **save_options)
+    return output.getvalue()
+
+
+def _check(data):
+    with pikepdf.open(io.BytesIO(data)) as pdf:
+        assert pdf.check_pdf_syntax() == []
+
+
+def _append(host, name):
+    return embed_pdfs(host, [_pdf_bytes()], mode=EMBED_MODE_APPEND, filenames=[name])
+
+
+def _names(data):
+    return [name for name, _ in iter_embedded_files(data)]
+
+
+def test_append_keeps_host_bytes_and_validates():
+    host = _pdf_bytes()
+    first = _append(host, 'a.pdf')
+    second = _append(first, 'b.pdf')
+
+    assert first.startswith(host) and second.startswith(first)
+    _check(second)
+    assert _names(second) == ['a.pdf', 'b.pdf']
+
+
+def test_append_to_xref_stream_host():
+    host = _pdf_bytes(object_stream_mode=pikepdf.ObjectStreamMode.generate)
+
+    output = _append(host, 'a.pdf')
+
+    assert output.startswith(host)
+    _check(output)
+    assert _names(output) == ['a.pdf']
+
+
+def test_append_to_large_tree_writes_only_touched_nodes():
+    pdf = pikepdf.new()
+    entries = []
+    for i in range(3000):
+        stream = pdf.make_stream(b'%d' % i, Type=pikepdf.Name.EmbeddedFile)
+        entries.append((f'f{i:05d}.pdf', pdf.make_indirect(pikepdf.Dictionary(
+            Type=pikepdf.Name.Filespec, F=f'f{i:05d}.pdf', EF=pikepdf.Dictionary(F=stream)
+        ))))
+    ef_tree = pdf.make_indirect(pikepdf.Dictionary())
+    name_tree.build(pdf, ef_tree, entries)
+    pdf.Root.Names = pikepdf.Dictionary(EmbeddedFiles=ef_tree)
+    host = _pdf_bytes(pdf)
+
+    output = _append(host, 'f01500a.pdf')
+
+    assert len(output) - len(host) < 16 * 1024
+    _check(output)
+    with pikepdf.open(io.BytesIO(output)) as result:
+        root = result.Root.Names.EmbeddedFiles
+        assert name_tree.count_entries(root) == 3001
+        assert name_tree.lookup(root, 'f01500a.pdf') is not None
+        assert name_tree.lookup(root, 'f00000.pdf') is not None
+
+
+def test_append_to_host_with_oversized_size():
+    host = _pdf_bytes()
+    # Only the trailer moves, so every xref offset stays valid
+    host = re.sub(rb'(trailer\s*<<.*?/Size )\d+', rb'\g<1>100', host, flags=re.DOTALL)
+
+    output = _append(host, 'a.pdf')
+
+    with pikepdf.open(io.BytesIO(output)) as result:
+        filespec = name_tree.lookup(result.Root.Names.EmbeddedFiles, 'a.pdf')
+        assert filespec.EF.F.read_bytes().startswith(b'%PDF')
+
+
+def test_append_refuses_startxref_off_the_xref():
+    host = _pdf_bytes()
+    host = re.sub(rb'startxref\s+\d+', b'startxref\n9', host)
+
+    with pytest.raises(Exception, match='cross-reference section'):
+        _append(host, 'a.pdf')
+
+
+def test_append_refuses_reconstructed_host():
+    host = _pdf_bytes()
+    # startxref still finds the table, but qpdf cannot parse it
+    host = host.replace(b'0000000000 65535 f', b'garbage garbage f')
+
+    with pytest.raises(Exception, match='damaged'):
+        _append(host, 'a.pdf')
@@ -0,0 +1,133 @@
+"""
+Tests for batch embedding and batch extraction
+"""
+import base64
+import io
+import json
+import os
+import threading
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+import pikepdf
+import pytest
+
+from app.services.batch_service import batch_source_ids, embed_batch, extract_batch, MANIFEST_NAME
+
+
+class _CountingExecutor(ThreadPoolExecutor):
+    """Thread pool recording the most tasks submitted and not yet finished"""
+
+    def __init__(self):
+        super().__init__(max_workers=2)
+        self.pending = 0
+        self.most_pending = 0
+        self._count_lock = threading.Lock()
+
+    def submit(self, fn, *args, **kwargs):
+        with self._count_lock:
+            self.pending += 1
+            self.most_pending = max(self.most_pending, self.pending)
+        future = super().submit(fn, *args, **kwargs)
+        future.add_done_callback(self._done)
+        return future
+
+    def _done(self, future):
+        with self._count_lock:
+            self.pending -= 1
+
+
+def test_embed_batch_bounds_pending_hosts(tmp_path, make_pdf):
+    hosts = []
+    for i in range(12):
+        path = tmp_path / f'host_{i}.pdf'
+        path.write_bytes(make_pdf())
+        hosts.append((f'host_{i}_embedded.pdf', str(path)))
+    attachment = tmp_path / 'attachment.pdf'
+    attachment.write_bytes(make_pdf())
+
+    with _CountingExecutor() as executor:
+        results = dict(embed_batch(executor, hosts, [str(attachment)], ['a.pdf'], str(tmp_path), max_pending=3))
+
+    assert executor.most_pending <= 3
+    assert len(results) == 13
+    assert all(item['status'] == 'done' for item in json.loads(results[MANIFEST_NAME]))
+    assert not tmp_path.exists()
+
+
+def test_batch_embed_endpoint(client, app, tmp_path, make_pdf):
+    app.config['UPLOAD_SPOOL_DIR'] = str(tmp_path)
+    response = client.post('/api/pdf/batch_embed', data={
+        'host_pdfs[]': [(io.BytesIO(make_pdf()), 'one.pdf'), (io.BytesIO(b'not a pdf'), 'broken.pdf')],
+        'attachments[]': [(io.BytesIO(make_pdf()), 'a.pdf')],
+    }, buffered=False)
+
+    assert response.status_code == 200
+    assert [name[:10] for name in os.listdir(tmp_path)] == ['pdf_batch_']
+    archive = zipfile.ZipFile(io.BytesIO(response.get_data()))
+    response.close()
+    manifest = {item['name']: item for item in json.loads(archive.read(MANIFEST_NAME))}
+    assert manifest['one_embedded.pdf']['status'] == 'done'
+    with pikepdf.open(io.BytesIO(archive.read('one_embedded.pdf'))) as pdf:
+        assert list(pdf.attachments) == ['a.pdf']
+    # The failure is reported without the spool paths in the worker's error
+    assert manifest['broken_embedded.pdf']['status'] == 'failed'
+    assert str(tmp_path) not in manifest['broken_embedded.pdf']['error']
+    # The work directory is removed once the response is done
+    assert os.listdir(tmp_path) == []
+
+
+def test_extract_batch_bounds_pending_documents(tmp_path, make_pdf):
+    sources = []
+    for i in range(12):
+        path = tmp_path / f'document_{i}.pdf'
+        path.write_bytes(make_pdf({f'{i}.txt': b'%d' % i}))
+        sources.append((f'doc{i}', str(path)))
+
+    with _CountingExecutor() as executor:
+        results = list(extract_batch(executor, sources, str(tmp_path), encoded=False, max_pending=3))
+
+    assert executor.most_pending <= 3
+    assert sorted(result['id'] for result in results) == sorted(source_id for source_id, _ in sources)
+    assert all(result['files'] == {f"{result['id'][3:]}.txt": result['id'][3:].encode()} for result in results)
+    assert not tmp_path.exists()
+
+
+def test_batch_source_ids():
+    assert batch_source_ids(['a.pdf', '', 'a.pdf']) == ['a.pdf', 'document_2', 'a_3.pdf']
+    assert batch_source_ids(['a.pdf', 'b.pdf'], ['x', 'y']) == ['x', 'y']
+    with pytest.raises(ValueError):
+        batch_source_ids(['a.pdf', 'b.pdf'], ['x'])
+    with pytest.raises(ValueError):
+        batch_source_ids(['a.pdf', 'b.pdf'], ['x', 'x'])
+
+
+def test_batch_extract_endpoint(client, app, tmp_path, make_pdf):
+    app.config['UPLOAD_SPOOL_DIR'] = str(tmp_path)
+    response = client.post('/api/pdf/batch_extract', data={
+        'pdfs[]': [(io.BytesIO(make_pdf({'a.txt': b'a'})), 'one.pdf'), (io.BytesIO(b'not a pdf'), 'broken.pdf')],
+    }, buffered=False)
+
+    assert response.status_code == 200
+    assert [name[:10] for name in os.listdir(tmp_path)] == ['pdf_batch_']
+    results = {item['id']: item for item in map(json.loads, response.get_data().splitlines())}
+    response.close()
+    assert results['one.pdf']['status'] == 'done'
+    assert base64.b64decode(results['one.pdf']['files']['a.txt']) == b'a'
+    # The failure is reported without the spool paths in the worker's error
+    assert results['broken.pdf']['status'] == 'failed'
+    assert str(tmp_path) not in results['broken.pdf']['error']
+    assert os.listdir(tmp_path) == []
+
+
+def test_batch_extract_zip_closed_unread(client, app, tmp_path, make_pdf):
+    app.config['UPLOAD_SPOOL_DIR'] = str(tmp_path)
+    response = client.post('/api/pdf/batch_extract?format=zip', data={
+        'pdfs[]': [(io.BytesIO(make_pdf({'a.txt': b'a'})), 'one.pdf')],
+        'ids[]': ['first'],
+    }, buffered=False)
+
+    assert response.status_code == 200
+    # Closing before reading the body still removes the work directory
+    response.close()
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,69 @@
+"""
+Tests for the bulk mode of the local extraction tool
+"""
+import json
+import os
+
+import pikepdf
+
+from client.extract_pdf_attachments import bulk_extract, find_pdfs, load_manifest
+
+
+def _save(path, attachments):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    pdf = pikepdf.new()
+    pdf.add_blank_page()
+    for name, data in attachments.items():
+        pdf.attachments[name] = pikepdf.AttachedFileSpec(pdf, data)
+    pdf.save(path)
+
+
+def test_find_pdfs_skips_the_output_tree(tmp_path):
+    _save(tmp_path / 'a.pdf', {})
+    _save(tmp_path / 'sub' / 'b.PDF', {})
+    _save(tmp_path / 'out' / 'old' / 'c.pdf', {})
+    (tmp_path / 'notes.txt').write_text('not a pdf')
+
+    root, paths = find_pdfs(str(tmp_path), str(tmp_path / 'out'))
+    assert root == str(tmp_path)
+    assert paths == [str(tmp_path / 'a.pdf'), str(tmp_path / 'sub' / 'b.PDF')]
+
+    root, paths = find_pdfs(os.path.join(str(tmp_path), '**', '*.pdf'), str(tmp_path / 'out'))
+    assert root == str(tmp_path)
+    assert paths == [str(tmp_path / 'a.pdf')]
+
+
+def test_bulk_extract_mirrors_the_tree_and_resumes(tmp_path):
+    source = tmp_path / 'in'
+    _save(source / 'a.pdf', {'x.txt': b'x'})
+    _save(source / 'sub' / 'b.pdf', {'y.txt': b'y', 'z.txt': b'z'})
+    (source / 'broken.pdf').write_bytes(b'not a pdf')
+    output = tmp_path / 'out'
+
+    totals = bulk_extract(str(source), str(output), workers=2)
+
+    assert (totals['done'], totals['failed'], totals['skipped'], totals['attachments']) == (2, 1, 0, 3)
+    assert (output / 'a' / 'x.txt').read_bytes() == b'x'
+    assert sorted(os.listdir(output / 'sub' / 'b')) == ['y.txt', 'z.txt']
+    assert not any(name.endswith('.partial') for _, dirs, _ in os.walk(output) for name in dirs)
+
+    # Running again only retries what failed or changed
+    _save(source / 'a.pdf', {'x.txt': b'changed'})
+    totals = bulk_extract(str(source), str(output), workers=2)
+
+    assert (totals['done'], totals['failed'], totals['skipped']) == (1, 1, 1)
+    assert (output / 'a' / 'x.txt').read_bytes() == b'changed'
+    done = load_manifest(str(output / 'manifest.jsonl'))
+    assert sorted(os.path.relpath(path, source) for path in done) == ['a.pdf', os.path.join('sub', 'b.pdf')]
+
+
+def test_load_manifest_ignores_a_truncated_line(tmp_path):
+    manifest = tmp_path / 'manifest.jsonl'
+    records = [
+        {'source': 'a.pdf', 'status': 'done'},
+        {'source': 'b.pdf', 'status': 'done'},
+        {'source': 'b.pdf', 'status': 'failed'},
+    ]
+    manifest.write_text(''.join(json.dumps(record) + '\n' for record in records) + '{"source": "c.pdf", "sta')
+
+    assert list(load_manifest(str(manifest))) == ['a.pdf']
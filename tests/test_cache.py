@@ -0,0 +1,114 @@
+"""
+Tests for the content-addressed result cache
+"""
+import io
+import os
+
+from app.services.cache_service import DiskCache, MemoryCache, content_key, embed_cache_key
+
+
+def test_content_key_is_length_prefixed():
+    assert content_key(b'ab', b'c') != content_key(b'a', b'bc')
+    assert content_key(b'ab', b'c') == content_key(b'ab', b'c')
+
+
+def test_embed_cache_key_depends_on_every_input(tmp_path):
+    spooled = tmp_path / 'attachment.pdf'
+    spooled.write_bytes(b'attachment')
+    key = embed_cache_key(b'host', [b'attachment'], ['a.pdf'], ('balanced',))
+
+    # A spooled file hashes like the same bytes in memory
+    assert embed_cache_key(b'host', [str(spooled)], ['a.pdf'], ('balanced',)) == key
+    assert embed_cache_key(b'host', [b'attachment'], ['b.pdf'], ('balanced',)) != key
+    assert embed_cache_key(b'host', [b'attachment'], ['a.pdf'], ('small',)) != key
+    assert embed_cache_key(b'host2', [b'attachment'], ['a.pdf'], ('balanced',)) != key
+
+
+def test_memory_cache_evicts_least_recently_used():
+    cache = MemoryCache(max_bytes=10)
+    cache.set('a', b'aaaa')
+    cache.set('b', b'bbbb')
+    assert cache.get('a') == b'aaaa'
+    cache.set('c', b'cccc')
+
+    assert cache.get('b') is None
+    assert cache.get('a') == b'aaaa' and cache.get('c') == b'cccc'
+    assert cache.stats()['size_bytes'] == 8
+
+
+def test_disk_cache_shares_its_limit_between_instances(tmp_path):
+    first = DiskCache(str(tmp_path), max_bytes=10)
+    second = DiskCache(str(tmp_path), max_bytes=10)
+    first.set('a', b'aaaa')
+    os.utime(tmp_path / 'a', (1, 1))
+    second.set('b', b'bbbb')
+    os.utime(tmp_path / 'b', (2, 2))
+    # A hit in one instance keeps the entry alive for the other
+    assert first.get('a') == b'aaaa'
+    second.set('c', b'cccc')
+
+    assert sorted(os.listdir(tmp_path)) == ['a', 'c']
+    assert second.get('a') == b'aaaa'
+    assert second.stats()['size_bytes'] == 8
+
+
+def test_disk_cache_set_file_keeps_the_source(tmp_path):
+    cache = DiskCache(str(tmp_path / 'cache'), max_bytes=1024)
+    source = tmp_path / 'result.pdf'
+    source.write_bytes(b'result')
+    cache.set_file('key', str(source))
+    source.unlink()
+
+    with cache.get_file('key') as f:
+        assert f.read() == b'result'
+    assert cache.get('other') is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_create_embedded_pdf_hits_the_cache(client, make_pdf):
+    host, attachment = make_pdf(), make_pdf()
+
+    def embed():
+        return client.post('/api/pdf/create_embedded_pdf', data={
+            'host_pdf': (io.BytesIO(host), 'host.pdf'),
+            'attachments[]': [(io.BytesIO(attachment), 'a.pdf')],
+        })
+
+    first, second = embed(), embed()
+    assert first.status_code == second.status_code == 200
+    assert (first.headers['X-Cache'], second.headers['X-Cache']) == ('MISS', 'HIT')
+    assert first.data == second.data
+
+
+def _embed(client, host, attachment):
+    return client.post('/api/pdf/create_embedded_pdf', data={
+        'host_pdf': (io.BytesIO(host), 'host.pdf'),
+        'attachments[]': [(io.BytesIO(attachment), 'a.pdf')],
+    }, buffered=False)
+
+
+def test_results_are_streamed_from_disk(client, app, tmp_path, make_pdf):
+    app.extensions['result_cache'] = DiskCache(str(tmp_path), max_bytes=1024 * 1024)
+    host, attachment = make_pdf(), make_pdf()
+
+    first, second = _embed(client, host, attachment), _embed(client, host, attachment)
+
+    assert (first.headers['X-Cache'], second.headers['X-Cache']) == ('MISS', 'HIT')
+    for response in (first, second):
+        # Sent from a file, not from bytes built in memory
+        assert response.is_streamed
+        assert int(response.headers['Content-Length']) == len(response.get_data())
+        response.close()
+    assert first.get_data() == second.get_data()
+
+
+def test_memory_cache_skips_large_results(client, app, make_pdf):
+    app.extensions['result_cache'] = MemoryCache(max_bytes=1024 * 1024, max_item_bytes=100)
+    host, attachment = make_pdf(), make_pdf()
+
+    first, second = _embed(client, host, attachment), _embed(client, host, attachment)
+
+    assert (first.headers['X-Cache'], second.headers['X-Cache']) == ('MISS', 'MISS')
+    assert app.extensions['result_cache'].stats()['entries'] == 0
+    first.close()
+    second.close()
@@ -0,0 +1,91 @@
+"""
+Tests for background embed and extract jobs
+"""
+import base64
+import io
+import json
+import os
+import time
+
+import pikepdf
+
+from app.services.job_service import JobManager, JOB_FAILED
+from app.services.spool import write_json
+
+
+def _wait(client, job_id, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        status = client.get(f'/api/pdf/jobs/{job_id}').json
+        if status['status'] in ('done', 'failed'):
+            return status
+        time.sleep(0.1)
+    raise AssertionError(f"Job {job_id} did not finish")
+
+
+def test_extract_job(client, make_pdf):
+    response = client.post('/api/pdf/jobs', data={
+        'operation': 'extract',
+        'pdf': (io.BytesIO(make_pdf({'inner.pdf': b'%PDF-1 inner'})), 'host.pdf'),
+    })
+    assert response.status_code == 202
+
+    status = _wait(client, response.json['job_id'])
+    assert status['status'] == 'done'
+    result = json.loads(client.get(status['result_url']).data)
+    assert result['count'] == 1
+    assert base64.b64decode(result['files']['inner.pdf']) == b'%PDF-1 inner'
+
+
+def test_embed_job(client, make_pdf):
+    response = client.post('/api/pdf/jobs', data={
+        'operation': 'embed',
+        'host_pdf': (io.BytesIO(make_pdf()), 'host.pdf'),
+        'attachments[]': [(io.BytesIO(make_pdf()), 'a.pdf')],
+    })
+    assert response.status_code == 202
+
+    status = _wait(client, response.json['job_id'])
+    assert status['status'] == 'done'
+    with pikepdf.open(io.BytesIO(client.get(status['result_url']).data)) as pdf:
+        assert list(pdf.attachments) == ['a.pdf']
+
+
+def test_unfinished_job_result_is_a_conflict(client, app):
+    job_manager = app.extensions['job_manager']
+    job_dir = os.path.join(job_manager.spool_dir, 'a' * 32)
+    os.makedirs(job_dir, exist_ok=True)
+    write_json(os.path.join(job_dir, 'status.json'),
+               {'job_id': 'a' * 32, 'operation': 'embed', 'status': 'queued', 'created_at': time.time()})
+
+    assert client.get(f"/api/pdf/jobs/{'a' * 32}/result").status_code == 409
+    assert client.get(f"/api/pdf/jobs/{'b' * 32}").status_code == 404
+
+
+def _job(spool_dir, job_id, **status):
+    job_dir = os.path.join(spool_dir, job_id)
+    os.makedirs(job_dir)
+    write_json(os.path.join(job_dir, 'status.json'), dict(job_id=job_id, operation='extract', **status))
+
+
+def test_sweep_expires_finished_and_orphaned_jobs(tmp_path):
+    now = time.time()
+    manager = JobManager(str(tmp_path), ttl_seconds=60, max_runtime_seconds=600)
+    _job(str(tmp_path), 'a' * 32, status='done', created_at=now - 200, finished_at=now - 100)
+    _job(str(tmp_path), 'b' * 32, status='done', created_at=now - 20, finished_at=now - 10)
+    # Left running by a server process that died
+    _job(str(tmp_path), 'c' * 32, status='running', created_at=now - 1000)
+    _job(str(tmp_path), 'd' * 32, status='running', created_at=now - 10)
+
+    # Looking a job up sweeps
+    assert manager.status('a' * 32) is None
+    assert manager.status('b' * 32)['status'] == 'done'
+    orphan = manager.status('c' * 32)
+    assert orphan['status'] == JOB_FAILED
+    assert 'did not finish' in orphan['error']
+    assert manager.status('d' * 32)['status'] == 'running'
+
+    # Once failed, the orphan expires like any finished job
+    manager.ttl_seconds = 0
+    manager.sweep(force=True)
+    assert sorted(os.listdir(tmp_path)) == ['d' * 32]
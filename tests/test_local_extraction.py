@@ -0,0 +1,81 @@
+"""
+Tests for memory-mapped extraction of local files
+"""
+import zlib
+from pathlib import Path
+
+import pikepdf
+
+from client import pdf_extract
+from client.pdf_extract import extract_to_directory, output_name
+
+
+def _save(path, streams, **save_options):
+    """Writes a PDF whose attachments are the given (name, raw data, stream keys)"""
+    pdf = pikepdf.new()
+    pdf.add_blank_page()
+    flat = []
+    for name, raw, keys in sorted(streams):
+        stream = pdf.make_stream(raw, Type=pikepdf.Name.EmbeddedFile, **keys)
+        flat.extend([pikepdf.String(name), pdf.make_indirect(pikepdf.Dictionary(
+            Type=pikepdf.Name.Filespec, F=name, UF=name, EF=pikepdf.Dictionary(F=stream)
+        ))])
+    pdf.Root.Names = pikepdf.Dictionary(EmbeddedFiles=pikepdf.Dictionary(Names=pikepdf.Array(flat)))
+    pdf.save(path, compress_streams=False, stream_decode_level=pikepdf.StreamDecodeLevel.none, **save_options)
+    return str(path)
+
+
+LARGE = bytes(range(256)) * 20000
+FLATE = {'Filter': pikepdf.Name.FlateDecode}
+STREAMS = [
+    ('large.bin', zlib.compress(LARGE), FLATE),
+    ('plain.txt', b'plain', {}),
+    ('chain.txt', zlib.compress(zlib.compress(b'chain')), {
+        'Filter': pikepdf.Array([pikepdf.Name.FlateDecode, pikepdf.Name.FlateDecode]),
+    }),
+    ('predicted.bin', zlib.compress(b'\x00abc'), {
+        'Filter': pikepdf.Name.FlateDecode,
+        'DecodeParms': pikepdf.Dictionary(Predictor=12, Columns=3),
+    }),
+    ('damaged.bin', b'not flate', FLATE),
+]
+
+
+def _written(results):
+    return {result['name']: Path(result['path']).read_bytes() for result in results}
+
+
+def test_extract_to_directory(tmp_path, monkeypatch):
+    source = _save(tmp_path / 'source.pdf', STREAMS)
+    mapped = []
+    mapped_pieces = pdf_extract._mapped_pieces
+    monkeypatch.setattr(pdf_extract, '_mapped_pieces',
+                        lambda data, offset, length: mapped.append(length) or mapped_pieces(data, offset, length))
+
+    results = extract_to_directory(source, str(tmp_path / 'out'))
+
+    # Streams that cannot be decoded in bounded pieces are skipped
+    assert _written(results) == {'large.bin': LARGE, 'plain.txt': b'plain', 'chain.txt': b'chain'}
+    assert sorted(p.name for p in (tmp_path / 'out').iterdir()) == ['chain.txt', 'large.bin', 'plain.txt']
+    assert {result['name']: result['bytes_written'] for result in results}['large.bin'] == len(LARGE)
+    # Copied straight from the memory map, not through pikepdf
+    assert len(zlib.compress(LARGE)) in mapped
+
+
+def test_extract_encrypted(tmp_path):
+    # Encrypted streams cannot be copied from the file, so they are read through pikepdf
+    plain = _save(tmp_path / 'plain.pdf', STREAMS[:3])
+    with pikepdf.open(plain) as pdf:
+        pdf.save(tmp_path / 'encrypted.pdf', encryption=pikepdf.Encryption(owner='owner', user=''))
+
+    results = extract_to_directory(str(tmp_path / 'encrypted.pdf'), str(tmp_path / 'out'))
+
+    assert _written(results) == {'large.bin': LARGE, 'plain.txt': b'plain', 'chain.txt': b'chain'}
+
+
+def test_output_names_stay_in_the_directory():
+    taken = set()
+
+    assert output_name('../../etc/passwd', taken) == 'passwd'
+    assert output_name('dir\\passwd', taken) == 'passwd_1'
+    assert output_name('..', taken) == 'attachment'
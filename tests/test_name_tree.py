@@ -0,0 +1,183 @@
+"""
+Tests for the EmbeddedFiles name tree reader and writer
+"""
+import pikepdf
+
+from app.services import name_tree
+
+
+def _value(pdf, i):
+    return pdf.make_indirect(pikepdf.Dictionary(N=i))
+
+
+def _names(root):
+    return [name for name, _ in name_tree.iter_entries(root)]
+
+
+def _check_limits(node, depth=0):
+    """Asserts every non-root node's /Limits match the keys below it, returning those keys"""
+    if '/Names' in node:
+        keys = [bytes(node.Names[i]) for i in range(0, len(node.Names), 2)]
+        assert keys == sorted(keys)
+    else:
+        keys = []
+        for kid in node.Kids:
+            keys.extend(_check_limits(kid, depth + 1))
+    if depth > 0:
+        assert (bytes(node.Limits[0]), bytes(node.Limits[1])) == (keys[0], keys[-1])
+    return keys
+
+
+def test_small_tree_stays_flat():
+    pdf = pikepdf.new()
+    root = pikepdf.Dictionary()
+    name_tree.add_entries(pdf, root, [('b.pdf', _value(pdf, 1)), ('a.pdf', _value(pdf, 2))])
+
+    assert '/Kids' not in root
+    assert _names(root) == ['a.pdf', 'b.pdf']
+    assert name_tree.lookup(root, 'b.pdf').N == 1
+    assert name_tree.lookup(root, 'c.pdf') is None
+
+
+def test_build_is_sorted_and_balanced():
+    pdf = pikepdf.new()
+    root = pikepdf.Dictionary()
+    count = name_tree.LEAF_SIZE * name_tree.FANOUT + 1
+    name_tree.build(pdf, root, [(f'f{i:05d}', _value(pdf, i)) for i in reversed(range(count))])
+
+    assert '/Kids' in root and '/Limits' not in root
+    assert _check_limits(root) == sorted(_check_limits(root))
+    assert name_tree.count_entries(root) == count
+    assert name_tree.lookup(root, 'f00000').N == 0
+    assert name_tree.lookup(root, f'f{count - 1:05d}').N == count - 1
+
+
+def test_insert_splits_leaves_and_keeps_limits():
+    pdf = pikepdf.new()
+    root = pikepdf.Dictionary()
+    name_tree.build(pdf, root, [(f'f{i:05d}', _value(pdf, i)) for i in range(0, 2000, 2)])
+    leaves_before = len(root.Kids)
+
+    # All of these land in the first leaf, which has to split
+    added = [(f'f00002.{i:03d}', _value(pdf, i)) for i in range(300)]
+    touched = name_tree.add_entries(pdf, root, added)
+
+    assert len(root.Kids) > leaves_before
+    assert all(node.is_indirect for node in touched)
+    assert len(touched) < len(root.Kids)
+    _check_limits(root)
+    assert name_tree.count_entries(root) == 1300
+    assert all(name_tree.lookup(root, name).N == i for i, (name, _) in enumerate(added))
+    assert name_tree.lookup(root, 'f01998').N == 1998
+
+
+def test_insert_replaces_existing_name():
+    pdf = pikepdf.new()
+    root = pikepdf.Dictionary()
+    name_tree.build(pdf, root, [(f'f{i:05d}', _value(pdf, i)) for i in range(500)])
+
+    name_tree.add_entries(pdf, root, [('f00250', _value(pdf, -1))])
+
+    assert name_tree.count_entries(root) == 500
+    assert name_tree.lookup(root, 'f00250').N == -1
+
+
+def test_flat_unsorted_root_is_rebuilt():
+    pdf = pikepdf.new()
+    flat = []
+    for i in reversed(range(100)):
+        flat.extend([pikepdf.String(f'f{i:03d}'), _value(pdf, i)])
+    root = pikepdf.Dictionary(Names=pikepdf.Array(flat))
+
+    name_tree.add_entries(pdf, root, [('f100', _value(pdf, 100))])
+
+    assert '/Kids' in root
+    _check_limits(root)
+    assert _names(root) == [f'f{i:03d}' for i in range(101)]
+
+
+def test_foreign_tree_without_limits_is_searchable():
+    pdf = pikepdf.new()
+    kids = []
+    for start in (0, 50):
+        flat = []
+        # Unsorted leaf, no /Limits
+        for i in reversed(range(start, start + 50)):
+            flat.extend([pikepdf.String(f'f{i:03d}'), _value(pdf, i)])
+        kids.append(pdf.make_indirect(pikepdf.Dictionary(Names=pikepdf.Array(flat))))
+    root = pikepdf.Dictionary(Kids=pikepdf.Array(kids))
+
+    assert name_tree.lookup(root, 'f007').N == 7
+    assert name_tree.lookup(root, 'f077').N == 77
+    assert name_tree.lookup(root, 'f100') is None
+
+
+def test_insert_into_foreign_tree_without_limits():
+    pdf = pikepdf.new()
+    leaves = []
+    for start in (0, 50):
+        flat = []
+        for i in range(start, start + 50):
+            flat.extend([pikepdf.String(f'f{i:03d}'), _value(pdf, i)])
+        leaves.append(pdf.make_indirect(pikepdf.Dictionary(Names=pikepdf.Array(flat))))
+    # An intermediate node and its leaves, none of them with /Limits
+    middle = pdf.make_indirect(pikepdf.Dictionary(Kids=pikepdf.Array(leaves)))
+    root = pikepdf.Dictionary(Kids=pikepdf.Array([middle]))
+
+    name_tree.add_entries(pdf, root, [('f100', _value(pdf, 100)), ('f049a', _value(pdf, -1))])
+
+    assert [bytes(key) for key in middle.Limits] == [b'f000', b'f100']
+    assert name_tree.lookup(root, 'f100').N == 100
+    assert name_tree.lookup(root, 'f049a').N == -1
+    assert name_tree.count_entries(root) == 102
+
+
+def _chain(pdf, depth):
+    """A foreign tree with one entry at the bottom of a chain of depth nodes"""
+    node = pdf.make_indirect(pikepdf.Dictionary(
+        Names=pikepdf.Array([pikepdf.String('deep'), _value(pdf, 0)]),
+        Limits=pikepdf.Array([pikepdf.String('deep'), pikepdf.String('deep')])
+    ))
+    for _ in range(depth - 1):
+        node = pdf.make_indirect(pikepdf.Dictionary(
+            Kids=pikepdf.Array([node]),
+            Limits=pikepdf.Array([pikepdf.String('deep'), pikepdf.String('deep')])
+        ))
+    return pikepdf.Dictionary(Kids=pikepdf.Array([node]))
+
+
+def test_deep_foreign_tree_is_cut_off():
+    pdf = pikepdf.new()
+    shallow = _chain(pdf, name_tree.MAX_DEPTH)
+    deep = _chain(pdf, name_tree.MAX_DEPTH + 10)
+
+    assert name_tree.lookup(shallow, 'deep').N == 0
+    assert _names(shallow) == ['deep']
+    assert name_tree.lookup(deep, 'deep') is None
+    assert _names(deep) == []
+    assert len(list(name_tree.iter_nodes(deep))) == name_tree.MAX_DEPTH + 1
+
+
+def test_insert_into_deep_foreign_tree():
+    pdf = pikepdf.new()
+    shallow = _chain(pdf, 5)
+    deep = _chain(pdf, name_tree.MAX_DEPTH + 10)
+
+    name_tree.add_entries(pdf, shallow, [('new', _value(pdf, 1))])
+    name_tree.add_entries(pdf, deep, [('new', _value(pdf, 1))])
+
+    assert _names(shallow) == ['deep', 'new']
+    # Entries below the depth limit were never readable; new ones must be
+    assert name_tree.lookup(deep, 'new').N == 1
+    _check_limits(deep)
+
+
+def test_cyclic_foreign_tree_terminates():
+    pdf = pikepdf.new()
+    leaf = pdf.make_indirect(pikepdf.Dictionary(Names=pikepdf.Array([pikepdf.String('a'), _value(pdf, 0)])))
+    node = pdf.make_indirect(pikepdf.Dictionary(Kids=pikepdf.Array([leaf])))
+    node.Kids.append(node)
+    root = pikepdf.Dictionary(Kids=pikepdf.Array([node]))
+
+    assert _names(root) == ['a']
+    assert len(list(name_tree.iter_nodes(root))) == 3
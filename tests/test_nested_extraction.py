@@ -0,0 +1,137 @@
+"""
+Tests for bounded recursive extraction
+"""
+import io
+import re
+import zlib
+
+import pikepdf
+
+from app.services.pdf_service import iter_nested_files, ExtractionBudget
+
+
+def _pdf_bytes(pdf):
+    pdf.add_blank_page()
+    output = io.BytesIO()
+    pdf.save(output)
+    return output.getvalue()
+
+
+def _with_streams(streams):
+    """Builds a PDF whose attachments are the given (name, raw data, stream keys)"""
+    pdf = pikepdf.new()
+    flat = []
+    for name, raw, keys in sorted(streams):
+        stream = pdf.make_stream(raw, Type=pikepdf.Name.EmbeddedFile, **keys)
+        flat.extend([pikepdf.String(name), pdf.make_indirect(pikepdf.Dictionary(
+            Type=pikepdf.Name.Filespec, F=name, UF=name, EF=pikepdf.Dictionary(F=stream)
+        ))])
+    pdf.Root.Names = pikepdf.Dictionary(EmbeddedFiles=pikepdf.Dictionary(Names=pikepdf.Array(flat)))
+    return _pdf_bytes(pdf)
+
+
+def _predicted(name):
+    return (name, zlib.compress(b'\x00abc'), {
+        'Filter': pikepdf.Name.FlateDecode,
+        'DecodeParms': pikepdf.Dictionary(Predictor=12, Columns=3),
+    })
+
+
+def test_nested_extraction_stays_within_budget():
+    inner = _with_streams([('leaf.txt', b'leaf', {})])
+    outer = _with_streams([('inner.pdf', zlib.compress(inner), {'Filter': pikepdf.Name.FlateDecode})])
+
+    budget = ExtractionBudget()
+    files = list(iter_nested_files(outer, budget))
+
+    assert [(f.path, f.depth) for f in files] == [('inner.pdf', 1), ('inner.pdf/leaf.txt', 2)]
+    assert not budget.incomplete
+    assert budget.bytes_used == len(inner) + 4
+    # Each catalog, plus a filespec and a stream per attachment
+    assert budget.objects_used == 6
+
+
+def test_object_count_ignores_trailer_size():
+    data = _with_streams([('a.txt', b'a', {})])
+    data = re.sub(rb'(trailer\s*<<.*?/Size )\d+', rb'\g<1>999999', data, flags=re.DOTALL)
+
+    budget = ExtractionBudget(max_objects=10)
+    files = list(iter_nested_files(data, budget))
+
+    assert [f.path for f in files] == ['a.txt']
+    assert budget.objects_used == 3 and budget.exhausted is None
+
+
+def test_object_limit_stops_the_walk():
+    data = _with_streams([(f'f{i}.txt', b'x', {}) for i in range(10)])
+
+    budget = ExtractionBudget(max_objects=7)
+    files = list(iter_nested_files(data, budget))
+
+    assert len(files) == 3
+    assert budget.exhausted == 'max_objects'
+
+
+def test_flate_bomb_is_refused():
+    bomb = zlib.compress(bytes(64 * 1024 * 1024), 9)
+    data = _with_streams([('bomb.bin', bomb, {
+        'Filter': pikepdf.Name.FlateDecode,
+        # Lies about its size
+        'Params': pikepdf.Dictionary(Size=10),
+    })])
+
+    budget = ExtractionBudget(max_bytes=1024 * 1024)
+    assert list(iter_nested_files(data, budget)) == []
+    assert budget.exhausted == 'max_bytes'
+    assert budget.bytes_used == 0
+
+
+def test_filter_chain_bomb_is_refused():
+    chain = zlib.compress(zlib.compress(bytes(64 * 1024 * 1024), 9), 9)
+    data = _with_streams([('chain.bin', chain, {
+        'Filter': pikepdf.Array([pikepdf.Name.FlateDecode, pikepdf.Name.FlateDecode]),
+    })])
+
+    budget = ExtractionBudget(max_bytes=1024 * 1024)
+    assert list(iter_nested_files(data, budget)) == []
+    assert budget.exhausted == 'max_bytes'
+
+
+def test_small_filter_chain_is_decoded():
+    chain = zlib.compress(zlib.compress(b'hello' * 100))
+    data = _with_streams([('chain.txt', chain, {
+        'Filter': pikepdf.Array([pikepdf.Name.FlateDecode, pikepdf.Name.FlateDecode]),
+    })])
+
+    files = list(iter_nested_files(data, ExtractionBudget(max_bytes=1024 * 1024)))
+    assert [(f.path, f.data) for f in files] == [('chain.txt', b'hello' * 100)]
+
+
+def test_unsupported_stream_is_skipped():
+    data = _with_streams([
+        _predicted('a_predicted.bin'),
+        ('b_plain.txt', b'plain', {}),
+        ('c_damaged.bin', b'not flate', {'Filter': pikepdf.Name.FlateDecode}),
+    ])
+
+    budget = ExtractionBudget(max_bytes=1024 * 1024)
+    files = list(iter_nested_files(data, budget))
+
+    # The walk carries on past the streams it cannot decode
+    assert [(f.path, f.data) for f in files] == [('b_plain.txt', b'plain')]
+    assert budget.exhausted is None
+    assert budget.stats()['skipped'] == [
+        {'path': 'a_predicted.bin', 'reason': 'unsupported_stream'},
+        {'path': 'c_damaged.bin', 'reason': 'unsupported_stream'},
+    ]
+
+
+def test_skipped_streams_are_reported(client):
+    data = _with_streams([_predicted('predicted.bin'), ('plain.txt', b'plain', {})])
+
+    response = client.post('/api/pdf/extract_embedded_pdf?recursive=true',
+                           data={'pdf': (io.BytesIO(data), 'nested.pdf')})
+
+    assert response.status_code == 200
+    assert list(response.json['files']) == ['plain.txt']
+    assert response.json['truncated']['skipped'] == [{'path': 'predicted.bin', 'reason': 'unsupported_stream'}]
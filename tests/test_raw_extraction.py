@@ -0,0 +1,97 @@
+"""
+Tests for raw passthrough extraction of stored attachment data
+"""
+import base64
+import email
+import io
+import zlib
+
+import pikepdf
+
+from app.services.pdf_service import get_raw_attachment, iter_raw_files
+
+
+def _with_streams(streams):
+    """Builds a PDF whose attachments are the given (name, raw data, stream keys)"""
+    pdf = pikepdf.new()
+    pdf.add_blank_page()
+    flat = []
+    for name, raw, keys in sorted(streams):
+        stream = pdf.make_stream(raw, Type=pikepdf.Name.EmbeddedFile, **keys)
+        flat.extend([pikepdf.String(name), pdf.make_indirect(pikepdf.Dictionary(
+            Type=pikepdf.Name.Filespec, F=name, UF=name, EF=pikepdf.Dictionary(F=stream)
+        ))])
+    pdf.Root.Names = pikepdf.Dictionary(EmbeddedFiles=pikepdf.Dictionary(Names=pikepdf.Array(flat)))
+    output = io.BytesIO()
+    # Keep each stream exactly as given
+    pdf.save(output, compress_streams=False, stream_decode_level=pikepdf.StreamDecodeLevel.none)
+    return output.getvalue()
+
+
+DEFLATED = zlib.compress(b'deflated ' * 100)
+DATA = _with_streams([
+    ('deflated.txt', DEFLATED, {'Filter': pikepdf.Name.FlateDecode}),
+    ('plain.txt', b'plain', {}),
+    ('predicted.bin', zlib.compress(b'\x00abc'), {
+        'Filter': pikepdf.Name.FlateDecode,
+        'DecodeParms': pikepdf.Dictionary(Predictor=12, Columns=3),
+    }),
+])
+
+
+def test_raw_files_keep_flate_data():
+    files = {name: (data, encoding) for name, data, encoding in iter_raw_files(DATA)}
+
+    assert files['deflated.txt'] == (DEFLATED, 'deflate')
+    # Anything a client could not simply inflate is decoded here
+    assert files['plain.txt'] == (b'plain', None)
+    assert files['predicted.bin'] == (b'abc', None)
+
+
+def test_raw_attachment_matches_decoded():
+    _, data, encoding = get_raw_attachment(DATA, 'deflated.txt')
+
+    assert encoding == 'deflate'
+    assert zlib.decompress(data) == b'deflated ' * 100
+
+
+def test_raw_json_extraction(client):
+    response = client.post('/api/pdf/extract_embedded_pdf?raw=1', data={'pdf': (io.BytesIO(DATA), 'a.pdf')})
+
+    assert response.status_code == 200
+    assert response.json['encodings'] == {'deflated.txt': 'deflate'}
+    assert base64.b64decode(response.json['files']['deflated.txt']) == DEFLATED
+    assert base64.b64decode(response.json['files']['plain.txt']) == b'plain'
+
+
+def test_raw_multipart_extraction(client):
+    response = client.post('/api/pdf/extract_embedded_pdf?raw=1&format=multipart',
+                           data={'pdf': (io.BytesIO(DATA), 'a.pdf')})
+
+    assert response.status_code == 200
+    message = email.message_from_bytes(
+        b'Content-Type: ' + response.headers['Content-Type'].encode() + b'\r\n\r\n' + response.data
+    )
+    parts = {part.get_filename(): part for part in message.get_payload()}
+    assert parts['deflated.txt']['Content-Encoding'] == 'deflate'
+    assert parts['deflated.txt'].get_payload(decode=True) == DEFLATED
+    assert parts['plain.txt']['Content-Encoding'] is None
+
+
+def test_raw_is_refused_for_zip(client):
+    response = client.post('/api/pdf/extract_embedded_pdf?raw=1&format=zip',
+                           data={'pdf': (io.BytesIO(DATA), 'a.pdf')})
+
+    assert response.status_code == 400
+
+
+def test_raw_fetch_sets_content_encoding(client):
+    response = client.post('/api/pdf/attachments/deflated.txt?raw=1', data={'pdf': (io.BytesIO(DATA), 'a.pdf')})
+
+    assert response.status_code == 200
+    assert response.headers['Content-Encoding'] == 'deflate'
+    assert response.data == DEFLATED
+
+    response = client.post('/api/pdf/attachments/plain.txt?raw=1', data={'pdf': (io.BytesIO(DATA), 'a.pdf')})
+    assert 'Content-Encoding' not in response.headers
+    assert response.data == b'plain'
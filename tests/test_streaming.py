@@ -0,0 +1,71 @@
+"""
+Tests for the streamed ZIP and multipart/mixed extraction formats
+"""
+import email
+import io
+import zipfile
+
+from app.services.stream_service import content_disposition, stream_multipart, stream_zip
+
+
+def _parse_multipart(body, content_type):
+    message = email.message_from_bytes(b'Content-Type: ' + content_type.encode() + b'\r\n\r\n' + body)
+    return [(part.get_filename(), dict(part.items()), part.get_payload(decode=True))
+            for part in message.get_payload()]
+
+
+def test_stream_zip_round_trips():
+    entries = [('a.pdf', b'a' * 200000), ('b.pdf', b''), ('c.pdf', b'c')]
+    archive = zipfile.ZipFile(io.BytesIO(b''.join(stream_zip(entries))))
+
+    assert [(name, archive.read(name)) for name in archive.namelist()] == entries
+
+
+def test_content_disposition_strips_header_injection():
+    value = content_disposition('evil\r\nX-Injected: 1".pdf')
+
+    assert '\r' not in value and '\n' not in value
+    assert value == 'attachment; filename="evilX-Injected: 1.pdf"'
+
+
+def test_content_disposition_encodes_non_ascii_names():
+    value = content_disposition('résumé.pdf')
+
+    assert value == "attachment; filename=\"r_sum_.pdf\"; filename*=UTF-8''r%C3%A9sum%C3%A9.pdf"
+
+
+def test_multipart_part_headers_cannot_be_injected():
+    body = b''.join(stream_multipart([('x\r\nX-Injected: yes\r\n\r\n.pdf', b'data')], 'BOUNDARY'))
+    parts = _parse_multipart(body, 'multipart/mixed; boundary=BOUNDARY')
+
+    assert len(parts) == 1
+    filename, headers, payload = parts[0]
+    assert 'X-Injected' not in headers
+    assert filename == 'xX-Injected: yes.pdf'
+    assert payload == b'data'
+
+
+def test_extract_as_zip(client, make_pdf):
+    attachments = {'one.pdf': b'%PDF-1 one', 'two.pdf': b'%PDF-1 two'}
+    response = client.post('/api/pdf/extract_embedded_pdf?format=zip',
+                           data={'pdf': (io.BytesIO(make_pdf(attachments)), 'host.pdf')})
+
+    assert response.status_code == 200
+    assert response.mimetype == 'application/zip'
+    archive = zipfile.ZipFile(io.BytesIO(response.data))
+    assert {name: archive.read(name) for name in archive.namelist()} == attachments
+
+
+def test_extract_as_multipart(client, make_pdf):
+    attachments = {'one.pdf': b'%PDF-1 one', 'naïve.pdf': b'%PDF-1 two'}
+    response = client.post('/api/pdf/extract_embedded_pdf?format=multipart',
+                           data={'pdf': (io.BytesIO(make_pdf(attachments)), 'host.pdf')})
+
+    assert response.status_code == 200
+    parts = _parse_multipart(response.data, response.headers['Content-Type'])
+    by_header = {headers['Content-Disposition']: payload for _, headers, payload in parts}
+    assert by_header == {
+        content_disposition('one.pdf'): b'%PDF-1 one',
+        content_disposition('naïve.pdf'): b'%PDF-1 two',
+    }
+    assert content_disposition('naïve.pdf').endswith("filename*=UTF-8''na%C3%AFve.pdf")
@@ -0,0 +1,157 @@
+"""
+Tests for the resumable upload session API
+"""
+import base64
+import hashlib
+import io
+
+import pikepdf
+import pytest
+
+from app.services.upload_service import UploadConflictError, UploadManager
+
+
+def _pdf_with_attachment():
+    attachment = pikepdf.new()
+    attachment.add_blank_page()
+    attachment_data = io.BytesIO()
+    attachment.save(attachment_data)
+
+    pdf = pikepdf.new()
+    pdf.add_blank_page()
+    pdf.attachments['inner.pdf'] = pikepdf.AttachedFileSpec(pdf, attachment_data.getvalue())
+    output = io.BytesIO()
+    pdf.save(output)
+    return output.getvalue(), attachment_data.getvalue()
+
+
+def _open(client, **form):
+    response = client.post('/api/pdf/uploads', data=form)
+    assert response.status_code == 201
+    return response.json['upload_id']
+
+
+def _put(client, upload_id, offset, chunk, sha256=None):
+    headers = {'X-Chunk-SHA256': sha256} if sha256 else {}
+    return client.put(f'/api/pdf/uploads/{upload_id}?offset={offset}', data=chunk, headers=headers)
+
+
+def test_upload_resume_and_use(client):
+    data, attachment = _pdf_with_attachment()
+    half = len(data) // 2
+    upload_id = _open(client, size=str(len(data)), sha256=hashlib.sha256(data).hexdigest())
+
+    assert _put(client, upload_id, 0, data[:half]).json['received'] == half
+    # After a dropped connection the client asks where to resume
+    assert client.get(f'/api/pdf/uploads/{upload_id}').json['received'] == half
+    assert _put(client, upload_id, half, data[half:]).json['received'] == len(data)
+
+    response = client.post(f'/api/pdf/uploads/{upload_id}/finalize')
+    assert response.status_code == 200
+    assert response.json['status'] == 'complete'
+
+    response = client.post('/api/pdf/extract_embedded_pdf', data={'pdf_upload': upload_id})
+    assert response.status_code == 200
+    assert base64.b64decode(response.json['files']['inner.pdf']) == attachment
+
+    assert client.delete(f'/api/pdf/uploads/{upload_id}').status_code == 204
+    assert client.get(f'/api/pdf/uploads/{upload_id}').status_code == 404
+
+
+def test_wrong_offset_reports_where_to_resume(client):
+    upload_id = _open(client)
+    _put(client, upload_id, 0, b'abcde')
+
+    response = _put(client, upload_id, 7, b'fghij')
+    assert response.status_code == 409
+    assert response.json['received'] == 5
+
+
+def test_chunk_checksum_mismatch_is_discarded(client):
+    upload_id = _open(client)
+    _put(client, upload_id, 0, b'abcde')
+
+    response = _put(client, upload_id, 5, b'fghij', hashlib.sha256(b'other').hexdigest())
+    assert response.status_code == 400
+    assert client.get(f'/api/pdf/uploads/{upload_id}').json['received'] == 5
+
+    response = _put(client, upload_id, 5, b'fghij', hashlib.sha256(b'fghij').hexdigest())
+    assert response.json['received'] == 10
+
+
+def test_resent_chunk_is_accepted_once(client):
+    upload_id = _open(client)
+    _put(client, upload_id, 0, b'abcde', hashlib.sha256(b'abcde').hexdigest())
+    _put(client, upload_id, 5, b'fghij')
+
+    # Resent with and without its checksum
+    assert _put(client, upload_id, 0, b'abcde', hashlib.sha256(b'abcde').hexdigest()).status_code == 200
+    assert _put(client, upload_id, 0, b'abcde').status_code == 200
+    assert _put(client, upload_id, 0, b'abcdX').status_code == 409
+
+    status = client.get(f'/api/pdf/uploads/{upload_id}').json
+    assert status['received'] == 10
+    assert status['chunk_count'] == 2
+
+
+def test_finalize_checks_size_and_checksum(client):
+    upload_id = _open(client, size='10')
+    _put(client, upload_id, 0, b'abcde')
+    assert client.post(f'/api/pdf/uploads/{upload_id}/finalize').status_code == 409
+
+    _put(client, upload_id, 5, b'fghij')
+    response = client.post(f'/api/pdf/uploads/{upload_id}/finalize',
+                           data={'sha256': hashlib.sha256(b'wrong').hexdigest()})
+    assert response.status_code == 400
+
+    response = client.post(f'/api/pdf/uploads/{upload_id}/finalize',
+                           data={'sha256': hashlib.sha256(b'abcdefghij').hexdigest()})
+    assert response.json['status'] == 'complete'
+    assert _put(client, upload_id, 10, b'more').status_code == 409
+
+
+def test_chunk_past_declared_size_is_rejected(client):
+    upload_id = _open(client, size='4')
+
+    assert _put(client, upload_id, 0, b'abcde').status_code == 400
+    assert client.get(f'/api/pdf/uploads/{upload_id}').json['received'] == 0
+
+
+def test_unfinalized_upload_cannot_be_used(client):
+    upload_id = _open(client)
+    _put(client, upload_id, 0, b'%PDF-')
+
+    response = client.post('/api/pdf/extract_embedded_pdf', data={'pdf_upload': upload_id})
+    assert response.status_code == 400
+
+
+def test_chunk_log_finds_resent_chunks(tmp_path):
+    manager = UploadManager(str(tmp_path))
+    upload_id = manager.create()['upload_id']
+    for i in range(50):
+        manager.write_chunk(upload_id, i * 3, io.BytesIO(b'%03d' % i))
+
+    status = manager.status(upload_id)
+    assert (status['received'], status['chunk_count']) == (150, 50)
+    assert len((tmp_path / upload_id / 'chunks').read_bytes().splitlines()) == 50
+    for i in (0, 17, 49):
+        assert manager.write_chunk(upload_id, i * 3, io.BytesIO(b'%03d' % i))['received'] == 150
+    with pytest.raises(UploadConflictError):
+        manager.write_chunk(upload_id, 17 * 3, io.BytesIO(b'xxx'))
+    with pytest.raises(UploadConflictError):
+        manager.write_chunk(upload_id, 1, io.BytesIO(b'001'))
+
+
+def test_chunk_log_drops_records_of_interrupted_writes(tmp_path):
+    manager = UploadManager(str(tmp_path))
+    upload_id = manager.create()['upload_id']
+    manager.write_chunk(upload_id, 0, io.BytesIO(b'abc'))
+    log_path = tmp_path / upload_id / 'chunks'
+    record = log_path.read_bytes()
+    # A record logged by a write that died before updating the status
+    log_path.write_bytes(record + record.replace(b'0' * 20, b'%020d' % 3, 1))
+
+    manager.write_chunk(upload_id, 3, io.BytesIO(b'def'))
+
+    assert len(log_path.read_bytes()) == 2 * len(record)
+    assert manager.write_chunk(upload_id, 3, io.BytesIO(b'def'))['chunk_count'] == 2